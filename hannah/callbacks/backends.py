@@ -18,11 +18,16 @@
 #
 
 import copy
+import hashlib
 import logging
+import queue
 import sys
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from tempfile import TemporaryDirectory
 
+import numpy as np
 import torch
 import torch.onnx
 from pytorch_lightning import Callback
@@ -67,16 +72,195 @@ def symbolic_batch_dim(model):
 
 
 class InferenceBackendBase(Callback):
-    """Base class to run val and test on a backend inference engine"""
+    """Base class to run val and test on a backend inference engine
+
+    The prepared backend session is kept between validation epochs and is only rebuilt if
+    the fingerprint of the module weights or structure has changed. Backends that set
+    `SUPPORTS_WEIGHT_UPDATE` refresh the weights of their session instead of rebuilding it,
+    if only the weights have changed. With `background=True` the preparation of the session
+    and the backend inference during validation run on a background thread.
+
+    With `full_evaluation=True` the whole test set is streamed through the backend at the end of
+    the test epoch, using `num_sessions` concurrent inference calls, and the accuracy, the
+    throughput and the latency percentiles of the backend are logged.
+    """
+
+    SUPPORTS_WEIGHT_UPDATE = False
 
     def __init__(
-        self, val_batches=1, test_batches=1, val_frequency=10, tune: bool = True
+        self,
+        val_batches=1,
+        test_batches=1,
+        val_frequency=10,
+        tune: bool = True,
+        background: bool = True,
+        full_evaluation: bool = False,
+        num_sessions: int = 1,
     ):
         self.test_batches = test_batches
         self.val_batches = val_batches
         self.val_frequency = val_frequency
         self.validation_epoch = 0
         self.tune = tune
+        self.background = background
+        self.full_evaluation = full_evaluation
+        self.num_sessions = num_sessions
+
+        self._executor = None
+        self._structure_key = None
+        self._weights_key = None
+        self._session_job = None
+        self._calibration_batch = None
+        self._val_results = []
+
+    def update_weights(self, state_dict):
+        """Refresh the weights of the prepared session
+
+        Only called for backends with `SUPPORTS_WEIGHT_UPDATE`, if the structure of the module is unchanged.
+
+        Args:
+          state_dict: state dict of the module
+        """
+        raise NotImplementedError("update_weights is not supported by this backend")
+
+    def fingerprint(self, pl_module):
+        """Fingerprints of the structure and the weights of a module
+
+        Args:
+          pl_module: module to fingerprint
+
+        Returns: (structure fingerprint, weights fingerprint)
+        """
+        structure = hashlib.sha1()
+        weights = hashlib.sha1()
+        structure.update(type(pl_module.model).__name__.encode())
+        structure.update(repr(getattr(pl_module, "qconfig_mapping", None)).encode())
+        for name, tensor in pl_module.state_dict().items():
+            if not isinstance(tensor, torch.Tensor):
+                continue
+            structure.update(f"{name}:{tuple(tensor.shape)}:{tensor.dtype};".encode())
+            data = tensor.detach().cpu().contiguous().view(-1).view(torch.uint8)
+            weights.update(data.numpy().tobytes())
+        return structure.hexdigest(), weights.hexdigest()
+
+    def _timed(self, phase, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        logger.info("Backend %s took %.3f s", phase, time.perf_counter() - start)
+        return result
+
+    def _submit(self, fn, *args):
+        if not self.background:
+            future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if self._executor is None:
+            # a single worker keeps the order of session preparation and inference
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="inference_backend"
+            )
+        return self._executor.submit(fn, *args)
+
+    def _wait(self):
+        if self._executor is not None:
+            self._submit(lambda: None).result()
+        self._check_session()
+
+    def teardown(self, trainer, pl_module, stage):
+        """Wait for the pending background jobs and shut down the background thread
+
+        The session is kept, and a new background thread is started when it is used again.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _check_session(self):
+        """Wait for the pending preparation or weight update of the session
+
+        The fingerprints of the session are only updated once the job has succeeded,
+        exceptions of the job are raised here.
+        """
+        if self._session_job is None:
+            return
+
+        future, structure_key, weights_key = self._session_job
+        self._session_job = None
+        try:
+            future.result()
+        except Exception:
+            # the session may be partially updated, so it is prepared again next time
+            self._structure_key = None
+            self._weights_key = None
+            raise
+        self._structure_key = structure_key
+        self._weights_key = weights_key
+
+    def prepare_session(self, pl_module):
+        """Prepare or refresh the backend session for the current state of pl_module
+
+        Args:
+          pl_module: module to run on the backend
+        """
+        self._check_session()
+        structure_key, weights_key = self._timed(
+            "fingerprint", self.fingerprint, pl_module
+        )
+        if (structure_key, weights_key) == (self._structure_key, self._weights_key):
+            logger.info("Backend session is up to date")
+            return
+
+        quantized = pl_module
+        if getattr(pl_module, "qconfig_mapping", None) is not None:
+            quantized = self._timed("quantization", self.quantize, pl_module)
+
+        if (
+            quantized is pl_module
+            and self.SUPPORTS_WEIGHT_UPDATE
+            and structure_key == self._structure_key
+        ):
+            state_dict = {
+                name: tensor.detach().clone()
+                for name, tensor in pl_module.state_dict().items()
+            }
+            future = self._submit(
+                self._timed, "weight update", self.update_weights, state_dict
+            )
+        else:
+            if quantized is pl_module and self.background:
+                # the session is prepared concurrently to the validation of pl_module
+                quantized = copy.deepcopy(pl_module)
+            future = self._submit(self._timed, "preparation", self.prepare, quantized)
+
+        self._session_job = (future, structure_key, weights_key)
+
+    def _batch_inputs(self, pl_module, batch, split):
+        """Model inputs of a batch, None if the batch can not be passed to the module
+
+        Modules providing `model_inputs` (e.g. stream classifiers with batched waveform augmentation
+        or cached features) preprocess their batches themselves.
+        """
+        if isinstance(batch, Mapping):
+            return batch["data"]
+        model_inputs = getattr(pl_module, "model_inputs", None)
+        if model_inputs is not None:
+            return model_inputs(batch, split)
+        return batch[0]
+
+    def _validate_batch(self, inputs, target):
+        # grad mode is thread local, and the background thread does not inherit it
+        with torch.no_grad():
+            result = self._timed("inference", self.run_batch, inputs)
+        if not isinstance(result, torch.Tensor):
+            logging.warning("Could not calculate MSE on target device")
+            return None
+        return torch.nn.functional.mse_loss(
+            result.to(target.device), target, reduction="mean"
+        )
 
     def run_batch(self, inputs=None):
         """
@@ -115,8 +299,7 @@ class InferenceBackendBase(Callback):
 
         if self.val_batches > 0:
             if self.validation_epoch % self.val_frequency == 0:
-                pl_module = self.quantize(pl_module)
-                self.prepare(pl_module)
+                self.prepare_session(pl_module)
 
     def on_validation_batch_end(
         self, trainer, pl_module, outputs, batch, batch_idx, dataloader_idx = -1 
@@ -137,18 +320,14 @@ class InferenceBackendBase(Callback):
 
         if batch_idx < self.val_batches:
             if self.validation_epoch % self.val_frequency == 0:
-                result = self.run_batch(inputs=batch[0])
-                if not isinstance(result, torch.Tensor):
-                    logging.warning("Could not calculate MSE on target device")
-                    return
-                target = pl_module.forward(batch[0].to(pl_module.device))
-                mse = torch.nn.functional.mse_loss(
-                    result.to(pl_module.device),
-                    target.to(pl_module.device),
-                    reduction="mean",
+                with torch.no_grad():
+                    inputs = self._batch_inputs(pl_module, batch, "val")
+                    if inputs is None:
+                        return
+                    target = pl_module.forward(inputs.to(pl_module.device))
+                self._val_results.append(
+                    self._submit(self._validate_batch, inputs, target.detach())
                 )
-                pl_module.log("val_backend_mse", mse)
-                logging.info("val_backend_mse: %f", mse)
 
     def on_validation_epoch_end(self, trainer, pl_module):
         """
@@ -160,6 +339,17 @@ class InferenceBackendBase(Callback):
         Returns:
 
         """
+        val_results = self._val_results
+        self._val_results = []
+        # errors of the session preparation are more informative than those of the inference
+        self._check_session()
+        results = [future.result() for future in val_results]
+        results = [mse for mse in results if mse is not None]
+        if results:
+            mse = torch.stack(results).mean()
+            pl_module.log("val_backend_mse", mse.to(pl_module.device))
+            logging.info("val_backend_mse: %f", mse)
+
         self.validation_epoch += 1
 
     def on_test_epoch_start(self, trainer, pl_module):
@@ -174,9 +364,14 @@ class InferenceBackendBase(Callback):
         """
         logger.info("Exporting module")
 
-        pl_module = self.quantize(pl_module)
-        self.prepare(pl_module)
-        self.export()
+        self._wait()
+        structure_key, weights_key = self.fingerprint(pl_module)
+        if (structure_key, weights_key) != (self._structure_key, self._weights_key):
+            pl_module = self._timed("quantization", self.quantize, pl_module)
+            self._timed("preparation", self.prepare, pl_module)
+            self._structure_key = structure_key
+            self._weights_key = weights_key
+        self._timed("export", self.export)
 
     def quantize(self, pl_module: torch.nn.Module) -> torch.nn.Module:
         """
@@ -197,7 +392,9 @@ class InferenceBackendBase(Callback):
 
         logger.info("Quantizing module")
 
-        example_inputs = next(iter(pl_module.train_dataloader()))[0]
+        if self._calibration_batch is None:
+            self._calibration_batch = next(iter(pl_module.train_dataloader()))[0]
+        example_inputs = self._calibration_batch
 
         model = torch.ao.quantization.quantize_fx.prepare_fx(
             pl_module.model, qconfig_mapping, example_inputs
@@ -225,12 +422,12 @@ class InferenceBackendBase(Callback):
         """
         if batch_idx < self.test_batches:
             # decode batches from target device
-            if isinstance(batch, Mapping) or isinstance(batch, dict):
-                inputs = batch["data"]
-            else:
-                inputs = batch[0]
+            with torch.no_grad():
+                inputs = self._batch_inputs(pl_module, batch, "test")
+            if inputs is None:
+                return
 
-            result = self.run_batch(inputs=inputs)
+            result = self._timed("inference", self.run_batch, inputs)
             target = pl_module(inputs.to(pl_module.device))
             target = target[: result.shape[0]]
 
@@ -242,6 +439,123 @@ class InferenceBackendBase(Callback):
             pl_module.log("test_backend_mse", mse)
             logging.info("test_backend_mse: %f", mse)
 
+    def on_test_epoch_end(self, trainer, pl_module):
+        """
+
+        Args:
+          trainer:
+          pl_module:
+
+        Returns:
+
+        """
+        if not self.full_evaluation:
+            return
+
+        if "test" in getattr(pl_module, "cached_splits", ()):
+            logger.warning(
+                "Test set uses cached features, skipping the backend evaluation on the full test set"
+            )
+            return
+
+        logger.info("Evaluating backend on the full test set")
+        stats = self.evaluate(
+            pl_module.test_dataloader(),
+            num_sessions=self.num_sessions,
+            preprocess=lambda batch: self._batch_inputs(pl_module, batch, "test"),
+        )
+        for name, value in stats.items():
+            pl_module.log(f"test_backend_{name}", float(value))
+            logger.info("test_backend_%s: %f", name, value)
+
+    def evaluate(self, dataloader, num_sessions: int = 1, preprocess=None):
+        """Run all batches of dataloader through the prepared backend session
+
+        Inputs are copied to reusable input buffers (pinned if cuda is available), one buffer
+        per concurrent inference call.
+
+        Args:
+          dataloader: returns (data, data_length, labels, labels_length) or (data, labels) tuples, or dicts with data and labels
+          num_sessions: number of concurrent inference calls
+          preprocess: maps a batch to the model inputs, defaults to the data of the batch
+
+        Returns: dict with the accuracy, samples per second and batch latency statistics in ms
+        """
+        free_slots = queue.Queue()
+        buffers = [None] * num_sessions
+        for slot in range(num_sessions):
+            free_slots.put(slot)
+
+        def run(slot, size, labels):
+            try:
+                start = time.perf_counter()
+                with torch.no_grad():
+                    result = self.run_batch(inputs=buffers[slot][:size])
+                latency = time.perf_counter() - start
+            finally:
+                free_slots.put(slot)
+            if isinstance(result, (list, tuple)):
+                result = result[0]
+            correct = (result.argmax(dim=-1).cpu() == labels).sum().item()
+            return latency, correct
+
+        latencies = []
+        correct = 0
+        total = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(
+            max_workers=num_sessions, thread_name_prefix="backend_evaluation"
+        ) as executor:
+            futures = []
+            for batch in dataloader:
+                if isinstance(batch, Mapping):
+                    inputs, labels = batch["data"], batch["labels"]
+                elif len(batch) > 2:
+                    inputs, labels = batch[0], batch[2]
+                else:
+                    inputs, labels = batch[0], batch[1]
+                if preprocess is not None:
+                    with torch.no_grad():
+                        inputs = preprocess(batch)
+                size = inputs.shape[0]
+
+                slot = free_slots.get()
+                buffer = buffers[slot]
+                if (
+                    buffer is None
+                    or buffer.shape[0] < size
+                    or buffer.shape[1:] != inputs.shape[1:]
+                    or buffer.dtype != inputs.dtype
+                ):
+                    buffer = torch.empty(inputs.shape, dtype=inputs.dtype)
+                    if torch.cuda.is_available():
+                        buffer = buffer.pin_memory()
+                    buffers[slot] = buffer
+                buffer[:size].copy_(inputs)
+
+                total += size
+                futures.append(
+                    executor.submit(run, slot, size, labels.view(-1).cpu())
+                )
+
+            for future in futures:
+                latency, batch_correct = future.result()
+                latencies.append(latency)
+                correct += batch_correct
+        duration = time.perf_counter() - start
+
+        if not latencies:
+            latencies = [0.0]
+        latencies = np.array(latencies) * 1000.0
+        return {
+            "accuracy": correct / max(total, 1),
+            "samples_per_second": total / duration if duration > 0 else 0.0,
+            "latency_mean_ms": latencies.mean(),
+            "latency_p50_ms": np.percentile(latencies, 50),
+            "latency_p90_ms": np.percentile(latencies, 90),
+            "latency_p99_ms": np.percentile(latencies, 99),
+        }
+
     def export(self) -> None:
         """
         Export the model through the target backend
@@ -252,8 +566,25 @@ class InferenceBackendBase(Callback):
 class TorchMobileBackend(InferenceBackendBase):
     """Inference backend for torch mobile"""
 
-    def __init__(self, val_batches=1, test_batches=1, val_frequency=1):
-        super().__init__(val_batches, test_batches, val_frequency)
+    SUPPORTS_WEIGHT_UPDATE = True
+
+    def __init__(
+        self,
+        val_batches=1,
+        test_batches=1,
+        val_frequency=1,
+        background=True,
+        full_evaluation=False,
+        num_sessions=1,
+    ):
+        super().__init__(
+            val_batches,
+            test_batches,
+            val_frequency,
+            background=background,
+            full_evaluation=full_evaluation,
+            num_sessions=num_sessions,
+        )
 
         self.script_module = None
 
@@ -267,6 +598,17 @@ class TorchMobileBackend(InferenceBackendBase):
         logging.info("Preparing model for target")
         self.script_module = model.to_torchscript(method="trace")
 
+    def update_weights(self, state_dict):
+        """
+
+        Args:
+          state_dict: state dict of the traced module
+
+        Returns (None)
+        """
+        with torch.no_grad():
+            self.script_module.load_state_dict(state_dict)
+
     def run_batch(self, inputs=None):
         """
 
@@ -341,10 +683,20 @@ class OnnxruntimeBackend(InferenceBackendBase):
     """Inference Backend for tensorflow"""
 
     def __init__(
-        self, val_batches=1, test_batches=1, val_frequency=10, use_tf_lite=True
+        self,
+        val_batches=1,
+        test_batches=1,
+        val_frequency=10,
+        use_tf_lite=True,
+        full_evaluation=False,
+        num_sessions=1,
     ):
         super(OnnxruntimeBackend, self).__init__(
-            val_batches=val_batches, test_batches=test_batches, val_frequency=10
+            val_batches=val_batches,
+            test_batches=test_batches,
+            val_frequency=10,
+            full_evaluation=full_evaluation,
+            num_sessions=num_sessions,
         )
 
         self.onnxrt_model = None
@@ -385,6 +737,9 @@ class OnnxruntimeBackend(InferenceBackendBase):
         """
         logging.info("running onnxruntime backend on batch")
 
-        result = self.onnxrt_model.run(inputs=[input.numpy() for input in inputs])
+        # the exported model has a single input with a symbolic batch dimension
+        result = self.onnxrt_model.run(inputs=[inputs.detach().cpu().numpy()])
         result = [torch.from_numpy(res) for res in result]
+        if len(result) == 1:
+            return result[0]
         return result
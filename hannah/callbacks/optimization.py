@@ -95,17 +95,22 @@ class HydraOptCallback(Callback):
             self.directions.append(-1.0)
 
     def on_train_batch_end(self, trainer: "pl.Trainer", pl_module: "pl.LightningModule",  outputs: 'STEP_OUTPUT', batch: Any, batch_idx: int) -> None:
+        # modules accumulating their train metrics only log them on train metric steps
+        is_train_metrics_step = getattr(pl_module, "is_train_metrics_step", None)
+        if is_train_metrics_step is not None and not is_train_metrics_step(batch_idx):
+            return
+
         callback_metrics =  trainer.callback_metrics
 
+        # values stay on the device until they are requested, to avoid synchronizing each batch
         for k, v in callback_metrics.items():
             if k.startswith("train"):
                 if isinstance(v, Tensor):
                     if v.numel() == 1:
-                        value = v.item()
+                        v = v.detach()
                     else:
                         continue
-                value = float(value)
-                self.train_values[k] = value
+                self.train_values[k] = v
 
         for monitor, direction in zip(self.monitor, self.directions):
             if monitor in callback_metrics:
@@ -179,6 +184,10 @@ class HydraOptCallback(Callback):
         """ """
         return self.val_values
 
+    def train_result(self):
+        """ """
+        return {key: float(value) for key, value in self.train_values.items()}
+
     def result(self, dict=False):
         """
 
@@ -541,12 +541,18 @@ class MACSummaryInterpreter(fx.Interpreter):
 
 class FxMACSummaryCallback(MacSummaryCallback):
     def _do_summary(self, pl_module, input=None, print_log=True):
-        interpreter = MACSummaryInterpreter(pl_module.model)
+        # Plain models (e.g. a BasicExecutor of a search space) can be summarized as well,
+        # if an input is given
+        model = getattr(pl_module, "model", pl_module)
+        device = getattr(pl_module, "device", None)
+        if device is None:
+            device = input.device
+        interpreter = MACSummaryInterpreter(model)
         dummy_input = input
-        
+
         if dummy_input is None:
             dummy_input = pl_module.example_feature_array
-        dummy_input = dummy_input.to(pl_module.device)
+        dummy_input = dummy_input.to(device)
         interpreter.run(dummy_input)
 
         total_macs = 0.0
@@ -29,6 +29,7 @@ import torch
 
 from ..utils.utils import extract_from_download_cache, list_all_files
 from .base import AbstractDataset, DatasetType
+from .utils.pack import ArrayPack
 
 msglogger = logging.getLogger()
 
@@ -239,7 +240,32 @@ class PAMAP2_Dataset(AbstractDataset):
         self.input_length = config["input_length"]
         self.label_names = PAMAP2_Dataset.get_class_names()
 
+        self.pack = None
+        self.pack_rows = None
+        self.pack_labels = None
+        pack_folder = self.pack_folder(config)
+        if os.path.exists(os.path.join(pack_folder, "index.json")):
+            pack = ArrayPack(pack_folder)
+            folder = self.prepared_folder(config)
+            names = [os.path.relpath(path, folder) for path, _ in data_files]
+            if all(name in pack for name in names):
+                self.pack = pack
+                self.pack_rows = [
+                    pack.index[name][0] + start
+                    for name, (_, start) in zip(names, data_files)
+                ]
+                self.pack_labels = [pack.labels[name] for name in names]
+
     def __getitem__(self, item):
+        if self.pack is not None:
+            row = self.pack_rows[item]
+            data = torch.from_numpy(
+                np.array(self.pack.data[row : row + self.input_length])
+            )
+            data = data.float().transpose(1, 0)
+            label = torch.Tensor([self.pack_labels[item]]).long()
+            return data, data.shape[0], label, label.shape[0]
+
         path, start = self.data_files[item]
         chunk = PAMAP2_DataChunk(path, start=start, stop=start + self.input_length)
         data = chunk.get_tensor().transpose(1, 0)
@@ -256,6 +282,56 @@ class PAMAP2_Dataset(AbstractDataset):
     @classmethod
     def prepare(cls, config: Dict[str, Any]) -> None:
         cls.download(config)
+        cls.consolidate(config)
+
+    @staticmethod
+    def prepared_folder(config):
+        return os.path.join(config["data_folder"], "pamap2", "pamap2_prepared")
+
+    @staticmethod
+    def pack_folder(config):
+        return os.path.join(config["data_folder"], "pamap2", "pamap2_packed")
+
+    @classmethod
+    def consolidate(cls, config):
+        """Packs the data of all prepared hdf5 files into a single memory mapped file"""
+        folder = cls.prepared_folder(config)
+        names = [
+            os.path.relpath(os.path.join(root, file_name), folder)
+            for root, dirs, files in os.walk(folder)
+            for file_name in files
+        ]
+
+        def load(name):
+            with h5py.File(os.path.join(folder, name), "r") as f:
+                return f["dataset"][()]
+
+        def label(name):
+            with h5py.File(os.path.join(folder, name), "r") as f:
+                return f["dataset"].attrs["label"]
+
+        ArrayPack.open_or_create(cls.pack_folder(config), names, load, label_fn=label)
+
+    @classmethod
+    def _file_lengths(cls, config):
+        """Paths and number of datapoints of the prepared files"""
+        folder = cls.prepared_folder(config)
+        pack_folder = cls.pack_folder(config)
+        if os.path.exists(os.path.join(pack_folder, "index.json")):
+            pack = ArrayPack(pack_folder)
+            return [
+                (os.path.join(folder, name), length)
+                for name, (_, length) in pack.index.items()
+            ]
+
+        file_lengths = []
+        for root, dirs, files in os.walk(folder):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                with h5py.File(path, "r") as f:
+                    length = len(f["dataset"][()])
+                file_lengths.append((path, length))
+        return file_lengths
 
     @staticmethod
     def get_class_names():
@@ -271,6 +347,10 @@ class PAMAP2_Dataset(AbstractDataset):
     @property
     def class_counts(self) -> Optional[Dict[int, int]]:
         counts = defaultdict(int)
+        if self.pack is not None:
+            for label in self.pack_labels:
+                counts[label] += 1
+            return counts
         for path, start in self.data_files:
             chunk = PAMAP2_DataChunk(path, start=start, stop=start + self.input_length)
             label = chunk.get_label()
@@ -284,32 +364,26 @@ class PAMAP2_Dataset(AbstractDataset):
 
         input_length = config["input_length"]
 
-        folder = os.path.join(config["data_folder"], "pamap2", "pamap2_prepared")
-
         sets = [[], [], []]
 
-        for root, dirs, files in os.walk(folder):
-            for file_name in files:
-                path = os.path.join(root, file_name)
-                with h5py.File(path, "r") as f:
-                    length = len(f["dataset"][()])
-                max_no_files = 2**27 - 1
-                start = 0
-                stop = length
-                step = input_length
-                for i in range(start, stop, step):
-                    if i + step >= stop - 1:
-                        continue
-                    chunk_hash = f"{path}{i}"
-                    bucket = int(hashlib.sha1(chunk_hash.encode()).hexdigest(), 16)
-                    bucket = (bucket % (max_no_files + 1)) * (100.0 / max_no_files)
-                    if bucket < dev_pct:
-                        tag = DatasetType.DEV
-                    elif bucket < test_pct + dev_pct:
-                        tag = DatasetType.TEST
-                    else:
-                        tag = DatasetType.TRAIN
-                    sets[tag.value] += [(path, i)]
+        for path, length in cls._file_lengths(config):
+            max_no_files = 2**27 - 1
+            start = 0
+            stop = length
+            step = input_length
+            for i in range(start, stop, step):
+                if i + step >= stop - 1:
+                    continue
+                chunk_hash = f"{path}{i}"
+                bucket = int(hashlib.sha1(chunk_hash.encode()).hexdigest(), 16)
+                bucket = (bucket % (max_no_files + 1)) * (100.0 / max_no_files)
+                if bucket < dev_pct:
+                    tag = DatasetType.DEV
+                elif bucket < test_pct + dev_pct:
+                    tag = DatasetType.TEST
+                else:
+                    tag = DatasetType.TRAIN
+                sets[tag.value] += [(path, i)]
 
         datasets = (
             cls(sets[DatasetType.TRAIN.value], DatasetType.TRAIN, config),
@@ -323,25 +397,20 @@ class PAMAP2_Dataset(AbstractDataset):
 
         input_length = config["input_length"]
 
-        folder = os.path.join(config["data_folder"], "pamap2", "pamap2_prepared")
-
         sets_by_subject = defaultdict(list)
 
-        for root, dirs, files in os.walk(folder):
+        for path, length in cls._file_lengths(config):
+            root, _ = os.path.split(path)
             subject_folder, _ = os.path.split(root)
             _, subject_id = os.path.split(subject_folder)
-            for file_name in files:
-                path = os.path.join(root, file_name)
-                with h5py.File(path, "r") as f:
-                    length = len(f["dataset"][()])
-                start = 0
-                stop = length
-                step = input_length
-                for i in range(start, stop, step):
-                    if i + step >= stop - 1:
-                        continue
-
-                    sets_by_subject[subject_id] += [(path, i)]
+            start = 0
+            stop = length
+            step = input_length
+            for i in range(start, stop, step):
+                if i + step >= stop - 1:
+                    continue
+
+                sets_by_subject[subject_id] += [(path, i)]
 
         return [
             cls(files, DatasetType.TRAIN.value, config)
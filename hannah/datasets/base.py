@@ -138,6 +138,15 @@ class AbstractDataset(Dataset, ABC):
             weights = [1 / i for i in counts]
             return weights
 
+    @property
+    def sample_lengths(self) -> Optional[List[int]]:
+        """Returns the length of each data item if it is known without loading the items
+
+        Used for batching items of similar length, datasets with variable length items
+        should implement this if their lengths can be determined cheaply.
+        """
+        return None
+
     @property
     def sequential(self) -> bool:
         """Returns true if this dataset should only be iterated sequentially"""
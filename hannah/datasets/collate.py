@@ -139,38 +139,47 @@ def ctc_collate_fn(data):
         trg_lengths: torch tensor of shape (batch_size); valid length for each padded target sequence.
     """
 
-    def merge(sequences):
-        lengths = [seq.shape[-1] for seq in sequences]
-        max_length = max(lengths)
-
-        padded_seqs = []
-
-        for item in sequences:
-            padded = torch.nn.functional.pad(
-                input=item,
-                pad=(0, max_length - item.shape[-1]),
-                mode="constant",
-                value=0,
-            )
-            padded_seqs.append(padded)
-
-        return padded_seqs, lengths
-
     # seperate source and target sequences
     src_seqs, src_lengths, trg_seqs, trg_lengths = zip(*data)
 
     # merge sequences (from tuple of 1D tensor to 2D tensor)
-    src_seqs, src_lengths = merge(src_seqs)
-    trg_seqs, trg_lengths = merge(trg_seqs)
+    src_seqs, src_lengths = _pad_stack(src_seqs)
+    trg_seqs, trg_lengths = _pad_stack(trg_seqs)
 
     return (
-        torch.stack(src_seqs),
+        src_seqs,
         torch.Tensor(src_lengths),
-        torch.stack(trg_seqs),
+        trg_seqs,
         torch.Tensor(trg_lengths),
     )
 
 
+def _pad_stack(sequences):
+    """Stack tensors along a new batch dimension, zero padding their last dimension to the maximum length
+
+    The batch is allocated once and the sequences are copied into it. In dataloader workers the batch
+    is allocated in shared memory, like in the default collate function of pytorch, so it is not
+    copied again when it is sent to the main process.
+    """
+    lengths = [seq.shape[-1] for seq in sequences]
+    elem = sequences[0]
+    shape = (len(sequences),) + tuple(elem.shape[:-1]) + (max(lengths),)
+
+    if torch.utils.data.get_worker_info() is not None:
+        numel = 1
+        for size in shape:
+            numel *= size
+        storage = elem._typed_storage()._new_shared(numel, device=elem.device)
+        out = elem.new(storage).resize_(shape).zero_()
+    else:
+        out = elem.new_zeros(shape)
+
+    for i, seq in enumerate(sequences):
+        out[i, ..., : lengths[i]] = seq
+
+    return out, lengths
+
+
 # FIXME: replace by datasets
 def object_collate_fn(data):
     return tuple(zip(*data))
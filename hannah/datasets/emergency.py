@@ -16,11 +16,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import math
 import os
 import random
 from collections import defaultdict
 
 import torch
+import torchaudio
 
 from ..utils.utils import extract_from_download_cache, list_all_files
 from .base import AbstractDataset, DatasetType
@@ -44,6 +46,7 @@ class EmergencySirenDataset(AbstractDataset):
         self.input_length = config["input_length"]
 
         self.channels = 1  # Use mono
+        self._sample_lengths = None
 
     @classmethod
     def class_labels(cls):
@@ -60,6 +63,18 @@ class EmergencySirenDataset(AbstractDataset):
             counts[label] += 1
         return counts
 
+    @property
+    def sample_lengths(self):
+        if self._sample_lengths is None:
+            lengths = []
+            for index in self.random_order:
+                info = torchaudio.info(self.audio_files[index])
+                # length after resampling
+                length = math.ceil(info.num_frames * self.samplingrate / info.sample_rate)
+                lengths.append(min(length, self.input_length))
+            self._sample_lengths = lengths
+        return self._sample_lengths
+
     @classmethod
     def prepare(cls, config):
         cls.download(config)
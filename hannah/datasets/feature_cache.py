@@ -0,0 +1,144 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Callable, Union
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset
+
+msglogger = logging.getLogger(__name__)
+
+
+class FeatureCacheDataset(Dataset):
+    """Replaces the inputs of a stream dataset by precomputed features.
+
+    The features of all items are stored in a memory mapped `features.npy` in the cache folder,
+    the labels in `labels.npy`. Items have the same format as the items of the wrapped dataset
+    (data, data length, label, label length), with data being the features of the original item.
+    All other attributes are forwarded to the wrapped dataset.
+
+    As the features are computed once, random preprocessing of the wrapped dataset (e.g. noise
+    or time shifts) is fixed to the realization seen while creating the cache.
+    """
+
+    def __init__(self, dataset: Dataset, folder: Union[str, Path]) -> None:
+        self.dataset = dataset
+        self.folder = Path(folder)
+        self.features = np.load(self.folder / "features.npy", mmap_mode="r")
+        self.labels = np.load(self.folder / "labels.npy")
+
+        if len(self.features) != len(dataset):
+            raise ValueError(
+                f"Feature cache {self.folder} has {len(self.features)} items, but dataset has {len(dataset)} items"
+            )
+
+    def __getattr__(self, name):
+        if name == "dataset":
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
+
+    def __getitem__(self, index):
+        data = torch.from_numpy(np.array(self.features[index]))
+        label = torch.from_numpy(self.labels[index])
+        return data, data.shape[-1], label, label.shape[0]
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    @classmethod
+    def create(
+        cls,
+        folder: Union[str, Path],
+        dataset: Dataset,
+        extract_fn: Callable[[torch.Tensor, torch.Tensor], torch.Tensor],
+        batch_size: int = 128,
+        num_workers: int = 0,
+    ) -> "FeatureCacheDataset":
+        """Run extract_fn(data, data_length) on all inputs of the dataset and store the results in folder
+
+        The cache is written to a temporary folder first and then moved to its final location,
+        so concurrent processes creating the same cache never see a partially written cache.
+        """
+        folder = Path(folder)
+        folder.parent.mkdir(parents=True, exist_ok=True)
+        tmp_folder = Path(tempfile.mkdtemp(prefix=folder.name + ".", dir=folder.parent))
+
+        loader = DataLoader(
+            dataset,
+            batch_size=batch_size,
+            shuffle=False,
+            num_workers=num_workers,
+            multiprocessing_context="fork" if num_workers > 0 else None,
+        )
+
+        try:
+            features = None
+            labels = []
+            offset = 0
+            with torch.no_grad():
+                for x, x_length, y, _ in loader:
+                    batch_features = extract_fn(x, x_length).cpu().numpy()
+                    if features is None:
+                        features = np.lib.format.open_memmap(
+                            tmp_folder / "features.npy",
+                            mode="w+",
+                            dtype=np.float32,
+                            shape=(len(dataset),) + batch_features.shape[1:],
+                        )
+                    features[offset : offset + len(batch_features)] = batch_features
+                    offset += len(batch_features)
+                    labels.append(y.numpy())
+
+            if features is None:
+                raise ValueError(f"Can not cache the features of an empty dataset in {folder}")
+            features.flush()
+            del features
+            np.save(tmp_folder / "labels.npy", np.concatenate(labels))
+
+            try:
+                os.rename(tmp_folder, folder)
+            except OSError:
+                # another process has created the cache in the meantime
+                if not (folder / "labels.npy").exists():
+                    raise
+        finally:
+            if tmp_folder.exists():
+                shutil.rmtree(tmp_folder, ignore_errors=True)
+
+        msglogger.info("Cached features of %d items in %s", offset, folder)
+        return cls(dataset, folder)
+
+    @classmethod
+    def open_or_create(
+        cls,
+        folder: Union[str, Path],
+        dataset: Dataset,
+        extract_fn: Callable[[torch.Tensor, torch.Tensor], torch.Tensor],
+        batch_size: int = 128,
+        num_workers: int = 0,
+    ) -> "FeatureCacheDataset":
+        folder = Path(folder)
+        if (folder / "labels.npy").exists():
+            return cls(dataset, folder)
+        return cls.create(folder, dataset, extract_fn, batch_size=batch_size, num_workers=num_workers)
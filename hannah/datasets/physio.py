@@ -29,11 +29,15 @@ import wfdb
 
 from ..utils.utils import extract_from_download_cache, list_all_files
 from .base import AbstractDataset, DatasetType
+from .utils.pack import ArrayPack
 
 logger = logging.getLogger(__name__)
 
 
 class PhysioDataset(AbstractDataset):
+    # folder of the prepared samples relative to data_folder
+    PREPARED_FOLDER = None
+
     def __init__(self, data, set_type, config, dataset_name=None):
         super().__init__()
         self.physio_files = list(data.keys())
@@ -48,6 +52,48 @@ class PhysioDataset(AbstractDataset):
 
         self.dataset_name = dataset_name
 
+        self.pack = None
+        self.pack_rows = None
+        if self.PREPARED_FOLDER is not None:
+            pack_folder = self.pack_folder(config)
+            if os.path.exists(os.path.join(pack_folder, "index.json")):
+                pack = ArrayPack(pack_folder)
+                prepared_folder = os.path.join(
+                    config["data_folder"], self.PREPARED_FOLDER
+                )
+                names = [
+                    os.path.relpath(path, prepared_folder) for path in self.physio_files
+                ]
+                if all(name in pack for name in names):
+                    self.pack = pack
+                    self.pack_rows = [pack.index[name][0] for name in names]
+
+    @classmethod
+    def pack_folder(cls, config):
+        return os.path.join(config["data_folder"], cls.PREPARED_FOLDER + "_packed")
+
+    @classmethod
+    def consolidate(cls, config):
+        """Packs all prepared samples into a single memory mapped file, one row per sample"""
+        prepared_folder = os.path.join(config["data_folder"], cls.PREPARED_FOLDER)
+        names = [
+            os.path.join(label, filename)
+            for label in sorted(os.listdir(prepared_folder))
+            for filename in sorted(os.listdir(os.path.join(prepared_folder, label)))
+        ]
+
+        def load(name):
+            with open(os.path.join(prepared_folder, name), "rb") as f:
+                return pickle.load(f)[np.newaxis]
+
+        label_mapping = cls.get_label_mapping()
+        ArrayPack.open_or_create(
+            cls.pack_folder(config),
+            names,
+            load,
+            label_fn=lambda name: label_mapping[os.path.dirname(name)],
+        )
+
     @property
     def class_names(self):
         return self.label_names.values()
@@ -58,8 +104,11 @@ class PhysioDataset(AbstractDataset):
 
     def __getitem__(self, index):
         label = torch.Tensor([self.physio_labels[index]]).long()
-        with open(self.physio_files[index], "rb") as f:
-            data = pickle.load(f)
+        if self.pack is not None:
+            data = np.array(self.pack.data[self.pack_rows[index]])
+        else:
+            with open(self.physio_files[index], "rb") as f:
+                data = pickle.load(f)
         data = torch.from_numpy(data).float()
         if self.dataset_name == "PhysioCinc":
             data = data - 0.01
@@ -89,6 +138,8 @@ class PhysioCincDataset(PhysioDataset):
     LABEL_OTHER_RYTHM = "O"
     LABEL_NOISY = "~"
 
+    PREPARED_FOLDER = "cinc_2017_prepared"
+
     def __init__(self, data, set_type, config):
         super().__init__(data, set_type, config, "PhysioCinc")
         self.samplingrate = config["samplingrate"]
@@ -126,6 +177,7 @@ class PhysioCincDataset(PhysioDataset):
     def prepare(cls, config):
         cls.download(config)
         cls.prepare_files(config)
+        cls.consolidate(config)
 
     @classmethod
     def download(cls, config):
@@ -263,6 +315,8 @@ class AtrialFibrillationDataset(PhysioDataset):
     ANN_JUNCTIONAL_RYTHM = "(J"
     ANN_OTHER_RYTHM = "(N"
 
+    PREPARED_FOLDER = "atrial_fibrillation_prepared"
+
     def __init__(self, data, set_type, config):
         self.label_names = self.get_label_names()
 
@@ -306,6 +360,7 @@ class AtrialFibrillationDataset(PhysioDataset):
     def prepare(cls, config):
         cls.download(config)
         cls.prepare_files(config)
+        cls.consolidate(config)
 
     @classmethod
     def download(cls, config):
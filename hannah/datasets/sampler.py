@@ -0,0 +1,109 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import logging
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset, Sampler
+
+msglogger = logging.getLogger(__name__)
+
+
+def sample_lengths(dataset: Dataset) -> List[int]:
+    """Returns the lengths of the data items of a dataset
+
+    Uses the `sample_lengths` of the dataset if available, otherwise all items are loaded once.
+    """
+    lengths = getattr(dataset, "sample_lengths", None)
+    if lengths is None:
+        msglogger.info("Loading all %d items of the dataset to determine their lengths", len(dataset))
+        lengths = [dataset[i][0].shape[-1] for i in range(len(dataset))]
+    return list(lengths)
+
+
+class LengthBucketingBatchSampler(Sampler[List[int]]):
+    """Batch sampler grouping items of similar length into the same batches
+
+    Each epoch, the shuffled items are split into buckets of `batch_size * bucket_batches` items,
+    the items of each bucket are sorted by length and split into batches, and the order of all batches
+    is shuffled. This reduces the padding of dynamically padded batches, while the batches of an epoch
+    stay random.
+
+    Args:
+        lengths: length of each item of the dataset
+        batch_size: number of items per batch
+        bucket_batches: number of batches per bucket, larger buckets reduce the padding but make batches less random
+        drop_last: drop the last incomplete batch
+        shuffle: shuffle the items and batches, if false the buckets are filled in the order of the dataset
+        generator: random number generator used for shuffling
+    """
+
+    def __init__(
+        self,
+        lengths: Sequence[int],
+        batch_size: int,
+        bucket_batches: int = 100,
+        drop_last: bool = False,
+        shuffle: bool = True,
+        generator: Optional[torch.Generator] = None,
+    ) -> None:
+        if batch_size <= 0 or bucket_batches <= 0:
+            raise ValueError(f"batch_size and bucket_batches must be positive, got {batch_size} and {bucket_batches}")
+
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.bucket_batches = bucket_batches
+        self.drop_last = drop_last
+        self.shuffle = shuffle
+        self.generator = generator
+
+    def __iter__(self) -> Iterator[List[int]]:
+        generator = self.generator
+        if generator is None:
+            # same seeding as torch.utils.data.RandomSampler
+            seed = int(torch.empty((), dtype=torch.int64).random_().item())
+            generator = torch.Generator()
+            generator.manual_seed(seed)
+
+        n = len(self.lengths)
+        if self.shuffle:
+            order = torch.randperm(n, generator=generator).numpy()
+        else:
+            order = np.arange(n)
+
+        bucket_size = self.batch_size * self.bucket_batches
+        batches = []
+        for start in range(0, n, bucket_size):
+            bucket = order[start : start + bucket_size]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind="stable")]
+            for batch_start in range(0, len(bucket), self.batch_size):
+                batch = bucket[batch_start : batch_start + self.batch_size]
+                if len(batch) == self.batch_size or not self.drop_last:
+                    batches.append(batch.tolist())
+
+        if self.shuffle:
+            batches = [batches[i] for i in torch.randperm(len(batches), generator=generator).tolist()]
+
+        return iter(batches)
+
+    def __len__(self) -> int:
+        if self.drop_last:
+            return len(self.lengths) // self.batch_size
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
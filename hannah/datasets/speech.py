@@ -39,7 +39,9 @@ from .base import AbstractDataset, DatasetType
 from .DatasetSplit import DatasetSplit
 from .Downsample import Downsample
 from .NoiseDataset import NoiseDataset
+from .waveform_augmentation import WaveformAugmentation
 from .utils import cachify
+from .utils.pack import WaveformPack, pack_name
 
 msglogger = logging.getLogger()
 
@@ -91,9 +93,13 @@ class SpeechDataset(AbstractDataset):
             filter(lambda x: x.endswith("wav"), config.get("bg_noise_files", []))
         )
         self.samplingrate = config["samplingrate"]
+
+        self.pack = None
+        if config.get("pack_audio", False):
+            self.pack = self._open_pack(config)
+
         self.bg_noise_audio = [
-            load_audio(file, sr=self.samplingrate)[0]
-            for file in config["bg_noise_files"]
+            self.load_waveform(file) for file in config["bg_noise_files"]
         ]
         self.unknown_prob = config["unknown_prob"]
         self.silence_prob = config["silence_prob"]
@@ -111,6 +117,9 @@ class SpeechDataset(AbstractDataset):
         self.test_snr = config["test_snr"]
         self.channels = 1  # FIXME: add config option
 
+        self.batched_augmentation = config.get("batched_augmentation", False)
+        self.raw_input_length = config.get("raw_input_length", None) or self.input_length
+
     @property
     def label_list(self):
         return self.audio_labels + [self.silence_class] * self.n_silence
@@ -127,6 +136,33 @@ class SpeechDataset(AbstractDataset):
     def prepare(cls, config):
         cls.prepare_data(config)
 
+    def _open_pack(self, config):
+        """Opens the waveform pack of this split, creating it on first use"""
+        files = self.audio_files + config["bg_noise_files"]
+        dtype = config.get("pack_dtype", "float16")
+        pack_folder = config.get("pack_folder", None)
+        if not pack_folder:
+            pack_folder = os.path.join(config["data_folder"], "packed")
+
+        name = pack_name(
+            f"{type(self).__name__}_{self.set_type.name.lower()}",
+            files,
+            samplingrate=self.samplingrate,
+            dtype=dtype,
+        )
+        return WaveformPack.open_or_create(
+            os.path.join(pack_folder, name),
+            files,
+            lambda file: _load_audio(file, sr=self.samplingrate)[0],
+            dtype=dtype,
+        )
+
+    def load_waveform(self, file):
+        """Loads the first channel of an audio file, resampled to self.samplingrate"""
+        if self.pack is not None and file in self.pack:
+            return self.pack.load(file)
+        return load_audio(file, sr=self.samplingrate)[0]
+
     def _timeshift_audio(self, data):
         """Shifts data by a random amount of ms given by parameter timeshift_ms"""
         shift = (self.samplingrate * self.timeshift_ms) // 1000
@@ -187,7 +223,7 @@ class SpeechDataset(AbstractDataset):
         if silence:
             data = np.zeros(in_len, dtype=np.float32)
         else:
-            data = load_audio(example, sr=self.samplingrate)[0]
+            data = self.load_waveform(example)
 
             extract_index = (0, len(data))
 
@@ -263,10 +299,51 @@ class SpeechDataset(AbstractDataset):
 
         return classcounter
 
+    def batch_augmentation(self, seed=None):
+        """Returns a module running the waveform preprocessing of this dataset on batches of raw waveforms
+
+        Only used if the dataset is configured with `batched_augmentation`, in this case the dataset
+        itself returns the raw waveforms zero padded to `raw_input_length` and their lengths.
+        If no seed is given, it is drawn from the torch random number generator.
+        """
+        if seed is None:
+            seed = int(torch.randint(2**62, (1,)))
+
+        if self.set_type == DatasetType.TEST:
+            snr_low = snr_high = self.test_snr
+        else:
+            snr_low, snr_high = self.train_snr_low, self.train_snr_high
+
+        return WaveformAugmentation(
+            self.input_length,
+            samplingrate=self.samplingrate,
+            timeshift_ms=self.timeshift_ms,
+            extract=self.extract,
+            snr_low=snr_low,
+            snr_high=snr_high,
+            symmetric_shift=self.set_type == DatasetType.TRAIN,
+            noise=self.bg_noise_audio,
+            seed=seed,
+        )
+
+    def _raw_item(self, index):
+        if index >= len(self.audio_labels):
+            data = np.zeros(0, dtype=np.float32)
+        else:
+            data = self.load_waveform(self.audio_files[index])[: self.raw_input_length]
+
+        padded = np.zeros(self.raw_input_length, dtype=np.float32)
+        padded[: len(data)] = data
+        return torch.from_numpy(padded), len(data)
+
     def __getitem__(self, index):
         label = torch.Tensor(self.get_class(index))
         label = label.long()
 
+        if self.batched_augmentation:
+            data, length = self._raw_item(index)
+            return data.unsqueeze(dim=0), length, label, label.shape[0]
+
         if index >= len(self.audio_labels):
             data = self.preprocess(None, silence=True)
         else:
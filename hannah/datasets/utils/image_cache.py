@@ -0,0 +1,130 @@
+#
+# Copyright (c) 2024 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import logging
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class ImageCache:
+    """Decoded images of a dataset stored in a single memory mapped uint8 array.
+
+    `images.npy` in the cache folder contains all images in (height, width, channels) layout,
+    so all cached images must have the same shape, e.g. because they have been resized to the
+    target resolution while creating the cache.
+    """
+
+    def __init__(self, folder: Union[str, Path]) -> None:
+        self.folder = Path(folder)
+        self._images = None
+        self.shape = tuple(self.images.shape)
+
+    @property
+    def images(self) -> np.ndarray:
+        # Mapped lazily, so that each dataloader worker maps the file itself
+        if self._images is None:
+            self._images = np.load(self.folder / "images.npy", mmap_mode="r")
+        return self._images
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.images[index]
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    @classmethod
+    def create(
+        cls,
+        folder: Union[str, Path],
+        paths: Iterable,
+        load_fn: Callable[[str], np.ndarray],
+        num_threads: int = 8,
+    ) -> "ImageCache":
+        """Decode the images with load_fn and store them in a new cache in folder.
+
+        Images are decoded by a pool of threads, load_fn should release the GIL while decoding
+        (e.g. by using opencv). The cache is written to a temporary folder first and then moved to
+        its final location, so concurrent processes never see a partially written cache.
+        """
+        paths = list(paths)
+        if not paths:
+            raise ValueError(f"Can not create an empty image cache in {folder}")
+
+        folder = Path(folder)
+        folder.parent.mkdir(parents=True, exist_ok=True)
+        tmp_folder = Path(tempfile.mkdtemp(prefix=folder.name + ".", dir=folder.parent))
+
+        try:
+            images = None
+            with ThreadPoolExecutor(max_workers=num_threads) as executor:
+                for index, image in enumerate(executor.map(load_fn, paths)):
+                    image = np.asarray(image)
+                    if images is None:
+                        images = np.lib.format.open_memmap(
+                            tmp_folder / "images.npy",
+                            mode="w+",
+                            dtype=np.uint8,
+                            shape=(len(paths),) + image.shape,
+                        )
+                    if image.shape != images.shape[1:]:
+                        raise ValueError(
+                            f"Image {paths[index]} has shape {image.shape}, expected {images.shape[1:]}, "
+                            "set a cache resolution to resize images of different sizes"
+                        )
+                    images[index] = image
+            images.flush()
+            del images
+
+            try:
+                os.rename(tmp_folder, folder)
+            except OSError:
+                # another process has created the cache in the meantime
+                if not (folder / "images.npy").exists():
+                    raise
+        finally:
+            if tmp_folder.exists():
+                shutil.rmtree(tmp_folder, ignore_errors=True)
+
+        logger.info("Cached %d decoded images in %s", len(paths), folder)
+        return cls(folder)
+
+    @classmethod
+    def open_or_create(
+        cls,
+        folder: Union[str, Path],
+        paths: Iterable,
+        load_fn: Callable[[str], np.ndarray],
+        num_threads: int = 8,
+    ) -> "ImageCache":
+        folder = Path(folder)
+        if (folder / "images.npy").exists():
+            return cls(folder)
+        return cls.create(folder, paths, load_fn, num_threads=num_threads)
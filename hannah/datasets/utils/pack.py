@@ -0,0 +1,286 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Callable, Iterable, Optional, Union
+
+import numpy as np
+
+msglogger = logging.getLogger(__name__)
+
+_INT16_SCALE = 32767.0
+
+
+class WaveformPack:
+    """A store of many 1d waveforms packed into a single memory mapped file.
+
+    The pack folder contains `data.bin` with the concatenated samples of all waveforms and
+    `index.json` with the offset and length of each waveform. Opening a pack only maps the
+    data file, so it can be shared between dataloader workers without copying it.
+
+    Supported storage dtypes are float32, float16 and int16 (scaled from [-1.0, 1.0]).
+    """
+
+    DTYPES = ("float32", "float16", "int16")
+
+    def __init__(self, folder: Union[str, Path]) -> None:
+        self.folder = Path(folder)
+        with (self.folder / "index.json").open() as index_file:
+            index = json.load(index_file)
+        self.dtype = index["dtype"]
+        self.index = {
+            name: (offset, length) for name, offset, length in index["waveforms"]
+        }
+        self._data = None
+
+    @property
+    def data(self) -> np.ndarray:
+        # Mapped lazily, so that each dataloader worker maps the file itself
+        if self._data is None:
+            path = self.folder / "data.bin"
+            if path.stat().st_size == 0:
+                self._data = np.zeros(0, dtype=self.dtype)
+            else:
+                self._data = np.memmap(path, dtype=self.dtype, mode="r")
+        return self._data
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_data"] = None
+        return state
+
+    def __contains__(self, name) -> bool:
+        return str(name) in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def raw(self, name) -> np.ndarray:
+        """The stored samples of a waveform as a read only view of the memory map"""
+        offset, length = self.index[str(name)]
+        return self.data[offset : offset + length]
+
+    def load(self, name) -> np.ndarray:
+        """The samples of a waveform as float32 array"""
+        data = self.raw(name)
+        if self.dtype == "int16":
+            return data.astype(np.float32) / _INT16_SCALE
+        return np.asarray(data, dtype=np.float32)
+
+    @classmethod
+    def create(
+        cls,
+        folder: Union[str, Path],
+        names: Iterable,
+        load_fn: Callable[[str], np.ndarray],
+        dtype: str = "float16",
+    ) -> "WaveformPack":
+        """Load the waveforms with load_fn and write them to a new pack in folder.
+
+        The pack is written to a temporary folder first and then moved to its final location,
+        so concurrent processes creating the same pack never see a partially written pack.
+        """
+        if dtype not in cls.DTYPES:
+            raise ValueError(f"Unsupported dtype {dtype} for waveform pack, use one of {cls.DTYPES}")
+
+        folder = Path(folder)
+        folder.parent.mkdir(parents=True, exist_ok=True)
+        tmp_folder = Path(tempfile.mkdtemp(prefix=folder.name + ".", dir=folder.parent))
+
+        waveforms = []
+        offset = 0
+        try:
+            with (tmp_folder / "data.bin").open("wb") as data_file:
+                for name in names:
+                    data = np.asarray(load_fn(name), dtype=np.float32).reshape(-1)
+                    if dtype == "int16":
+                        data = np.round(np.clip(data, -1.0, 1.0) * _INT16_SCALE)
+                    data_file.write(data.astype(dtype).tobytes())
+                    waveforms.append((str(name), offset, len(data)))
+                    offset += len(data)
+
+            with (tmp_folder / "index.json").open("w") as index_file:
+                json.dump({"dtype": dtype, "waveforms": waveforms}, index_file)
+
+            try:
+                os.rename(tmp_folder, folder)
+            except OSError:
+                # another process has created the pack in the meantime
+                if not (folder / "index.json").exists():
+                    raise
+        finally:
+            if tmp_folder.exists():
+                shutil.rmtree(tmp_folder, ignore_errors=True)
+
+        msglogger.info("Packed %d waveforms (%d samples) into %s", len(waveforms), offset, folder)
+        return cls(folder)
+
+    @classmethod
+    def open_or_create(
+        cls,
+        folder: Union[str, Path],
+        names: Iterable,
+        load_fn: Callable[[str], np.ndarray],
+        dtype: str = "float16",
+    ) -> "WaveformPack":
+        folder = Path(folder)
+        if (folder / "index.json").exists():
+            return cls(folder)
+        return cls.create(folder, names, load_fn, dtype=dtype)
+
+
+class ArrayPack:
+    """A store of many arrays with a common item shape packed into a single memory mapped file.
+
+    Each stored array of shape (length, *item_shape) is an entry of the pack, `data.bin` contains
+    the rows of all entries concatenated along the first axis and `index.json` the offset, length
+    and optional label of each entry. Slices of an entry are read directly from the memory map.
+    """
+
+    def __init__(self, folder: Union[str, Path]) -> None:
+        self.folder = Path(folder)
+        with (self.folder / "index.json").open() as index_file:
+            index = json.load(index_file)
+        self.dtype = index["dtype"]
+        self.item_shape = tuple(index["item_shape"])
+        self.index = {}
+        self.labels = {}
+        for name, offset, length, label in index["entries"]:
+            self.index[name] = (offset, length)
+            self.labels[name] = label
+        self._data = None
+
+    @property
+    def data(self) -> np.ndarray:
+        # Mapped lazily, so that each dataloader worker maps the file itself
+        if self._data is None:
+            path = self.folder / "data.bin"
+            if path.stat().st_size == 0:
+                self._data = np.zeros((0,) + self.item_shape, dtype=self.dtype)
+            else:
+                self._data = np.memmap(path, dtype=self.dtype, mode="r").reshape(
+                    (-1,) + self.item_shape
+                )
+        return self._data
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_data"] = None
+        return state
+
+    def __contains__(self, name) -> bool:
+        return str(name) in self.index
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def rows(self, name, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Rows start:stop of an entry as a read only view of the memory map"""
+        offset, length = self.index[str(name)]
+        stop = length if stop is None else min(stop, length)
+        return self.data[offset + start : offset + stop]
+
+    @classmethod
+    def create(
+        cls,
+        folder: Union[str, Path],
+        names: Iterable,
+        load_fn: Callable[[str], np.ndarray],
+        label_fn: Optional[Callable[[str], int]] = None,
+        dtype: str = "float32",
+    ) -> "ArrayPack":
+        """Load the entries with load_fn (and their labels with label_fn) and write them to a new pack in folder.
+
+        The pack is written to a temporary folder first and then moved to its final location,
+        so concurrent processes creating the same pack never see a partially written pack.
+        """
+        folder = Path(folder)
+        folder.parent.mkdir(parents=True, exist_ok=True)
+        tmp_folder = Path(tempfile.mkdtemp(prefix=folder.name + ".", dir=folder.parent))
+
+        entries = []
+        item_shape = None
+        offset = 0
+        try:
+            with (tmp_folder / "data.bin").open("wb") as data_file:
+                for name in names:
+                    data = np.asarray(load_fn(name), dtype=dtype)
+                    if item_shape is None:
+                        item_shape = data.shape[1:]
+                    elif data.shape[1:] != item_shape:
+                        raise ValueError(
+                            f"Entry {name} has item shape {data.shape[1:]}, expected {item_shape}"
+                        )
+                    data_file.write(np.ascontiguousarray(data).tobytes())
+                    label = int(label_fn(name)) if label_fn is not None else None
+                    entries.append((str(name), offset, len(data), label))
+                    offset += len(data)
+
+            with (tmp_folder / "index.json").open("w") as index_file:
+                json.dump(
+                    {
+                        "dtype": dtype,
+                        "item_shape": list(item_shape or ()),
+                        "entries": entries,
+                    },
+                    index_file,
+                )
+
+            try:
+                os.rename(tmp_folder, folder)
+            except OSError:
+                # another process has created the pack in the meantime
+                if not (folder / "index.json").exists():
+                    raise
+        finally:
+            if tmp_folder.exists():
+                shutil.rmtree(tmp_folder, ignore_errors=True)
+
+        msglogger.info("Packed %d arrays (%d rows) into %s", len(entries), offset, folder)
+        return cls(folder)
+
+    @classmethod
+    def open_or_create(
+        cls,
+        folder: Union[str, Path],
+        names: Iterable,
+        load_fn: Callable[[str], np.ndarray],
+        label_fn: Optional[Callable[[str], int]] = None,
+        dtype: str = "float32",
+    ) -> "ArrayPack":
+        folder = Path(folder)
+        if (folder / "index.json").exists():
+            return cls(folder)
+        return cls.create(folder, names, load_fn, label_fn=label_fn, dtype=dtype)
+
+
+def pack_name(prefix: str, names: Iterable, **kwargs) -> str:
+    """A folder name for a pack identifying its waveforms and loading options"""
+    h = hashlib.md5()
+    for name in sorted(str(n) for n in names):
+        h.update(name.encode())
+        h.update(b"\0")
+    for key, value in sorted(kwargs.items()):
+        h.update(f"{key}={value};".encode())
+    return f"{prefix}_{h.hexdigest()}"
@@ -17,16 +17,19 @@
 # limitations under the License.
 #
 import logging
-import re
+import os
 from collections import Counter
-from typing import List
+from typing import List, Optional, Sequence
 
 import albumentations as A
 import cv2
 import numpy as np
 from albumentations.pytorch import ToTensorV2
+from PIL import Image
 
 from ..base import AbstractDataset
+from ..utils.image_cache import ImageCache
+from ..utils.pack import pack_name
 
 logger = logging.getLogger(__name__)
 
@@ -75,8 +78,19 @@ class TorchvisionDatasetBase(VisionDatasetBase):
         return len(self.dataset)
 
 
+def load_image(path, resolution: Optional[Sequence[int]] = None) -> np.ndarray:
+    """Decode an image file to an uint8 RGB array, optionally resized to resolution (height, width)"""
+    image = cv2.imread(str(path))
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    if resolution is not None:
+        image = cv2.resize(
+            image, (resolution[1], resolution[0]), interpolation=cv2.INTER_LINEAR
+        )
+    return image
+
+
 class ImageDatasetBase(VisionDatasetBase):
-    def __init__(self, X, y, classes, bbox=None, transform=None):
+    def __init__(self, X, y, classes, bbox=None, transform=None, resolution=None):
         """Initialize vision dataset
 
         Args:
@@ -85,6 +99,7 @@ class ImageDatasetBase(VisionDatasetBase):
             classes (List[str]): List of class names, names are ordered by numeric class id
             bbox (Dict[str]): Dict with filename as keys, bbox coordinates as numpy arrays
             transform (Callable[image,image], optional): Optional transformation/augmentation of input images. Defaults to None.
+            resolution (Sequence[int], optional): (height, width) of the images returned by transform, if it resizes or crops the images. Defaults to None.
         """
         self.X = X
         self.y = y
@@ -92,23 +107,74 @@ class ImageDatasetBase(VisionDatasetBase):
         self.transform = transform if transform else A.Compose([ToTensorV2()])
         self.label_to_index = {k: v for v, k in enumerate(classes)}
         self.bbox = bbox
+        self.sample_bbox = [
+            bbox.get(os.path.basename(str(x)), []) if bbox else [] for x in X
+        ]
+        self.image_cache = None
+        self._resolution = [int(r) for r in resolution] if resolution is not None else None
+
+    def cache_images(self, folder, resolution: Optional[Sequence[int]] = None):
+        """Serve the images from a memory mapped cache of the decoded images
+
+        The cache is created in a subfolder of folder on first use, images are resized to
+        resolution (height, width) while creating the cache. Cached images are returned as
+        uint8 tensors and are converted to float by the training module on the device.
+        """
+        if len(self.X) == 0:
+            return
+        if resolution is not None:
+            resolution = [int(r) for r in resolution]
+        name = pack_name(
+            "images",
+            self.X,
+            resolution="x".join(str(r) for r in resolution) if resolution else None,
+        )
+        self.image_cache = ImageCache.open_or_create(
+            os.path.join(folder, name),
+            [str(x) for x in self.X],
+            lambda path: load_image(path, resolution),
+        )
+
+    @classmethod
+    def setup_image_cache(cls, config, datasets):
+        """Enable the image cache for the given dataset splits if configured in config.image_cache"""
+        cache_config = config.get("image_cache", None)
+        if not cache_config or not cache_config.get("enabled", False):
+            return datasets
+
+        folder = cache_config.get("folder", None)
+        if folder is None:
+            folder = os.path.join(config["data_folder"], "image_cache")
+        for dataset in datasets:
+            if dataset is not None:
+                dataset.cache_images(folder, cache_config.get("resolution", None))
+        return datasets
 
     def __getitem__(self, index):
-        image = cv2.imread(str(self.X[index]))
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB).astype(np.float32) / 255
-        label = self.y[index]
-
-        bbox = []
-        X_filename = re.search(r"([^\/]+).$", str(self.X[index]))[0]
-        if self.bbox and X_filename in self.bbox:
-            bbox = self.bbox[X_filename]
+        if self.image_cache is not None:
+            image = np.array(self.image_cache[index])
+        else:
+            image = cv2.imread(str(self.X[index]))
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB).astype(np.float32) / 255
+
         data = self.transform(image=image)["image"]
-        target = self.label_to_index[label]
-        return {"data": data, "labels": target, "bbox": bbox}
+        return {
+            "data": data,
+            "labels": self.label_to_index[self.y[index]],
+            "bbox": self.sample_bbox[index],
+        }
 
     def size(self):
-        dim = self[0]["data"].shape
-        return list(dim)
+        """Shape (channels, height, width) of the samples, determined without decoding a sample"""
+        if self._resolution is not None:
+            height, width = self._resolution
+        elif self.image_cache is not None:
+            _, height, width, _ = self.image_cache.shape
+        else:
+            # only reads the image header
+            with Image.open(self.X[0]) as image:
+                width, height = image.size
+        return [3, height, width]
 
     def __len__(self):
         assert len(self.X) == len(self.y)
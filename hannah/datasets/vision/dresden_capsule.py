@@ -111,12 +111,15 @@ class DresdenCapsuleDataset(ImageDatasetBase):
 
         transform = A.Compose([A.augmentations.geometric.resize.Resize(config.sensor.resolution[0], config.sensor.resolution[1]), ToTensorV2()])
         test_transform = A.Compose([A.augmentations.geometric.resize.Resize(config.sensor.resolution[0], config.sensor.resolution[1]), ToTensorV2()])
-        train_set = cls(X_train, y_train, labels, transform=transform)
-        val_set = cls(X_val, y_val, labels, transform=test_transform)
-        test_set = cls(X_test, y_test, labels, transform=test_transform)
-
-        return (
-            train_set,
-            val_set,
-            test_set,
+        train_set = cls(X_train, y_train, labels, transform=transform, resolution=config.sensor.resolution)
+        val_set = cls(X_val, y_val, labels, transform=test_transform, resolution=config.sensor.resolution)
+        test_set = cls(X_test, y_test, labels, transform=test_transform, resolution=config.sensor.resolution)
+
+        return cls.setup_image_cache(
+            config,
+            (
+                train_set,
+                val_set,
+                test_set,
+            ),
         )
@@ -259,27 +259,31 @@ class KvasirCapsuleDataset(ImageDatasetBase):
                 ToTensorV2(),
             ]
         )
-        return (
-            cls(
-                train_images,
-                train_labels,
-                classes,
-                split0_bbox,
-                transform=transform,
-            ),
-            cls(
-                [], [], classes, {}
-            ),  # FIXME dirty workaround, because train_set_unlabeled is expected
-            cls(
-                val_images,
-                val_labels,
-                classes,
-                split0_bbox,
-            ),
-            cls(
-                test_images,
-                test_labels,
-                classes,
-                split1_bbox,
+        return cls.setup_image_cache(
+            config,
+            (
+                cls(
+                    train_images,
+                    train_labels,
+                    classes,
+                    split0_bbox,
+                    transform=transform,
+                    resolution=config.sensor.resolution,
+                ),
+                cls(
+                    [], [], classes, {}
+                ),  # FIXME dirty workaround, because train_set_unlabeled is expected
+                cls(
+                    val_images,
+                    val_labels,
+                    classes,
+                    split0_bbox,
+                ),
+                cls(
+                    test_images,
+                    test_labels,
+                    classes,
+                    split1_bbox,
+                ),
             ),
         )
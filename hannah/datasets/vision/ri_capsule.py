@@ -200,23 +200,43 @@ class RICapsuleDataset(ImageDatasetBase):
         )
 
         train_set = cls(
-            X_train, y_train, list(LABELS.keys()), transform=train_transform
+            X_train,
+            y_train,
+            list(LABELS.keys()),
+            transform=train_transform,
+            resolution=config.sensor.resolution,
         )
         train_set_unlabeled = cls(
             X_train_unlabeled,
             y_train_unlabeled,  # FIXME labels must not be used
             list(LABELS.keys()),
             transform=train_transform,
+            resolution=config.sensor.resolution,
+        )
+        val_set = cls(
+            X_val,
+            y_val,
+            list(LABELS.keys()),
+            transform=test_transform,
+            resolution=config.sensor.resolution,
+        )
+        test_set = cls(
+            X_test,
+            y_test,
+            list(LABELS.keys()),
+            transform=test_transform,
+            resolution=config.sensor.resolution,
         )
-        val_set = cls(X_val, y_val, list(LABELS.keys()), test_transform)
-        test_set = cls(X_test, y_test, list(LABELS.keys()), transform=test_transform)
 
         # RANDOM, RANDOM_PER_STUDY Splits
         # preprocessing,
 
-        return (
-            train_set,
-            train_set_unlabeled,
-            val_set,
-            test_set,
+        return cls.setup_image_cache(
+            config,
+            (
+                train_set,
+                train_set_unlabeled,
+                val_set,
+                test_set,
+            ),
         )
@@ -0,0 +1,200 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import logging
+import math
+from typing import Optional, Sequence
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+logger = logging.getLogger(__name__)
+
+
+class WaveformAugmentation(nn.Module):
+    def __init__(
+        self,
+        input_length: int,
+        samplingrate: int = 16000,
+        timeshift_ms: int = 0,
+        extract: str = "loudest",
+        snr_low: float = math.inf,
+        snr_high: float = math.inf,
+        symmetric_shift: bool = True,
+        noise: Sequence[np.ndarray] = (),
+        seed: Optional[int] = None,
+    ):
+        """Batched version of the waveform preprocessing of `hannah.datasets.speech.SpeechDataset`
+
+        Extracts a window of `input_length` samples from each waveform, shifts it in time,
+        mixes it with background noise at a random SNR and normalizes the result. All operations
+        run vectorized on the device of the input batch. Random parameters are drawn from a
+        generator owned by this module, so results are reproducible for a given seed.
+
+        Args:
+            input_length (int): number of samples of the output waveforms
+            samplingrate (int): sampling rate of the waveforms
+            timeshift_ms (int): maximal time shift in ms
+            extract (str): window extraction, one of loudest, trim_border, front
+            snr_low (float): minimal SNR in dB, inf disables noise mixing
+            snr_high (float): maximal SNR in dB
+            symmetric_shift (bool): shift in both directions, otherwise waveforms are only shifted to the left
+            noise (Sequence[np.ndarray]): background noise waveforms, if empty white noise is used
+            seed (Optional[int]): seed of the random parameters
+        """
+        super().__init__()
+        self.input_length = input_length
+        self.max_shift = (samplingrate * timeshift_ms) // 1000
+        self.extract = extract
+        self.snr_low = min(snr_low, snr_high)
+        self.snr_high = max(snr_low, snr_high)
+        self.symmetric_shift = symmetric_shift
+
+        noise = [np.asarray(n, dtype=np.float32).reshape(-1) for n in noise]
+        noise = [n for n in noise if len(n) > 0]
+        lengths = [len(n) for n in noise]
+        offsets = np.cumsum([0] + lengths[:-1]).astype(np.int64)
+        bank = np.concatenate(noise) if noise else np.zeros(0, dtype=np.float32)
+        self.register_buffer("noise_bank", torch.from_numpy(bank), persistent=False)
+        self.register_buffer("noise_offsets", torch.from_numpy(offsets), persistent=False)
+        self.register_buffer("noise_lengths", torch.tensor(lengths, dtype=torch.long), persistent=False)
+
+        self.generator = torch.Generator()
+        if seed is not None:
+            self.generator.manual_seed(seed)
+        else:
+            self.generator.seed()
+
+    def _randint(self, low, high):
+        """Random integers in [low, high) for tensors low and high"""
+        u = torch.rand(low.shape, generator=self.generator, dtype=torch.float64)
+        return low + (u * (high - low)).long().clamp(max=(high - low - 1).clamp(min=0))
+
+    def _extract_range(self, x, lengths):
+        in_len = self.input_length
+        batch_size = len(lengths)
+        short = lengths <= in_len
+        start = torch.zeros(batch_size, dtype=torch.long)
+        end = lengths.clone()
+
+        if self.extract == "loudest":
+            # argmax of the full cross correlation of |x| with a window of in_len ones
+            lengths_dev = lengths.to(x.device)
+            amps = torch.nn.functional.pad(x.abs().double(), (1, 0)).cumsum(dim=1)
+            k = torch.arange(x.shape[1] + in_len - 1, device=x.device)
+            hi = torch.minimum(k.unsqueeze(0), lengths_dev.unsqueeze(1) - 1) + 1
+            lo = (k - in_len + 1).clamp(min=0).unsqueeze(0).expand_as(hi)
+            correlation = amps.gather(1, hi.clamp(min=0)) - amps.gather(1, lo.clamp(max=amps.shape[1] - 1))
+            correlation = correlation.masked_fill(k.unsqueeze(0) > (lengths_dev + in_len - 2).unsqueeze(1), -math.inf)
+            window_start = correlation.argmax(dim=1).cpu()
+            start = torch.where(short, start, window_start)
+            end = torch.where(short, end, window_start + in_len)
+        elif self.extract == "trim_border":
+            border = (lengths.double() * 0.1).long()
+            max_length = (lengths.double() * 0.8).long()
+            near_border = (max_length - 1) < in_len
+            random_start = torch.where(
+                near_border,
+                self._randint(torch.zeros_like(lengths), lengths - in_len),
+                self._randint(torch.zeros_like(lengths), max_length - in_len) + border,
+            )
+            start = torch.where(short, start, random_start)
+            end = torch.where(short, end, random_start + in_len)
+        elif self.extract == "front":
+            end = torch.where(short, end, torch.full_like(end, in_len))
+
+        return start, end
+
+    def _noise(self, batch_size, generator, device):
+        in_len = self.input_length
+        if len(self.noise_lengths) == 0:
+            # Same formula as used for google kws white noise
+            return torch.randn(batch_size, in_len, generator=generator, device=device) / 3
+
+        files = torch.randint(len(self.noise_lengths), (batch_size,), generator=generator, device=device)
+        file_lengths = self.noise_lengths[files]
+        noise_start = (torch.rand(batch_size, generator=generator, device=device) * file_lengths).long()
+        t = torch.arange(in_len, device=device)
+        index = self.noise_offsets[files].unsqueeze(1) + (noise_start.unsqueeze(1) + t) % file_lengths.unsqueeze(1)
+        return self.noise_bank[index]
+
+    @torch.no_grad()
+    def forward(self, x: torch.Tensor, lengths: torch.Tensor) -> torch.Tensor:
+        """
+        Args:
+            x (torch.Tensor): zero padded batch of waveforms of shape (batch, 1, samples) or (batch, samples)
+            lengths (torch.Tensor): number of valid samples of each waveform
+
+        Returns:
+            torch.Tensor: augmented waveforms of shape (batch, 1, input_length)
+        """
+        device = x.device
+        batch_size = x.shape[0]
+        x = x.reshape(batch_size, -1).float()
+        lengths = torch.as_tensor(lengths).reshape(-1).long().cpu().clamp(max=x.shape[1])
+        in_len = self.input_length
+
+        start, end = self._extract_range(x, lengths)
+
+        if self.symmetric_shift:
+            shift = self._randint(torch.full((batch_size,), -self.max_shift), torch.full((batch_size,), self.max_shift + 1))
+        else:
+            shift = self._randint(torch.zeros(batch_size, dtype=torch.long), torch.full((batch_size,), self.max_shift + 1))
+
+        # window of the time shifted waveform, zero padded to in_len
+        t = torch.arange(in_len)
+        window = start.unsqueeze(1) + t
+        source = window + shift.unsqueeze(1)
+        valid = (
+            (t < (end - start).unsqueeze(1))
+            & (window < lengths.unsqueeze(1))
+            & (source >= 0)
+            & (source < lengths.unsqueeze(1))
+        )
+        source = source.clamp(0, max(x.shape[1] - 1, 0)).to(device)
+        if x.shape[1] == 0:
+            data = torch.zeros(batch_size, in_len, device=device)
+        else:
+            data = x.gather(1, source) * valid.to(device)
+
+        snr = torch.empty(batch_size, dtype=torch.float64)
+        if self.snr_low == self.snr_high:
+            snr.fill_(self.snr_low)
+        else:
+            snr.uniform_(self.snr_low, self.snr_high, generator=self.generator)
+
+        noise_generator = torch.Generator(device=device)
+        noise_generator.manual_seed(int(torch.randint(2**62, (1,), generator=self.generator)))
+        noise = self._noise(batch_size, noise_generator, device)
+
+        psig = (data * data).sum(dim=1) / in_len
+        pnoise = (noise * noise).sum(dim=1) / in_len
+        snr = snr.to(device)
+        mix = torch.isfinite(snr).unsqueeze(1)
+
+        factor = torch.sqrt(psig / (pnoise * 10 ** (snr.float() / 10))).clamp(max=10)
+        factor = torch.nan_to_num(factor, nan=0.0, posinf=10.0)
+        mixed = data + factor.unsqueeze(1) * noise
+        peak = mixed.abs().amax(dim=1, keepdim=True)
+        mixed = torch.where(peak > 1, mixed / peak, mixed)
+
+        data = torch.where(mix, mixed, data)
+        data = torch.where((psig == 0.0).unsqueeze(1), noise, data)
+
+        return data.unsqueeze(1)
@@ -127,6 +127,10 @@ class AngleClassifierModule(StreamClassifierModule):
                 logging.critical("Could not calculate batch metrics: {outputs}")
         self.log(f"{prefix}_loss", loss, batch_size=self.batch_size)
 
+    def is_train_metrics_step(self, batch_idx: int) -> bool:
+        # train metrics are not accumulated, they are logged after each batch
+        return True
+
     # TRAINING CODE
     def training_step(self, batch, batch_idx):
         x, x_len, y, y_len = batch
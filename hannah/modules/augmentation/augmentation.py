@@ -23,6 +23,8 @@ import subprocess
 import sys
 import threading
 import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 
 import numpy as np
 import scipy.stats as stats
@@ -43,20 +45,61 @@ from hannah.datasets.base import DatasetType
 from hannah.datasets.Kitti import Kitti
 from hannah.modules.augmentation.bordersearch import Parameter, ParameterRange
 
+logger = logging.getLogger(__name__)
+
+
+# Augmentations rendered by the external augmentation tool (perform_augmentation.sh)
+EXTERNAL_AUGMENTATIONS = ("rain", "snow", "fog")
+
+
+@lru_cache(maxsize=8)
+def _albumentations_transform(params):
+    conf = dict(params)
+    return A.Compose(
+        [
+            A.Blur(p=conf["blur"] / 100),
+            A.CLAHE(p=conf["clahe"] / 100),
+            A.ChannelDropout(p=conf["channel_dropout"] / 100),
+            A.ChannelShuffle(p=conf["channel_shuffle"] / 100),
+            A.CoarseDropout(p=conf["coarse_dropout"] / 100),
+            A.Downscale(p=conf["downscale"] / 100),
+            A.Equalize(p=conf["equalize"] / 100),
+            A.GaussNoise(p=conf["gauss_noise"] / 100),
+            A.HueSaturationValue(p=conf["hue_saturation_value"] / 100),
+            A.ISONoise(p=conf["iso_noise"] / 100),
+            A.ImageCompression(p=conf["image_compression"] / 100),
+            A.InvertImg(p=conf["invert"] / 100),
+            A.MotionBlur(p=conf["motion_blur"] / 100),
+            A.Posterize(p=conf["posterize"] / 100),
+            A.RGBShift(p=conf["rgb_shift"] / 100),
+            A.RandomBrightnessContrast(p=conf["random_brightness_contrast"] / 100),
+            A.RandomGamma(p=conf["random_gamma"] / 100),
+            A.Solarize(p=conf["solarize"] / 100),
+        ]
+    )
+
 
 class XmlAugmentationParser:
     @staticmethod
     def __getImgSize(path, img):
-        pil_img = Image.open(path + "/training/image_2/" + img).convert("RGB")
-        width, height = pil_img.size
+        # only reads the image header
+        with Image.open(path + "/training/image_2/" + img) as pil_img:
+            width, height = pil_img.size
         return (width, height)
 
     @staticmethod
-    def parse(conf, img, kitti):
+    def choose(conf):
         random.seed()
-        augmentation = random.choices(conf["augmentations"], conf["augmentations_pct"])[
-            0
-        ]
+        return random.choices(conf["augmentations"], conf["augmentations_pct"])[0]
+
+    @staticmethod
+    def is_external(augmentation):
+        return any(name in augmentation for name in EXTERNAL_AUGMENTATIONS)
+
+    @staticmethod
+    def parse(conf, img, kitti, augmentation=None):
+        if augmentation is None:
+            augmentation = XmlAugmentationParser.choose(conf)
         subpring = True
 
         if "rain" in augmentation:
@@ -257,28 +300,7 @@ class XmlAugmentationParser:
 
     @staticmethod
     def albumentations(conf, img, kitti, double_augment=False):
-        transform = A.Compose(
-            [
-                A.Blur(p=conf["blur"] / 100),
-                A.CLAHE(p=conf["clahe"] / 100),
-                A.ChannelDropout(p=conf["channel_dropout"] / 100),
-                A.ChannelShuffle(p=conf["channel_shuffle"] / 100),
-                A.CoarseDropout(p=conf["coarse_dropout"] / 100),
-                A.Downscale(p=conf["downscale"] / 100),
-                A.Equalize(p=conf["equalize"] / 100),
-                A.GaussNoise(p=conf["gauss_noise"] / 100),
-                A.HueSaturationValue(p=conf["hue_saturation_value"] / 100),
-                A.ISONoise(p=conf["iso_noise"] / 100),
-                A.ImageCompression(p=conf["image_compression"] / 100),
-                A.InvertImg(p=conf["invert"] / 100),
-                A.MotionBlur(p=conf["motion_blur"] / 100),
-                A.Posterize(p=conf["posterize"] / 100),
-                A.RGBShift(p=conf["rgb_shift"] / 100),
-                A.RandomBrightnessContrast(p=conf["random_brightness_contrast"] / 100),
-                A.RandomGamma(p=conf["random_gamma"] / 100),
-                A.Solarize(p=conf["solarize"] / 100),
-            ]
-        )
+        transform = _albumentations_transform(tuple(sorted(conf.items())))
         pil_img = Image.open(
             kitti.kitti_dir + "/training/image_2/" + img
             if not double_augment
@@ -289,12 +311,29 @@ class XmlAugmentationParser:
 
 
 class AugmentationThread:
-    def __init__(self):
-        self.stop = True
-        self.running = False
+    """Augments the images of a dataset on a pool of worker threads
+
+    Augmentations implemented in python run concurrently, augmentations rendered by the
+    external augmentation tool share the files in kitti.aug_path and are run one at a time.
+    """
+
+    def __init__(self, num_workers=None):
+        self.num_workers = num_workers if num_workers else (os.cpu_count() or 1)
+        self._stop = threading.Event()
+        self._done = threading.Event()
+        self._done.set()
+        self._external_lock = threading.Lock()
 
-    def call_augment(self, conf, img, kitti, out):
-        if XmlAugmentationParser.parse(conf, img, kitti):
+    @property
+    def stop(self):
+        return self._stop.is_set()
+
+    @property
+    def running(self):
+        return not self._done.is_set()
+
+    def call_augment(self, conf, img, kitti, out, augmentation=None):
+        if XmlAugmentationParser.parse(conf, img, kitti, augmentation):
             subprocess.call(
                 kitti.aug_path + "perform_augmentation.sh", stdout=subprocess.DEVNULL
             )
@@ -307,62 +346,95 @@ class AugmentationThread:
                 )
 
         if out is True:
-            print("Image augmented")
+            logger.info("Image %s augmented", img)
 
     def augment_img(self, kitti, img, conf, reaugment, out):
+        if self.stop:
+            return
         if reaugment is True:
-            txt = open(kitti.aug_path + "/to_augment.txt", "w")
-            txt.write(img[:-4] + "\n")
-            txt.close()
-            self.call_augment(conf, img, kitti, out)
+            augmentation = XmlAugmentationParser.choose(conf)
+            if XmlAugmentationParser.is_external(augmentation):
+                with self._external_lock:
+                    txt = open(kitti.aug_path + "/to_augment.txt", "w")
+                    txt.write(img[:-4] + "\n")
+                    txt.close()
+                    self.call_augment(conf, img, kitti, out, augmentation)
+            else:
+                self.call_augment(conf, img, kitti, out, augmentation)
         kitti.aug_files.append(img[:-4])
 
+    def start(self, conf, kitti, pct, aug_new, out):
+        """Start the augmentation of kitti in a background thread"""
+        self._stop.clear()
+        self._done.clear()
+        th = threading.Thread(
+            target=self.augment, args=(conf, kitti, pct, aug_new, out), daemon=True
+        )
+        th.start()
+        return th
+
     def augment(self, conf, kitti, pct, aug_new, out):
-        self.running = True
-        self.stop = False
-        reaugment = conf["reaugment_per_epoch_pct"]
-        num_augment = len(kitti.img_files) * (pct / 100)
-
-        for img in kitti.aug_files:
-            # Remove reaugment_per_epoch_pct images from augmentation list
-            if self.stop:
-                break
-
-            random.seed()
-            rand = random.randrange(0, 100)
-
-            if rand < reaugment:
-                kitti.aug_files.remove(img[:-4])
-
-        for img in kitti.img_files:
-            # Add images to augmentation list to reach augmented_pct and restart augmentation if necessary
-            if self.stop:
-                break
-            random.seed()
-            rand = random.randrange(0, 100)
-
-            if img[:-4] in kitti.aug_files and not os.path.isfile(kitti.aug_path + img):
-                self.augment_img(kitti, img, conf, True, out)
-            elif (
-                rand < pct
-                and len(kitti.aug_files) <= num_augment
-                and img[:-4] not in kitti.aug_files
-            ):
-                self.augment_img(kitti, img, conf, aug_new, out)
-        self.stop = True
-        self.running = False
+        if self._done.is_set():
+            # not started by start()
+            self._stop.clear()
+            self._done.clear()
+        try:
+            reaugment = conf["reaugment_per_epoch_pct"]
+            num_augment = len(kitti.img_files) * (pct / 100)
+
+            for img in kitti.aug_files:
+                # Remove reaugment_per_epoch_pct images from augmentation list
+                if self.stop:
+                    break
 
-    def clear(self):
-        self.stop = True
+                random.seed()
+                rand = random.randrange(0, 100)
+
+                if rand < reaugment:
+                    kitti.aug_files.remove(img[:-4])
+
+            # Select images to reach augmented_pct and restart augmentation if necessary
+            tasks = []
+            num_selected = len(kitti.aug_files)
+            for img in kitti.img_files:
+                random.seed()
+                rand = random.randrange(0, 100)
+
+                if img[:-4] in kitti.aug_files and not os.path.isfile(
+                    kitti.aug_path + img
+                ):
+                    tasks.append((img, True))
+                    num_selected += 1
+                elif (
+                    rand < pct
+                    and num_selected <= num_augment
+                    and img[:-4] not in kitti.aug_files
+                ):
+                    tasks.append((img, aug_new))
+                    num_selected += 1
+
+            with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+                futures = [
+                    executor.submit(self.augment_img, kitti, img, conf, reaug, out)
+                    for img, reaug in tasks
+                ]
+                for future in as_completed(futures):
+                    if self.stop:
+                        executor.shutdown(wait=True, cancel_futures=True)
+                        break
+                    future.result()
+        finally:
+            self._done.set()
 
-        while self.running:
-            continue
+    def clear(self):
+        self._stop.set()
+        self._done.wait()
 
 
 class Augmentation:
     def __init__(self, augmentation: list()):
-        self.aug_thread = AugmentationThread()
         self.conf = dict((key, a[key]) for a in augmentation for key in a)
+        self.aug_thread = AugmentationThread(self.conf.get("augmentation_workers", None))
         self.pct = self.conf["augmented_pct"] if "augmented_pct" in self.conf else 0
         self.bordersearch_epochs = self.conf["bordersearch_epoch_duration"]
         self.waterlevel = self.conf["bordersearch_waterlevel"]
@@ -372,18 +444,13 @@ class Augmentation:
         kitti.aug_files = list()
         if self.pct != 0 and self.val_pct != 0:
             self.aug_thread.clear()
-            th = threading.Thread(
-                target=self.aug_thread.augment,
-                args=(
-                    self.conf,
-                    kitti,
-                    self.pct if kitti.set_type == DatasetType.TRAIN else self.val_pct,
-                    self.reaugment,
-                    self.out,
-                ),
-                daemon=True,
+            th = self.aug_thread.start(
+                self.conf,
+                kitti,
+                self.pct if kitti.set_type == DatasetType.TRAIN else self.val_pct,
+                self.reaugment,
+                self.out,
             )
-            th.start()
 
             if self.wait is True:
                 print("######### WAIT FOR AUGMENTATION #########")
@@ -38,6 +38,8 @@ from pytorch_lightning.loggers import Logger, TensorBoardLogger
 from pytorch_lightning.utilities import CombinedLoader, rank_zero_only
 from torchmetrics import AUROC, MetricCollection
 
+from ..datasets.collate import ctc_collate_fn
+from ..datasets.sampler import LengthBucketingBatchSampler, sample_lengths
 from ..models.factory.qat import QAT_MODULE_MAPPINGS
 from ..utils.utils import fullname
 from .metrics import plot_confusion_matrix
@@ -141,21 +143,39 @@ class ClassifierModule(LightningModule, ABC):
     def _get_dataloader(self, dataset, unlabeled_data=None, shuffle=False):
         dataset_conf = self.hparams.dataset
         sampler = None
+        batch_sampler = None
         if shuffle:
             sampler_type = dataset_conf.get("sampler", "random")
             if sampler_type == "weighted":
                 sampler = self.get_balancing_sampler(dataset)
+            elif sampler_type == "bucketing" and not dataset.sequential:
+                batch_sampler = LengthBucketingBatchSampler(
+                    sample_lengths(dataset),
+                    self.batch_size,
+                    bucket_batches=dataset_conf.get("bucket_batches", 100),
+                    drop_last=True,
+                )
             else:
                 sampler = data.RandomSampler(dataset)
 
-        loader = data.DataLoader(
-            dataset,
-            batch_size=self.batch_size,
-            drop_last=True,
-            num_workers=self.hparams["num_workers"],
-            sampler=sampler if not dataset.sequential else None,
-            multiprocessing_context="fork" if self.hparams["num_workers"] > 0 else None,
-        )
+        if batch_sampler is not None:
+            # batches of variable length items are padded to their longest item
+            loader = data.DataLoader(
+                dataset,
+                batch_sampler=batch_sampler,
+                num_workers=self.hparams["num_workers"],
+                collate_fn=ctc_collate_fn,
+                multiprocessing_context="fork" if self.hparams["num_workers"] > 0 else None,
+            )
+        else:
+            loader = data.DataLoader(
+                dataset,
+                batch_size=self.batch_size,
+                drop_last=True,
+                num_workers=self.hparams["num_workers"],
+                sampler=sampler if not dataset.sequential else None,
+                multiprocessing_context="fork" if self.hparams["num_workers"] > 0 else None,
+            )
         self.batches_per_epoch = len(loader)
 
         if unlabeled_data:
@@ -17,11 +17,13 @@
 # limitations under the License.
 #
 
+import hashlib
 import logging
 import math
+import os
 import platform
 from abc import abstractmethod
-from typing import Dict, Optional, Union
+from typing import Dict, List, Optional, Union
 
 import numpy as np
 import tabulate
@@ -29,7 +31,7 @@ import torch
 import torch.utils.data as data
 import torchvision
 from hydra.utils import get_class, instantiate
-from omegaconf import DictConfig
+from omegaconf import DictConfig, OmegaConf
 from pytorch_lightning import LightningModule
 from torchaudio.transforms import FrequencyMasking, TimeMasking, TimeStretch
 from torchmetrics import (
@@ -46,18 +48,29 @@ from torchmetrics import (
 from hannah.datasets.collate import ctc_collate_fn
 
 from ..datasets import SpeechDataset
+from ..datasets.feature_cache import FeatureCacheDataset
 from ..models.factory.qat import QAT_MODULE_MAPPINGS
 from ..utils.utils import set_deterministic
 from .base import ClassifierModule
 from .config_utils import get_loss_function, get_model
 from .metrics import Error
+from .streaming import StreamingInference
 
 msglogger = logging.getLogger(__name__)
 
+# dataset attributes of the splits of a stream classifier
+SPLIT_ATTRIBUTES = {"train": "train_set", "val": "dev_set", "test": "test_set"}
+
 
 class BaseStreamClassifierModule(ClassifierModule):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.cached_splits = set()
+        self.waveform_augmentation = torch.nn.ModuleDict()
+
+        self.train_metrics_interval = self.hparams.get("train_metrics_interval", 1)
+        self._train_loss_sum = None
+        self._train_loss_batches = 0
 
     def prepare_data(self):
         # get all the necessary data stuff
@@ -129,17 +142,21 @@ class BaseStreamClassifierModule(ClassifierModule):
         )
 
         # Metrics
+        # input validation synchronizes with the device, skip it for accumulated train metrics
+        validate_train_args = self.train_metrics_interval <= 1
         self.train_metrics = MetricCollection(
             {
                 "train_accuracy": Accuracy(
                     task=self.dataset_type,
                     num_classes=self.num_classes,
                     average="macro",
+                    validate_args=validate_train_args,
                 ),
                 "train_error": Accuracy(
                     task=self.dataset_type,
                     num_classes=self.num_classes,
                     average="macro",
+                    validate_args=validate_train_args,
                 ),
             }
         )
@@ -227,6 +244,76 @@ class BaseStreamClassifierModule(ClassifierModule):
         else:
             self.augmentation = torch.nn.Identity()
 
+        # Waveform preprocessing of datasets returning raw waveforms runs batched on the training device
+        self.waveform_augmentation = torch.nn.ModuleDict()
+        for attribute in SPLIT_ATTRIBUTES.values():
+            dataset = getattr(self, attribute)
+            if getattr(dataset, "batched_augmentation", False):
+                self.waveform_augmentation[attribute] = dataset.batch_augmentation()
+
+        self.cached_splits = set()
+        if self.hparams.get("feature_cache", None):
+            self._setup_feature_cache(self.hparams.feature_cache)
+
+    def _setup_feature_cache(self, cache_config):
+        """Replaces the configured dataset splits by datasets of precomputed features
+
+        Features are cached per dataset split, dataset config and feature config in
+        `cache_config.folder` (default: `<data_folder>/feature_cache`).
+        """
+        if any(p.requires_grad for p in self.features.parameters()):
+            msglogger.warning(
+                "Feature extraction has trainable parameters, feature cache is disabled"
+            )
+            return
+
+        folder = cache_config.get("folder", None)
+        if not folder:
+            folder = os.path.join(self.hparams.dataset.data_folder, "feature_cache")
+
+        config_hash = hashlib.md5(
+            (
+                OmegaConf.to_yaml(self.hparams.dataset, resolve=True)
+                + OmegaConf.to_yaml(self.hparams.features, resolve=True)
+            ).encode()
+        ).hexdigest()
+
+        for split in cache_config.get("splits", []):
+            if split == "train" and self._augments_waveforms():
+                # a cache would freeze a single random draw of the augmentation for all epochs
+                msglogger.warning(
+                    "Waveform augmentation is configured for the training data, train split is not cached"
+                )
+                continue
+
+            dataset = getattr(self, SPLIT_ATTRIBUTES[split])
+            if not isinstance(dataset, data.Dataset) or len(dataset) == 0:
+                msglogger.warning("Can not cache features of %s split", split)
+                continue
+
+            name = f"{type(dataset).__name__}_{split}_{len(dataset)}_{config_hash}"
+            cached_dataset = FeatureCacheDataset.open_or_create(
+                os.path.join(folder, name),
+                dataset,
+                lambda x, x_length, split=split: self._extract_features(
+                    self._augment_waveforms(x, x_length, split)
+                ),
+                batch_size=self.batch_size,
+                num_workers=self.hparams["num_workers"],
+            )
+            setattr(self, SPLIT_ATTRIBUTES[split], cached_dataset)
+            self.cached_splits.add(split)
+
+    def _augments_waveforms(self):
+        "True if the dataset config applies random time shifts, extraction or noise to the training data"
+        dataset = self.hparams.dataset
+        if dataset.get("timeshift_ms", 0) > 0:
+            return True
+        if dataset.get("extract", None) == "trim_border":
+            return True
+        snr = [dataset.get("train_snr_low", None), dataset.get("train_snr_high", None)]
+        return any(s is not None and s != float("inf") for s in snr)
+
     @abstractmethod
     def get_example_input_array(self):
         pass
@@ -259,15 +346,66 @@ class BaseStreamClassifierModule(ClassifierModule):
 
             self.log(f"{prefix}_loss", loss, batch_size=self.batch_size)
 
+    def is_train_metrics_step(self, batch_idx: int) -> bool:
+        """Check if train metrics are logged after the given training batch
+
+        Train metrics are logged every `train_metrics_interval` batches and after the last
+        batch of each epoch.
+        """
+        if (batch_idx + 1) % self.train_metrics_interval == 0:
+            return True
+        trainer = self._trainer
+        return trainer is not None and batch_idx + 1 == trainer.num_training_batches
+
+    def _accumulate_train_metrics(
+        self, preds: List[torch.Tensor], target, loss, batch_idx
+    ) -> None:
+        """Update the train metrics with the predictions of each model output on the device,
+        and only log them on train metric steps
+
+        Unlike logging the metrics after each batch, this does not synchronize the device
+        with the host for the batches in between.
+        """
+        for pred in preds:
+            self.train_metrics.update(pred, target)
+        loss = loss.detach()
+        if self._train_loss_sum is None:
+            self._train_loss_sum = loss
+        else:
+            self._train_loss_sum = self._train_loss_sum + loss
+        self._train_loss_batches += 1
+
+        if not self.is_train_metrics_step(batch_idx):
+            return
+
+        self.log_dict(self.train_metrics.compute(), batch_size=self.batch_size)
+        self.log(
+            "train_loss",
+            self._train_loss_sum / self._train_loss_batches,
+            batch_size=self.batch_size,
+        )
+        self.train_metrics.reset()
+        self._train_loss_sum = None
+        self._train_loss_batches = 0
+
     # TRAINING CODE
     def training_step(self, batch, batch_idx):
-        x, x_lenght, y, y_lenght = self._decode_batch(batch)
+        x, x_length, y, y_length = self._decode_batch(batch)
 
-        output = self(x)
+        output = self._forward_batch(x, x_length, "train")
         y = y.view(-1)
         loss = self.criterion(output, y)
         # METRICS
-        self.calculate_batch_metrics(output, y, loss, self.train_metrics, "train")
+        if self.train_metrics_interval > 1:
+            preds = []
+            for out in output if isinstance(output, list) else [output]:
+                out = torch.nn.functional.softmax(out, dim=1)
+                if self.dataset_type == "binary":
+                    out = out.argmax(dim=1)
+                preds.append(out)
+            self._accumulate_train_metrics(preds, y, loss, batch_idx)
+        else:
+            self.calculate_batch_metrics(output, y, loss, self.train_metrics, "train")
 
         return loss
 
@@ -282,7 +420,7 @@ class BaseStreamClassifierModule(ClassifierModule):
         x, x_length, y, y_length = self._decode_batch(batch)
 
         # INFERENCE
-        output = self(x)
+        output = self._forward_batch(x, x_length, "val")
         # print(output)
         y = y.view(-1)
         loss = self.criterion(output, y)
@@ -322,7 +460,7 @@ class BaseStreamClassifierModule(ClassifierModule):
         # dataloader provides these four entries per batch
         x, x_length, y, y_length = self._decode_batch(batch)
 
-        output = self(x)
+        output = self._forward_batch(x, x_length, "test")
         y = y.view(-1)
 
         loss = self.criterion(output, y)
@@ -368,7 +506,14 @@ class BaseStreamClassifierModule(ClassifierModule):
 
     def forward(self, x):
         x = self._extract_features(x)
+        return self._forward_features(x)
 
+    def streaming_inference(self, hop_length: int) -> StreamingInference:
+        """Create a runtime for hop by hop inference on audio streams, see `StreamingInference`"""
+        self.eval()
+        return StreamingInference(self, hop_length)
+
+    def _forward_features(self, x):
         if self.training:
             x = self.augmentation(x)
 
@@ -377,6 +522,30 @@ class BaseStreamClassifierModule(ClassifierModule):
         x = self.model(x)
         return x
 
+    def _augment_waveforms(self, x, x_length, split):
+        attribute = SPLIT_ATTRIBUTES[split]
+        if attribute in self.waveform_augmentation:
+            x = self.waveform_augmentation[attribute](x, x_length)
+        return x
+
+    def _forward_batch(self, x, x_length, split):
+        if split in self.cached_splits:
+            return self._forward_features(x)
+        x = self._augment_waveforms(x, x_length, split)
+        return self(x)
+
+    def model_inputs(self, batch, split):
+        """Inputs of `forward` for a batch of the dataloader of a split
+
+        Raw waveforms of datasets with `batched_augmentation` are preprocessed like in the
+        training, validation and test steps. Returns None for splits with cached features,
+        as these can not be passed to `forward`.
+        """
+        if split in self.cached_splits:
+            return None
+        x, x_length, _y, _y_length = self._decode_batch(batch)
+        return self._augment_waveforms(x.to(self.device), x_length.to(self.device), split)
+
     def _log_audio(self, x, logits, y):
         prediction = torch.argmax(logits, dim=1)
         correct = prediction == y
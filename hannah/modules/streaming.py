@@ -0,0 +1,454 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Hop by hop inference for stream classifiers
+
+`StreamingInference` keeps the last `input_length` samples of a stream and returns the
+posteriors of a stream classifier for this window after each hop. Instead of recomputing the
+whole window, it reuses the feature frames and the outputs of the convolutions of the
+previous hop that only depend on samples, which are still part of the window, and only
+computes the outputs that depend on the new samples or on the padding at the window borders.
+"""
+import logging
+from typing import Callable, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+import torchaudio
+from torchaudio import functional as Ftorchaudio
+
+from ..features import LogSpectrogram, RawFeatures
+from ..models.tc.models import TCResidualBlock, TCResNetModel
+from ..models.vad.models import (
+    BottleneckVad,
+    BottleneckVadModel,
+    SimpleVad,
+    SimpleVadModel,
+    SmallVad,
+    SmallVadModel,
+)
+from ..normalizer import AdaptiveFixedPointNormalizer, FixedPointNormalizer
+
+msglogger = logging.getLogger(__name__)
+
+# (left, right, shift): positions [left, right) of the last axis are equal to the positions
+# [left + shift, right + shift) of the previous step
+Reuse = Optional[Tuple[int, int, int]]
+
+# modules which are applied independently to each position of the time axis
+POSITIONWISE_MODULES = (
+    nn.BatchNorm1d,
+    nn.BatchNorm2d,
+    nn.Dropout,
+    nn.Hardtanh,
+    nn.Identity,
+    nn.LeakyReLU,
+    nn.ReLU,
+)
+POSITIONWISE_NORMALIZERS = (nn.Identity, FixedPointNormalizer, AdaptiveFixedPointNormalizer)
+
+
+class _StreamingOp:
+    def reset(self) -> None:
+        pass
+
+    def step(self, x: torch.Tensor, reuse: Reuse) -> Tuple[torch.Tensor, Reuse]:
+        raise NotImplementedError
+
+
+class _FullOp(_StreamingOp):
+    """Recomputes its output from the whole window"""
+
+    def __init__(self, fn: Callable[[torch.Tensor], torch.Tensor]) -> None:
+        self.fn = fn
+
+    def step(self, x, reuse):
+        return self.fn(x), None
+
+
+class _PointwiseOp(_StreamingOp):
+    """Cheap operation applied to each time step independently"""
+
+    def __init__(self, fn: Callable[[torch.Tensor], torch.Tensor]) -> None:
+        self.fn = fn
+
+    def step(self, x, reuse):
+        return self.fn(x), reuse
+
+
+class _SequentialOp(_StreamingOp):
+    def __init__(self, ops: List[_StreamingOp]) -> None:
+        self.ops = ops
+
+    def reset(self):
+        for op in self.ops:
+            op.reset()
+
+    def step(self, x, reuse):
+        for op in self.ops:
+            x, reuse = op.step(x, reuse)
+        return x, reuse
+
+
+class _ResidualOp(_StreamingOp):
+    def __init__(self, convs: _StreamingOp, downsample: Optional[_StreamingOp], act: nn.Module) -> None:
+        self.convs = convs
+        self.downsample = downsample
+        self.act = act
+
+    def reset(self):
+        self.convs.reset()
+        if self.downsample is not None:
+            self.downsample.reset()
+
+    def step(self, x, reuse):
+        y, y_reuse = self.convs.step(x, reuse)
+        if self.downsample is not None:
+            x, reuse = self.downsample.step(x, reuse)
+
+        if y_reuse is None or reuse is None or y_reuse[2] != reuse[2]:
+            reuse = None
+        else:
+            left = max(y_reuse[0], reuse[0])
+            right = min(y_reuse[1], reuse[1])
+            reuse = (left, right, reuse[2]) if left < right else None
+
+        return self.act(y + x), reuse
+
+
+class _SlidingOp(_StreamingOp):
+    """Operation computing each output position from a window of the input positions
+
+    Output position `j` depends on the input positions `j * stride - padding + i * dilation`
+    for `0 <= i < kernel_size`. The output of the previous step is cached, reusable outputs
+    are copied from it and only the remaining outputs are computed with `compute`.
+    """
+
+    def __init__(self, kernel_size: int, stride: int, padding: int, dilation: int) -> None:
+        self.kernel_size = kernel_size
+        self.stride = stride
+        self.padding = padding
+        self.dilation = dilation
+        self.output = None
+
+    def reset(self):
+        self.output = None
+
+    def compute(self, x: torch.Tensor, start: int, stop: int) -> torch.Tensor:
+        """Compute output positions [start, stop) from the whole input x"""
+        raise NotImplementedError
+
+    def full(self, x: torch.Tensor) -> torch.Tensor:
+        raise NotImplementedError
+
+    def output_reuse(self, n_in: int, n_out: int, reuse: Reuse) -> Reuse:
+        if reuse is None:
+            return None
+        left, right, shift = reuse
+        if shift % self.stride != 0:
+            return None
+        shift = shift // self.stride
+
+        # outputs reading positions left of `left`, including the padding, have changed
+        out_left = -(-(left + self.padding) // self.stride)
+        out_right = n_out - shift
+        if right < n_in:
+            extent = self.dilation * (self.kernel_size - 1)
+            out_right = min(out_right, -(-(right + self.padding - extent) // self.stride))
+
+        if out_left >= out_right:
+            return None
+        return out_left, out_right, shift
+
+    def step(self, x, reuse):
+        if self.output is not None:
+            reuse = self.output_reuse(x.shape[-1], self.output.shape[-1], reuse)
+        else:
+            reuse = None
+
+        if reuse is None:
+            self.output = self.full(x)
+            return self.output, None
+
+        left, right, shift = reuse
+        n_out = self.output.shape[-1]
+        if 2 * (right - left) < n_out:
+            # partial updates of small outputs are slower than their recomputation
+            self.output = self.full(x)
+            return self.output, reuse
+
+        parts = [self.output[..., left + shift : right + shift]]
+        if left > 0:
+            parts.insert(0, self.compute(x, 0, left))
+        if right < n_out:
+            parts.append(self.compute(x, right, n_out))
+
+        self.output = torch.cat(parts, dim=-1)
+        return self.output, reuse
+
+
+class _ConvOp(_SlidingOp):
+    """Zero padded convolution along the last axis"""
+
+    def __init__(self, conv: nn.Module) -> None:
+        super().__init__(conv.kernel_size[-1], conv.stride[-1], conv.padding[-1], conv.dilation[-1])
+        self.conv = conv
+        self.conv_fn = F.conv1d if isinstance(conv, nn.Conv1d) else F.conv2d
+
+    def full(self, x):
+        return self.conv(x)
+
+    def compute(self, x, start, stop):
+        # the convolution of a slice, which starts at a multiple of the stride, only pads the
+        # window borders or the leading outputs of the slice, which are dropped
+        offset = min(start, -(-self.padding // self.stride))
+        first = (start - offset) * self.stride
+        last = (stop - 1) * self.stride - self.padding + self.dilation * (self.kernel_size - 1) + 1
+
+        conv = self.conv
+        y = self.conv_fn(x[..., first:last], conv.weight, conv.bias, conv.stride, conv.padding, conv.dilation, conv.groups)
+        return y[..., offset : offset + stop - start]
+
+
+class _FrameOp(_SlidingOp):
+    """Framewise spectral transform (spectrogram, mel spectrogram) of the samples
+
+    Frames are computed from slices of the samples, that are long enough to contain all samples
+    of the frames and, for frames at the window borders, the samples used for the reflect padding.
+    """
+
+    def __init__(self, transform: nn.Module, n_fft: int, hop_length: int, center: bool) -> None:
+        super().__init__(n_fft, hop_length, n_fft // 2 if center else 0, 1)
+        self.transform = transform
+
+    def full(self, x):
+        return self.transform(x)
+
+    def compute(self, x, start, stop):
+        n = x.shape[-1]
+        # leading frames of the slice which overlap the padding of the slice
+        margin = min(start, -(-self.padding // self.stride))
+        first = (start - margin) * self.stride
+        last = (stop - 1) * self.stride - self.padding + self.kernel_size
+        last = min(n, max(last, first + self.kernel_size))
+
+        frames = self.transform(x[..., first:last])
+        return frames[..., margin : margin + stop - start]
+
+
+class _DecibelOp(_StreamingOp):
+    """Conversion to decibel, with the per item `top_db` cutoff of torchaudio
+
+    The cutoff depends on the maximum of the whole window, so positions are only reused if
+    the cutoff is unchanged or if it does not affect the reused positions.
+    """
+
+    def __init__(self, transform: torchaudio.transforms.AmplitudeToDB) -> None:
+        self.transform = transform
+        self.peak = None
+
+    def reset(self):
+        self.peak = None
+
+    def step(self, x, reuse):
+        transform = self.transform
+        x_db = Ftorchaudio.amplitude_to_DB(x, transform.multiplier, transform.amin, transform.db_multiplier, None)
+        if transform.top_db is None:
+            return x_db, reuse
+
+        shape = x_db.shape
+        packed = x_db.reshape(-1, shape[-3] if x_db.dim() > 2 else 1, shape[-2], shape[-1])
+        peak = packed.amax(dim=(-3, -2, -1))
+        output = torch.max(packed, (peak - transform.top_db).view(-1, 1, 1, 1)).reshape(shape)
+
+        if reuse is not None and self.peak is not None and not torch.equal(peak, self.peak):
+            left, right, _ = reuse
+            cutoff = torch.maximum(peak, self.peak) - transform.top_db
+            if (packed[..., left:right].amin(dim=(-3, -2, -1)) < cutoff).any():
+                reuse = None
+        self.peak = peak
+
+        return output, reuse
+
+
+def _frame_op(transform: nn.Module, spectrogram: nn.Module) -> _StreamingOp:
+    if spectrogram.pad != 0:
+        return _FullOp(transform)
+    return _FrameOp(transform, spectrogram.n_fft, spectrogram.hop_length, spectrogram.center)
+
+
+def _feature_op(features: nn.Module) -> _StreamingOp:
+    if isinstance(features, torchaudio.transforms.MFCC):
+        if features.log_mels:
+            db = _PointwiseOp(lambda x: torch.log(x + 1e-6))
+        else:
+            db = _DecibelOp(features.amplitude_to_DB)
+        dct = _PointwiseOp(lambda x: torch.matmul(x.transpose(-1, -2), features.dct_mat).transpose(-1, -2))
+        return _SequentialOp([_frame_op(features.MelSpectrogram, features.MelSpectrogram.spectrogram), db, dct])
+    elif isinstance(features, torchaudio.transforms.MelSpectrogram):
+        return _frame_op(features, features.spectrogram)
+    elif isinstance(features, (torchaudio.transforms.Spectrogram, LogSpectrogram)):
+        return _frame_op(features, features)
+    elif isinstance(features, RawFeatures):
+        return _PointwiseOp(features)
+
+    return _FullOp(features)
+
+
+def _layer_op(module: nn.Module) -> _StreamingOp:
+    # subclasses of the convolutions (e.g. quantized convolutions) change the forward pass
+    if type(module) in (nn.Conv1d, nn.Conv2d) and module.padding_mode == "zeros" and not isinstance(module.padding, str):
+        return _ConvOp(module)
+    elif isinstance(module, POSITIONWISE_MODULES):
+        return _PointwiseOp(module)
+    elif isinstance(module, nn.Sequential):
+        return _SequentialOp([_layer_op(m) for m in module])
+    elif isinstance(module, TCResidualBlock):
+        downsample = _layer_op(module.downsample) if module.stride > 1 else None
+        return _ResidualOp(_layer_op(module.convs), downsample, module.act)
+
+    return _FullOp(module)
+
+
+def _vad_op(net: nn.Module) -> _StreamingOp:
+    if isinstance(net, BottleneckVad):
+        stages = [
+            (net.norm1, net.conv1),
+            (net.norm2, net.conv2a),
+            (None, net.conv2b),
+            (None, net.conv2c),
+            (net.norm3, net.conv3),
+        ]
+    elif isinstance(net, SimpleVad):
+        stages = [(net.norm1, net.conv1), (net.norm2, net.conv2), (net.norm3, net.conv3)]
+    else:
+        stages = [(net.norm1, net.conv1)]
+
+    ops = [_PointwiseOp(lambda x: x.unsqueeze(1))]
+    for norm, conv in stages:
+        if norm is not None and net.batch_norm:
+            ops.append(_PointwiseOp(norm))
+        ops.append(_layer_op(conv))
+        ops.append(_PointwiseOp(F.leaky_relu))
+
+    return _SequentialOp(ops)
+
+
+def _model_op(model: nn.Module) -> Tuple[_StreamingOp, Callable[[torch.Tensor], torch.Tensor]]:
+    """Split the model into a streamable body and a head, which is recomputed for each hop"""
+    if isinstance(model, TCResNetModel):
+
+        def head(x):
+            x = model.dropout(x)
+            if not model.fully_convolutional:
+                x = x.view(x.size(0), -1)
+            return model.fc(x)
+
+        return _SequentialOp([_layer_op(layer) for layer in model.layers]), head
+
+    elif isinstance(model, (BottleneckVadModel, SimpleVadModel, SmallVadModel)):
+        net = model.net
+
+        def head(x):
+            return net.fc1(x.view(-1, net.num_flat_features(x)))
+
+        return _vad_op(net), head
+
+    return _FullOp(model), lambda x: x
+
+
+class StreamingInference:
+    """Hop by hop inference of a stream classifier module
+
+    Each call of `step` appends `hop_length` samples to a window of the last `input_length`
+    samples of the stream, which is initialized with zeros, and returns the output of the
+    module for this window. The output is the same as the output of the module on the window,
+    but feature frames and convolution outputs of the previous window are reused for the
+    TC-ResNet and VAD models on spectrogram, mel spectrogram, MFCC and raw features. All other
+    models and features are recomputed for each hop.
+
+    Reuse requires `hop_length` to be a multiple of the feature hop length and of the strides
+    of the convolutions, layers that do not divide the shift are recomputed for each hop.
+    """
+
+    def __init__(self, module: nn.Module, hop_length: int) -> None:
+        example_input = module.example_input_array
+        self.module = module
+        self.hop_length = hop_length
+        self.channels = example_input.shape[-2]
+        self.input_length = example_input.shape[-1]
+        self.flatten_features = example_input.dim() == 3
+
+        if not 0 < hop_length <= self.input_length:
+            raise ValueError(f"hop_length must be in [1, {self.input_length}] but is {hop_length}")
+
+        self.features = _feature_op(module.features)
+        self.normalizer_is_positionwise = isinstance(module.normalizer, POSITIONWISE_NORMALIZERS)
+        self.model, self.head = _model_op(module.model)
+        self.window = None
+
+        if isinstance(self.features, _FullOp):
+            msglogger.warning("Features %s are recomputed for each hop", type(module.features).__name__)
+        if isinstance(self.model, _FullOp):
+            msglogger.warning("Model %s is recomputed for each hop", type(module.model).__name__)
+
+    def reset(self) -> None:
+        """Start a new stream"""
+        self.window = None
+        self.features.reset()
+        self.model.reset()
+
+    @torch.no_grad()
+    def step(self, samples: torch.Tensor) -> torch.Tensor:
+        """Process the next hop of the stream
+
+        Args:
+            samples: `hop_length` samples of shape (batch, channels, hop_length), or (channels, hop_length) for a single stream
+
+        Returns:
+            the output of the module on the current window
+        """
+        unbatched = samples.dim() == 2
+        if unbatched:
+            samples = samples.unsqueeze(0)
+        if samples.shape[-2:] != (self.channels, self.hop_length):
+            raise ValueError(
+                f"Expected samples of shape (batch, {self.channels}, {self.hop_length}), got {tuple(samples.shape)}"
+            )
+
+        if self.window is None or self.window.shape[0] != samples.shape[0]:
+            self.reset()
+            self.window = samples.new_zeros(samples.shape[0], self.channels, self.input_length)
+            reuse = None
+        else:
+            reuse = (0, self.input_length - self.hop_length, self.hop_length)
+        self.window = torch.cat((self.window[..., self.hop_length :], samples), dim=-1)
+
+        x, reuse = self.features.step(self.window, reuse)
+        if x.dim() == 4 and self.flatten_features:
+            x = torch.reshape(x, (x.size(0), x.size(1) * x.size(2), x.size(3)))
+
+        x = self.module.normalizer(x)
+        if not self.normalizer_is_positionwise:
+            reuse = None
+
+        x, _ = self.model.step(x, reuse)
+        x = self.head(x)
+
+        return x[0] if unbatched else x
@@ -203,6 +203,12 @@ class VisionBaseModule(ClassifierModule):
         else:
             ret = batch
 
+        data = ret.get("data", None)
+        if isinstance(data, torch.Tensor) and data.dtype == torch.uint8:
+            # images from the image cache are converted after the transfer to the device
+            ret = dict(ret)
+            ret["data"] = data.float() / 255
+
         return ret
 
     def get_class_names(self):
@@ -44,5 +44,22 @@ class Parametrized(Protocol[T]):
         ...
 
 
+_PARAMETRIZED_MEMBERS = ("sample", "instantiate", "set_current", "check", "parametrization")
+_is_parametrized_cache = {}
+
+
 def is_parametrized(obj):
-    return isinstance(obj, Parametrized)
+    # isinstance checks against runtime checkable protocols are slow, and this function is
+    # called for every operand during expression evaluation, so the result is cached per type
+    # whenever it can not depend on instance attributes.
+    cls = type(obj)
+    cached = _is_parametrized_cache.get(cls, None)
+    if cached is not None:
+        return cached
+
+    result = isinstance(obj, Parametrized)
+    if result and all(hasattr(cls, member) for member in _PARAMETRIZED_MEMBERS):
+        _is_parametrized_cache[cls] = True
+    elif not result and not hasattr(obj, "__dict__"):
+        _is_parametrized_cache[cls] = False
+    return result
@@ -22,7 +22,8 @@ from pathlib import Path
 from typing import Any, Dict
 
 import pandas as pd
-import yaml
+
+from ..search.sampler.history import load_history
 
 logger = logging.getLogger("nas_eval.prepare")
 
@@ -47,12 +48,15 @@ def prepare_summary(
         changed = False
         results_mtime = results_file.stat().st_mtime
         for name, source in data.items():
-            history_path = base_path / source / "history.pkl"
-            if history_path.exists():
-                history_mtime = history_path.stat().st_mtime
-                if history_mtime >= results_mtime:
-                    changed = True
-                    break
+            for history_name in ["history.jsonl", "history.sqlite", "history.yml"]:
+                history_path = base_path / source / history_name
+                if history_path.exists():
+                    history_mtime = history_path.stat().st_mtime
+                    if history_mtime >= results_mtime:
+                        changed = True
+                        break
+            if changed:
+                break
         if not changed:
             logger.info("  reading design points from saved data.pkl")
             metrics = pd.read_pickle(results_file)
@@ -65,16 +69,7 @@ def prepare_summary(
     parameters_all = {}
     for name, source in data.items():
         logger.info("  Extracting design points for task: %s", name)
-        history_path = base_path / source / "history.yml"
-
-        if history_path.suffix == ".yml":
-            with history_path.open("r") as yaml_file:
-                history_file = yaml.unsafe_load(yaml_file)
-        elif history_path.suffix == ".pkl":
-            with history_path.open("rb") as pickle_file:
-                history_file = pickle.load(pickle_file)
-        else:
-            raise Exception("Could not load history file: %s", str(history_path))
+        history_file = load_history(base_path / source)
 
         results = (h.result for h in history_file)
 
@@ -0,0 +1,112 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Interval arithmetic on expressions.
+
+Calculates lower and upper bounds of an expression over all possible values of the
+contained parameters, e.g. to find the maximal shape of a tensor in a search space.
+The bounds are conservative, i.e. they might not be reachable by any valid parametrization.
+"""
+import math
+import numbers
+from typing import Any, Tuple
+
+from ..core.expression import Expression
+from ..parameters.parameters import (
+    CategoricalParameter,
+    FloatScalarParameter,
+    IntScalarParameter,
+    Parameter,
+)
+from .arithmetic import Add, Ceil, Floor, Floordiv, Mod, Mul, Sub, Truediv
+from .choice import Choice, SymbolicSequence
+from .types import Cast
+
+
+def parameter_bounds(parameter: Parameter) -> Tuple[Any, Any]:
+    if isinstance(parameter, IntScalarParameter):
+        low, high = parameter.get_bounds()
+        high = low + (high - low) // parameter.step_size * parameter.step_size
+        return low, high
+    elif isinstance(parameter, FloatScalarParameter):
+        return parameter.min, parameter.max
+    elif isinstance(parameter, CategoricalParameter):
+        choices = list(parameter.choices)
+        if choices and all(isinstance(c, numbers.Number) for c in choices):
+            return min(choices), max(choices)
+    value = parameter.current_value
+    return value, value
+
+
+def _product_bounds(lhs, rhs, fn):
+    values = [fn(a, b) for a in lhs for b in rhs]
+    return min(values), max(values)
+
+
+def evaluate_bounds(expr) -> Tuple[Any, Any]:
+    """Returns a tuple (lower bound, upper bound) of the values expr can take
+
+    Expressions that are not supported by the interval arithmetic are evaluated
+    with the current values of their parameters.
+    """
+    if isinstance(expr, numbers.Number):
+        return expr, expr
+    elif isinstance(expr, Parameter):
+        return parameter_bounds(expr)
+    elif isinstance(expr, (Truediv, Floordiv)) and expr.lhs is expr.rhs:
+        # e.g. the channels per group of depthwise convolutions
+        return 1, 1
+    elif isinstance(expr, (Add, Sub, Mul, Truediv, Floordiv, Mod)):
+        lhs = evaluate_bounds(expr.lhs)
+        rhs = evaluate_bounds(expr.rhs)
+        if isinstance(expr, Add):
+            return lhs[0] + rhs[0], lhs[1] + rhs[1]
+        elif isinstance(expr, Sub):
+            return lhs[0] - rhs[1], lhs[1] - rhs[0]
+        elif isinstance(expr, Mul):
+            return _product_bounds(lhs, rhs, lambda a, b: a * b)
+        elif isinstance(expr, Mod):
+            if rhs[0] > 0 and lhs[0] >= 0:
+                return 0, min(lhs[1], rhs[1] - 1)
+        elif rhs[0] > 0 or rhs[1] < 0:
+            if isinstance(expr, Truediv):
+                return _product_bounds(lhs, rhs, lambda a, b: a / b)
+            return _product_bounds(lhs, rhs, lambda a, b: a // b)
+    elif isinstance(expr, (Floor, Ceil)):
+        low, high = evaluate_bounds(expr.operand)
+        fn = math.floor if isinstance(expr, Floor) else math.ceil
+        return fn(low), fn(high)
+    elif isinstance(expr, Cast) and expr.type in (int, float):
+        low, high = evaluate_bounds(expr.expr)
+        return expr.type(low), expr.type(high)
+    elif isinstance(expr, Choice):
+        return _union([evaluate_bounds(value) for value in expr.values])
+    elif isinstance(expr, SymbolicSequence) and isinstance(expr.expr, Choice):
+        if isinstance(expr.key, int):
+            return _union(
+                [evaluate_bounds(value[expr.key]) for value in expr.expr.values]
+            )
+
+    if isinstance(expr, Expression):
+        value = expr.evaluate()
+        return value, value
+    return expr, expr
+
+
+def _union(bounds):
+    return min(b[0] for b in bounds), max(b[1] for b in bounds)
@@ -0,0 +1,280 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Analytical cost model for functional operator graphs.
+
+Calculates the cost metrics of the currently active architecture of a search space
+directly from the op graph and the current parameter values, without instantiating
+or tracing a torch model. The metrics follow the conventions of `FxMACSummaryCallback`.
+"""
+
+import math
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from hannah.nas.functional_operators.lazy import lazy
+from hannah.nas.functional_operators.op import Bypass, ChoiceOp, Op, Tensor
+from hannah.nas.functional_operators.operators import (
+    AdaptiveAvgPooling,
+    Add,
+    AvgPooling,
+    BatchNorm,
+    Conv1d,
+    Conv2d,
+    Identity,
+    InterleaveChannels,
+    Linear,
+    MaxPooling,
+    Quantize,
+    Relu,
+)
+
+# Ops that do not create a new tensor in the executor
+ALIAS_OPS = (Identity, Quantize, Bypass)
+# Ops that keep the shape of their first operand
+ELEMENTWISE_OPS = (Relu, Add, BatchNorm, InterleaveChannels)
+
+
+def _volume(shape: Sequence[int]) -> int:
+    return int(math.prod(shape))
+
+
+def _active(node):
+    while isinstance(node, ChoiceOp):
+        node = node.options[node.switch.evaluate()]
+    return node
+
+
+def _window_dim(input_size, kernel_size, stride, padding, dilation):
+    if padding == "same":
+        padding = kernel_size // 2
+    return math.floor(
+        (input_size + padding * 2 - dilation * (kernel_size - 1) - 1) / stride + 1
+    )
+
+
+def execution_order(output: Op) -> List:
+    """Returns the active nodes of the graph in topological order
+
+    Choices are resolved according to the current parametrization.
+    """
+    order = []
+    visited = set()
+    stack = [(_active(output), False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+            continue
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        stack.append((node, True))
+        for operand in reversed(node.operands):
+            operand = _active(operand)
+            if id(operand) not in visited:
+                stack.append((operand, False))
+    return order
+
+
+def _output_shape(node, operand_shapes):
+    if isinstance(node, Tensor):
+        return tuple(int(s) for s in node.current_shape())
+    elif isinstance(node, ALIAS_OPS + ELEMENTWISE_OPS):
+        return operand_shapes[0]
+    elif isinstance(node, (Conv1d, Conv2d)):
+        input_shape, weight_shape = operand_shapes[0], operand_shapes[1]
+        kernel_size = weight_shape[2]
+        stride = lazy(node.stride)
+        padding = lazy(node.padding)
+        dilation = lazy(node.dilation)
+        spatial = [
+            _window_dim(s, kernel_size, stride, padding, dilation)
+            for s in input_shape[2:]
+        ]
+        return (input_shape[0], weight_shape[0], *spatial)
+    elif isinstance(node, (MaxPooling, AvgPooling)):
+        input_shape = operand_shapes[0]
+        kernel_size = lazy(node.kernel_size)
+        stride = lazy(node.stride)
+        padding = lazy(node.padding)
+        dilation = lazy(node.dilation)
+        spatial = [
+            _window_dim(s, kernel_size, stride, padding, dilation)
+            for s in input_shape[2:]
+        ]
+        return (input_shape[0], input_shape[1], *spatial)
+    elif isinstance(node, AdaptiveAvgPooling):
+        input_shape = operand_shapes[0]
+        output_size = node.output_size
+        if isinstance(output_size, int):
+            output_size = [output_size]
+        return (input_shape[0], input_shape[1], *[lazy(s) for s in output_size])
+    elif isinstance(node, Linear):
+        return (operand_shapes[0][0], operand_shapes[1][1])
+
+    # Fall back to the symbolic shape of the node
+    return tuple(int(lazy(s)) for s in node.shape())
+
+
+def _weights_and_macs(node, output_shape, operand_shapes):
+    if isinstance(node, (Conv1d, Conv2d)):
+        weight_shape = operand_shapes[1]
+        num_weights = _volume(weight_shape)
+        macs = _volume(output_shape) * weight_shape[1] * _volume(weight_shape[2:])
+        return num_weights, macs
+    elif isinstance(node, Linear):
+        num_weights = _volume(operand_shapes[1])
+        return num_weights, num_weights
+    return 0, 0
+
+
+def analyze(output: Op, input_shape: Optional[Sequence[int]] = None) -> Tuple[List[Dict], List, Dict]:
+    """Per node cost analysis of the active architecture
+
+    Args:
+        output (Op): the output node of the search space
+        input_shape (Sequence[int], optional): overrides the shape of the input tensor
+
+    Returns:
+        Tuple[List[Dict], List, Dict]: one entry for each executed operation, containing the node, its input and
+                                       output shapes, the number of weights and the number of MACs, the execution
+                                       order of the active nodes and the output shapes of all active nodes
+    """
+    order = execution_order(output)
+    shapes = {}
+    data = []
+    for node in order:
+        operands = [_active(o) for o in node.operands]
+        operand_shapes = [shapes[id(o)] for o in operands]
+
+        if isinstance(node, Tensor) and node.name == "input" and input_shape is not None:
+            shapes[id(node)] = tuple(input_shape)
+            continue
+
+        shape = _output_shape(node, operand_shapes)
+        shapes[id(node)] = shape
+
+        if isinstance(node, Tensor) or isinstance(node, ALIAS_OPS):
+            continue
+
+        if isinstance(node, Linear):
+            # The executor flattens the input before the linear layer
+            flat_shape = (operand_shapes[0][0], _volume(operand_shapes[0][1:]))
+            data.append(
+                {
+                    "node": node,
+                    "ifm": operand_shapes[0],
+                    "ofm": flat_shape,
+                    "weights": 0,
+                    "macs": 0,
+                }
+            )
+            operand_shapes = [flat_shape] + operand_shapes[1:]
+
+        num_weights, macs = _weights_and_macs(node, shape, operand_shapes)
+        data.append(
+            {
+                "node": node,
+                "ifm": operand_shapes[0],
+                "ofm": shape,
+                "weights": num_weights,
+                "macs": macs,
+            }
+        )
+
+    return data, order, shapes
+
+
+def peak_activation_memory(order: List, shapes: Dict) -> int:
+    """Peak number of simultaneously live activation elements when executing the nodes in the given order
+
+    Intermediate results are freed after their last use, alias ops share the memory of their operand.
+    """
+    buffer_of = {}
+    volumes = {}
+    last_use = {}
+    for position, node in enumerate(order):
+        if isinstance(node, Tensor):
+            if node.name == "input":
+                buffer_of[id(node)] = id(node)
+                volumes[id(node)] = _volume(shapes[id(node)])
+                last_use[id(node)] = position
+            continue
+
+        operands = [_active(o) for o in node.operands]
+        for operand in operands:
+            if id(operand) in buffer_of:
+                last_use[buffer_of[id(operand)]] = position
+
+        if isinstance(node, ALIAS_OPS) and operands and id(operands[0]) in buffer_of:
+            buffer_of[id(node)] = buffer_of[id(operands[0])]
+        else:
+            buffer_of[id(node)] = id(node)
+            volumes[id(node)] = _volume(shapes[id(node)])
+            last_use[id(node)] = position
+
+    # The output stays alive until the end
+    if order and id(order[-1]) in buffer_of:
+        last_use[buffer_of[id(order[-1])]] = len(order)
+
+    freed_at = {}
+    for buffer, position in last_use.items():
+        freed_at.setdefault(position, []).append(buffer)
+
+    live = 0
+    peak = 0
+    for position, node in enumerate(order):
+        if id(node) in volumes:
+            live += volumes[id(node)]
+        peak = max(peak, live)
+        for buffer in freed_at.get(position, []):
+            live -= volumes[buffer]
+
+    return peak
+
+
+def estimate_costs(
+    output: Op, input_shape: Optional[Sequence[int]] = None
+) -> Dict[str, float]:
+    """Calculate the cost metrics of the currently active architecture
+
+    Args:
+        output (Op): the output node of the search space
+        input_shape (Sequence[int], optional): overrides the shape of the input tensor
+
+    Returns:
+        Dict[str, float]: total_macs, total_weights, total_act and est_act as reported by `FxMACSummaryCallback`
+                          and peak_act, the peak activation memory in elements when intermediate results
+                          are freed after their last use
+    """
+    data, order, shapes = analyze(output, input_shape=input_shape)
+
+    res = OrderedDict()
+    if not data:
+        return res
+
+    ifm_volumes = [_volume(d["ifm"]) for d in data]
+    ofm_volumes = [_volume(d["ofm"]) for d in data]
+    res["total_macs"] = sum(d["macs"] for d in data)
+    res["total_weights"] = sum(d["weights"] for d in data)
+    res["total_act"] = ifm_volumes[0] + sum(ofm_volumes)
+    res["est_act"] = 2 * max(max(ifm_volumes), max(ofm_volumes))
+    res["peak_act"] = peak_activation_memory(order, shapes)
+
+    return res
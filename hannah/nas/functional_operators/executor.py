@@ -1,8 +1,11 @@
+import heapq
 from copy import deepcopy
 from typing import Iterator, Tuple
 import torch
+from hannah.nas.expressions.bounds import evaluate_bounds
 from hannah.nas.functional_operators.op import ChoiceOp, Op, Tensor, get_nodes
-from collections import defaultdict
+from hannah.nas.parameters.parametrize import set_parametrization
+from collections import defaultdict, deque
 from torch.nn.parameter import Parameter
 
 
@@ -19,6 +22,7 @@ class BasicExecutor(torch.nn.Module):
         else:
             self.init = torch.nn.init.xavier_uniform_
         self.nodes = []
+        self._plan = []
 
     def initialize(self):
         # FIXME: Only initialize used tensors
@@ -26,20 +30,24 @@ class BasicExecutor(torch.nn.Module):
             if isinstance(node, Tensor):
                 node_name = node.id.replace(".", "_")
                 if node.grad:
-                    data = torch.empty(node.current_shape())
+                    data = torch.empty(self.tensor_shape(node))
                     data = torch.nn.Parameter(self.init(data))
                     self.register_parameter(node_name, data)
                 if node.name == self.input_node_name:
                     self.input = node
                 if node.name == 'running_mean':
-                    data = torch.zeros(node.current_shape())
+                    data = torch.zeros(self.tensor_shape(node))
                     self.register_buffer(node_name, data)
                 if node.name == 'running_std':
-                    data = torch.ones(node.current_shape())
+                    data = torch.ones(self.tensor_shape(node))
                     self.register_buffer(node_name, data)
                 node.executor = self
         self.find_execution_order()
 
+    def tensor_shape(self, node):
+        "Shape of the data allocated for a tensor node"
+        return node.current_shape()
+
     def get_data(self, id):
         if id == 'input':
             return self.input_data
@@ -84,14 +92,13 @@ class BasicExecutor(torch.nn.Module):
     #     return True
 
     def find_dependencies(self):
-        nodes = []
-        queue = [self.output]
-        visited = [self.output.id]
+        queue = deque([self.output])
+        visited = {self.output.id}
         dependency_dict = {}
         self.node_dict = {}
 
         while queue:
-            node = queue.pop(0)
+            node = queue.popleft()
             self.node_dict[node.id] = node
             dependency_dict[node.id] = []
 
@@ -103,41 +110,101 @@ class BasicExecutor(torch.nn.Module):
                     dependency_dict[node.id].append(operand.id)
                 if operand.id not in visited:
                     queue.append(operand)
-                    visited.append(operand.id)
+                    visited.add(operand.id)
         return dependency_dict
 
-    def remove_from_dependency_dict(self, dependency_dict, node):
-        new_dict = deepcopy(dependency_dict)
-        for k, v in dependency_dict.items():
-            if node in v:
-                new_dict[k].remove(node)
-        return new_dict
-
     def find_execution_order(self):
+        """Topological sort (Kahn's algorithm) of the active nodes and compilation of the execution plan
+
+        Ready nodes are scheduled in reverse breadth first order starting from the output,
+        i.e. nodes close to the input are executed first.
+        """
         dependency_dict = self.find_dependencies()
-        self.forward_dict = deepcopy(dependency_dict)
+        self.forward_dict = dependency_dict
+
+        position = {node: num for num, node in enumerate(dependency_dict.keys())}
+        num_dependencies = {}
+        users = defaultdict(list)
+        ready = []
+        for node, dependencies in dependency_dict.items():
+            num_dependencies[node] = len(dependencies)
+            for dependency in dependencies:
+                users[dependency].append(node)
+            if not dependencies:
+                heapq.heappush(ready, (-position[node], node))
 
         nodes = []
-        queue = list(dependency_dict.keys())
-        while queue:
-            node = queue.pop(-1)
-            if len(dependency_dict[node]) > 0:
-                queue = [node] + queue
-            else:
-                nodes.append(node)
-                dependency_dict = self.remove_from_dependency_dict(dependency_dict, node)
+        while ready:
+            _, node = heapq.heappop(ready)
+            nodes.append(node)
+            for user in users[node]:
+                num_dependencies[user] -= 1
+                if num_dependencies[user] == 0:
+                    heapq.heappush(ready, (-position[user], user))
+
+        if len(nodes) != len(dependency_dict):
+            raise Exception("Could not find an execution order, the graph contains cycles")
+
         self.nodes = nodes
         self.nodes.remove('input')
+        self.compile_plan()
+
+    def compile_plan(self):
+        """Compile the execution order into a flat list of steps working on indexed slots
+
+        Each step is a tuple (node, operand slots, output slot, slots to free). Intermediate
+        results are dropped after their last use, so that they can be garbage collected
+        as early as possible.
+        """
+        slots = {'input': 0}
+        for node in self.nodes:
+            slots[node] = len(slots)
+
+        last_use = {}
+        for num, node in enumerate(self.nodes):
+            for operand in self.forward_dict[node]:
+                last_use[operand] = num
+
+        free_after = defaultdict(list)
+        for node, num in last_use.items():
+            if node != self.nodes[-1]:
+                free_after[num].append(slots[node])
+
+        self._plan = [
+            (
+                self.node_dict[node],
+                tuple(slots[operand] for operand in self.forward_dict[node]),
+                slots[node],
+                tuple(free_after[num]),
+            )
+            for num, node in enumerate(self.nodes)
+        ]
+        self._num_slots = len(slots)
+        self._output_slot = slots[self.nodes[-1]]
 
     def find_active_modules(self):
         pass
 
     def forward(self, x):
-        out = {'input': x}
-        for node in self.nodes:
-            operands = [out[n] for n in self.forward_dict[node]]
-            out[node] = self.node_dict[node].forward(*operands)
-        return out[node]
+        out = [None] * self._num_slots
+        out[0] = x
+        for node, operand_slots, output_slot, free_slots in self._plan:
+            out[output_slot] = node.forward(*[out[slot] for slot in operand_slots])
+            for slot in free_slots:
+                out[slot] = None
+        return out[self._output_slot]
+
+    def to_graph_module(self) -> torch.fx.GraphModule:
+        """Trace the current architecture into a torch.fx.GraphModule
+
+        The graph module only contains the active nodes and the current values of all parameters of
+        the search space, changing the parametrization afterwards has no effect on the graph module.
+        """
+        from hannah.nas.fx.tracer import SearchSpaceTracer
+
+        tracer = SearchSpaceTracer()
+        graph = tracer.trace(self)
+        return torch.fx.GraphModule(self, graph)
 
     def parametrization(self, flatten=True):
         return self.output.parametrization(flatten=flatten)
@@ -161,6 +228,74 @@ class BasicExecutor(torch.nn.Module):
             self.training = False
 
 
-class WeightSharingExecutor:
-    def __init__(self) -> None:
-        pass
+class WeightSharingExecutor(BasicExecutor):
+    """Executor for the complete search space (supernet)
+
+    The tensors are allocated once with their maximal shape over all parametrizations of the
+    search space. The currently active subnet uses slices of these tensors, leading
+    slices for channels and centered slices for kernels, so all subnets share their weights.
+
+    After changing the parametrization the subnet has to be activated with `set_subnet` or
+    `find_execution_order`.
+    """
+
+    def tensor_shape(self, node):
+        return tuple(
+            max(evaluate_bounds(dim)[1], current)
+            for dim, current in zip(node.shape(), node.current_shape())
+        )
+
+    def find_execution_order(self):
+        super().find_execution_order()
+        self._slices = {}
+        for node in self.node_dict.values():
+            if isinstance(node, Tensor) and node.id != 'input':
+                self._slices[node.id] = self._tensor_slices(node)
+
+    def _tensor_slices(self, node):
+        data = getattr(self, node.id.replace(".", "_"), None)
+        if data is None:
+            return None
+        slices = []
+        for axis, size, max_size in zip(node.axis, node.current_shape(), data.shape):
+            if size > max_size:
+                raise Exception(f"Shape of {node.id} exceeds the allocated shape {tuple(data.shape)}")
+            if axis.startswith('k'):
+                # kernels are shared by their center
+                start = (max_size - size) // 2
+            else:
+                start = 0
+            slices.append(slice(start, start + size))
+        return tuple(slices)
+
+    def get_data(self, id):
+        if id == 'input':
+            return self.input_data
+        data = getattr(self, id.replace(".", "_"))
+        return data[self._slices[id]]
+
+    def set_subnet(self, parameters):
+        """Activate the subnet given by a (flattened) parametrization of the search space"""
+        set_parametrization(parameters, self.parametrization(flatten=True))
+        self.find_execution_order()
+
+    def sample_subnet(self, max_tries=1000):
+        """Activate a random subnet that satisfies the constraints of the search space
+
+        Returns:
+            Dict[str, Any]: the parameters of the subnet
+        """
+        for _ in range(max_tries):
+            try:
+                self.output.sample()
+                self.output.check()
+                break
+            except Exception:
+                continue
+        else:
+            raise Exception(f"Could not sample a valid subnet in {max_tries} tries")
+        self.find_execution_order()
+        return self.current_parameters()
+
+    def current_parameters(self):
+        return {k: p.current_value for k, p in self.parametrization(flatten=True).items()}
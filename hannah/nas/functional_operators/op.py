@@ -17,40 +17,98 @@ from hannah.nas.parameters.parametrize import parametrize
 
 
 def nodes_in_scope(node, inputs):
+    # Cant use "in" because of EQ-Condition, nodes are compared by identity
+    input_ids = {id(i) for i in inputs}
     queue = [node]
-    visited = [node]
+    visited = {id(node)}
 
     while queue:
         n = queue.pop(-1)
         yield n
         for o in n.operands:
-            # Cant use "in" because of EQ-Condition
-            if not any([o is i for i in inputs]) and o not in visited:
+            if id(o) not in input_ids and id(o) not in visited:
                 queue.append(o)
-                visited.append(o)
+                visited.add(id(o))
 
 
 def get_nodes(node):
+    # Cant use "in" because of EQ-Condition, nodes are compared by identity
     queue = [node]
-    visited = [node]
+    visited = {id(node)}
 
     while queue:
         n = queue.pop(-1)
         yield n
         for o in n.operands:
-            # Cant use "in" because of EQ-Condition
-            if o not in visited:
+            if id(o) not in visited:
                 queue.append(o)
-                visited.append(o)
+                visited.add(id(o))
+
+
+def _own_scope_counter(node):
+    highest_scope = node.id.split(".")[0]
+    name, _, counter = highest_scope.rpartition("_")
+    try:
+        return name, int(counter)
+    except ValueError:
+        return None, None
+
+
+def invalidate_scope_counters(node):
+    """Invalidate the cached scope counters of node and of all nodes depending on it
+
+    Must be called whenever the id or the operands of a node change.
+    """
+    queue = [node]
+    while queue:
+        n = queue.pop(-1)
+        n.__dict__["_scope_counters"] = None
+        dependents = n.__dict__.get("_scope_dependents", None)
+        if dependents:
+            queue.extend(d for d in dependents.values() if d.__dict__.get("_scope_counters", None) is not None)
+            dependents.clear()
+
+
+def scope_counters(node):
+    """Highest counter of each top level scope in the graph upstream of node (including node)
+
+    The counters are cached on the nodes, so that assigning the ids of a newly created
+    node or scope does not need to walk the whole graph again. A node only has cached
+    counters if all its operands have cached counters.
+    """
+    if node.__dict__.get("_scope_counters", None) is not None:
+        return node._scope_counters
+
+    stack = [(node, False)]
+    while stack:
+        n, expanded = stack.pop()
+        if n.__dict__.get("_scope_counters", None) is not None:
+            continue
+        if not expanded:
+            stack.append((n, True))
+            for o in n.operands:
+                if o.__dict__.get("_scope_counters", None) is None:
+                    stack.append((o, False))
+            continue
+
+        counters = {}
+        for o in n.operands:
+            for name, ct in o._scope_counters.items():
+                if ct > counters.get(name, -1):
+                    counters[name] = ct
+            o.__dict__.setdefault("_scope_dependents", {})[id(n)] = n
+        name, ct = _own_scope_counter(n)
+        if name is not None and ct > counters.get(name, -1):
+            counters[name] = ct
+        n._scope_counters = counters
+
+    return node._scope_counters
 
 
 def get_highest_scope_counter(start_nodes, scope):
     ct = -1
     for start_node in start_nodes:
-        for n in get_nodes(start_node):
-            highest_scope = n.id.split(".")[0]
-            if scope == "_".join(highest_scope.split('_')[:-1]):
-                ct = max(int(highest_scope.split('_')[-1]), ct)
+        ct = max(scope_counters(start_node).get(scope, -1), ct)
     return ct
 
 
@@ -84,6 +142,15 @@ class Op:
         self._shape = None
         self._train = True
 
+    @property
+    def id(self):
+        return self._id
+
+    @id.setter
+    def id(self, new_id):
+        self._id = new_id
+        invalidate_scope_counters(self)
+
     # TODO: Remove verify operands if it is not needed (if Choice node is used we might need it again)
     # def _verify_operands(self, *operands):
     #     pass
@@ -110,6 +177,7 @@ class Op:
 
         node.operands.append(self)
         self.users.append(node)
+        invalidate_scope_counters(node)
 
     def forward(self, *operands):
         return self._forward_implementation(*operands)
@@ -180,6 +248,15 @@ class Tensor:
         self.grad = grad
         self.executor = None
 
+    @property
+    def id(self):
+        return self._id
+
+    @id.setter
+    def id(self, new_id):
+        self._id = new_id
+        invalidate_scope_counters(self)
+
     def forward(self, *operands):
         # TODO: Shape checking
         return self.executor.get_data(self.id)
@@ -192,6 +269,7 @@ class Tensor:
             node._PARAMETERS[self.name] = self
         node.operands.append(self)
         self.users.append(node)
+        invalidate_scope_counters(node)
 
     def setid(self, new_id):
         to_remove = []
@@ -32,6 +32,8 @@ from hydra.utils import instantiate
 from omegaconf import DictConfig, OmegaConf
 from sklearn.preprocessing import MinMaxScaler
 
+from .featurizer import graph_edges, load_performance_data, make_dgl_graph
+
 
 # FIXME: Find better way
 COLUMNS = ['output_quant_bits', 'output_shape_0', 'output_shape_1',
@@ -57,26 +59,11 @@ class NASGraphDataset(DGLDataset):
         super().__init__(name="nasgraph")
 
     def process(self):
-        self.nx_graphs = []
         self.graphs = []
         self.labels = []
         assert self.result_folder.exists()
 
-
-        for i, data_path in enumerate(self.result_folder.glob("model_*.json")):
-            if i % 500 == 0:
-                print("Processing graph {}".format(i))
-
-            d = json.load(data_path.open())
-
-            graph = nx.json_graph.node_link_graph(d["graph"])
-            self.nx_graphs.append(graph)
-            fea = get_features(graph)
-            for i, n in enumerate(graph.nodes):
-                graph.nodes[n]['features'] = fea.iloc[i].to_numpy()
-            dgl_graph = to_dgl_graph(graph)
-
-            metrics = d["metrics"]
+        for dgl_graph, metrics in load_performance_data(self.result_folder):
             if metrics.get("val_error", None) is not None:
                 if metrics['val_error'] == 0:
                     label = float('inf')
@@ -201,33 +188,15 @@ def unfold_columns(df, columns=[], strict=False):
 
 
 def to_dgl_graph(nx_graph):
-
-    node_num = {}
-    fea_tensor = []
-    fea_len = 0
-    for num, n in enumerate(nx_graph.nodes):
-        feature_vec = torch.tensor(nx_graph.nodes[n]["features"])
-        fea_len = max(len(feature_vec), fea_len)
-        fea_tensor.append(feature_vec)
-        node_num[n] = num
-
-    padded_features = []
-    for vec in fea_tensor:
-        padded_vec = np.pad(
-            vec, (0, fea_len - len(vec)), mode="constant", constant_values=0
-        )
-        padded_vec = torch.tensor(padded_vec)
-        padded_features.append(padded_vec)
-
-    src = []
-    dst = []
-    for i, j in nx_graph.edges:
-        src.append(node_num[i])
-        dst.append(node_num[j])
-
-    fea_tensor = torch.vstack(padded_features)
-    g = dgl.graph(data=(src, dst))
-    g.ndata["features"] = fea_tensor
-    g = dgl.add_self_loop(g)
-
-    return g
+    """Converts a networkx graph with precomputed node attribute 'features' into a DGL graph
+
+    Feature vectors of different length are zero padded to the longest one.
+    """
+    features = [np.asarray(nx_graph.nodes[n]["features"], dtype=np.float32) for n in nx_graph.nodes]
+    fea_len = max((len(f) for f in features), default=0)
+    fea_tensor = np.zeros((len(features), fea_len), dtype=np.float32)
+    for row, vec in enumerate(features):
+        fea_tensor[row, : len(vec)] = vec
+
+    src, dst = graph_edges(nx_graph)
+    return make_dgl_graph(fea_tensor, src, dst)
@@ -0,0 +1,199 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Schema based node features for the graphs created by `hannah.nas.graph_conversion`.
+
+In contrast to `dataset.get_features`, the feature columns are fixed by the schema below,
+so the features of all graphs have the same width and the same column order,
+independent of the node types and attributes occurring in a single graph.
+"""
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Tuple, Union
+
+import dgl
+import networkx as nx
+import numpy as np
+import torch
+from joblib import Parallel, delayed
+
+msglogger = logging.getLogger(__name__)
+
+QUANT_DTYPES = ["float", "int", "uint"]
+QUANT_METHODS = ["none", "symmetric", "power_of_2"]
+NODE_TYPES = [
+    "placeholder",
+    "tensor",
+    "quantize",
+    "conv",
+    "linear",
+    "batch_norm",
+    "relu",
+    "pooling",
+    "add",
+    "dropout",
+    "flatten",
+]
+
+# (path in the node attributes, number of columns), scalars are broadcast to all columns
+NUMERIC_FEATURES = [
+    (("output", "quant", "bits"), 1),
+    (("output", "shape"), 4),
+    (("attrs", "in_channels"), 1),
+    (("attrs", "out_channels"), 1),
+    (("attrs", "kernel_size"), 2),
+    (("attrs", "stride"), 2),
+    (("attrs", "dilation"), 2),
+    (("attrs", "groups"), 1),
+    (("attrs", "padding"), 2),
+    (("attrs", "in_features"), 1),
+    (("attrs", "out_features"), 1),
+    (("weight", "quant", "bits"), 1),
+    (("weight", "shape"), 4),
+    (("bias", "quant", "bits"), 1),
+    (("bias", "shape"), 1),
+]
+
+# (path in the node attributes, vocabulary), values are one hot encoded
+CATEGORICAL_FEATURES = [
+    (("type",), NODE_TYPES),
+    (("output", "quant", "dtype"), QUANT_DTYPES),
+    (("output", "quant", "method"), QUANT_METHODS),
+    (("weight", "quant", "dtype"), QUANT_DTYPES),
+    (("weight", "quant", "method"), QUANT_METHODS),
+    (("bias", "quant", "dtype"), QUANT_DTYPES),
+    (("bias", "quant", "method"), QUANT_METHODS),
+]
+
+
+def _feature_columns() -> List[str]:
+    columns = []
+    for path, width in NUMERIC_FEATURES:
+        name = "_".join(path)
+        columns.extend([name] if width == 1 else [f"{name}_{i}" for i in range(width)])
+    for path, vocabulary in CATEGORICAL_FEATURES:
+        name = "_".join(path)
+        columns.extend(f"{name}_{value}" for value in vocabulary)
+    return columns
+
+
+FEATURE_COLUMNS = _feature_columns()
+NUM_FEATURES = len(FEATURE_COLUMNS)
+
+
+def _offsets():
+    offset = 0
+    numeric = []
+    for path, width in NUMERIC_FEATURES:
+        numeric.append((path, offset, width))
+        offset += width
+    categorical = []
+    for path, vocabulary in CATEGORICAL_FEATURES:
+        categorical.append((path, {v: offset + i for i, v in enumerate(vocabulary)}))
+        offset += len(vocabulary)
+    return numeric, categorical
+
+
+_NUMERIC_OFFSETS, _CATEGORICAL_OFFSETS = _offsets()
+
+
+def _lookup(attrs, path):
+    for key in path:
+        if not isinstance(attrs, dict):
+            return None
+        attrs = attrs.get(key, None)
+    return attrs
+
+
+def node_features(nx_graph: nx.DiGraph) -> np.ndarray:
+    """Feature matrix with one row per node (in the order of nx_graph.nodes) and the columns of `FEATURE_COLUMNS`"""
+    nodes = list(nx_graph.nodes.values())
+    features = np.zeros((len(nodes), NUM_FEATURES), dtype=np.float32)
+
+    for path, offset, width in _NUMERIC_OFFSETS:
+        for row, attrs in enumerate(nodes):
+            value = _lookup(attrs, path)
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple, torch.Size)):
+                value = value[:width]
+                features[row, offset : offset + len(value)] = value
+            else:
+                features[row, offset : offset + width] = value
+
+    for path, columns in _CATEGORICAL_OFFSETS:
+        indices = [
+            (row, columns.get(_lookup(attrs, path), None))
+            for row, attrs in enumerate(nodes)
+        ]
+        indices = np.asarray([i for i in indices if i[1] is not None], dtype=np.int64)
+        if len(indices) > 0:
+            features[indices[:, 0], indices[:, 1]] = 1.0
+
+    return features
+
+
+def graph_edges(nx_graph: nx.DiGraph) -> Tuple[np.ndarray, np.ndarray]:
+    node_num = {n: num for num, n in enumerate(nx_graph.nodes)}
+    edges = np.asarray(
+        [(node_num[i], node_num[j]) for i, j in nx_graph.edges], dtype=np.int64
+    ).reshape(-1, 2)
+    return edges[:, 0], edges[:, 1]
+
+
+def make_dgl_graph(features: np.ndarray, src: np.ndarray, dst: np.ndarray) -> dgl.DGLGraph:
+    g = dgl.graph(data=(torch.from_numpy(src), torch.from_numpy(dst)), num_nodes=len(features))
+    g.ndata["features"] = torch.from_numpy(features)
+    g = dgl.add_self_loop(g)
+    return g
+
+
+def graph_to_dgl(nx_graph: nx.DiGraph) -> dgl.DGLGraph:
+    """Converts a networkx graph from `model_to_graph` into a DGL graph with the schema based node features"""
+    src, dst = graph_edges(nx_graph)
+    return make_dgl_graph(node_features(nx_graph), src, dst)
+
+
+def _load_graph_data(data_path: Path):
+    with data_path.open() as data_file:
+        d = json.load(data_file)
+    nx_graph = nx.json_graph.node_link_graph(d["graph"])
+    src, dst = graph_edges(nx_graph)
+    return node_features(nx_graph), src, dst, d.get("metrics", {})
+
+
+def load_performance_data(
+    result_folder: Union[str, Path], n_jobs: int = -1
+) -> List[Tuple[dgl.DGLGraph, Dict[str, Any]]]:
+    """Load the graphs and metrics of all `model_*.json` files in result_folder
+
+    The files are parsed and featurized in n_jobs parallel processes.
+
+    Returns:
+        List[Tuple[dgl.DGLGraph, Dict[str, Any]]]: the DGL graph and the metrics of each model
+    """
+    paths = sorted(Path(result_folder).glob("model_*.json"))
+    if not paths:
+        return []
+
+    data = Parallel(n_jobs=n_jobs, batch_size=16)(
+        delayed(_load_graph_data)(path) for path in paths
+    )
+    msglogger.info("Loaded %d graphs from %s", len(data), result_folder)
+    return [(make_dgl_graph(features, src, dst), metrics) for features, src, dst, metrics in data]
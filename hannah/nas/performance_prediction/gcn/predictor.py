@@ -16,12 +16,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import time
+
 import dgl
 import numpy as np
 import torch
 import torch.nn.functional as F
 import xgboost as xgb
 from dgl.dataloading import GraphDataLoader
+from scipy.linalg import LinAlgError, cho_solve, cholesky, solve_triangular
 from sklearn.gaussian_process import GaussianProcessRegressor
 from sklearn.gaussian_process.kernels import (
     RBF,
@@ -56,9 +59,12 @@ class Predictor:
         num_epochs=200,
         validation_dataloader=None,
         verbose=1,
+        time_budget=None,
     ):
         """Train GCN model
 
+        Training continues from the current weights of the model, so repeated calls warm start the training.
+
         Parameters
         ----------
         dataloader : GraphDataLoader
@@ -71,10 +77,15 @@ class Predictor:
             if given, use this data to print validation loss, by default None
         verbose : int
             if validation_dataloader is given, print validation MSE every <verbose> epoch, by default 1
+        time_budget : float, optional
+            if given, stop training after the first epoch exceeding <time_budget> seconds, by default None
         """
         assert self.model, "You must specify a model (e.g. use GCNPredictor())"
         optimizer = torch.optim.Adam(self.model.parameters(), lr=learning_rate)
+        start_time = time.perf_counter()
         for epoch in range(num_epochs):
+            if time_budget is not None and epoch > 0 and time.perf_counter() - start_time > time_budget:
+                break
             for batched_graph, labels in dataloader:
                 pred = self.model(
                     batched_graph, batched_graph.ndata[self.fea_name].float()
@@ -103,6 +114,27 @@ class Predictor:
                         )
                     )
 
+    def warm_start(self, dataloader, fit_dataloader=None, num_epochs=200, verbose=1, time_budget=None):
+        """Continue the training of the model from its current weights and fit the predictor
+
+        Predictors using a separate regressor on top of the graph embeddings refit it on
+        `fit_dataloader` after training the embedding network.
+
+        Parameters
+        ----------
+        dataloader : GraphDataLoader
+            training data for the model
+        fit_dataloader : GraphDataLoader, optional
+            data used to fit the predictor on top of the embeddings, by default the training data
+        num_epochs : int, optional
+            by default 200
+        verbose : int
+            by default 1
+        time_budget : float, optional
+            if given, stop training after the first epoch exceeding <time_budget> seconds, by default None
+        """
+        self.train(dataloader, num_epochs=num_epochs, verbose=verbose, time_budget=time_budget)
+
     def predict(self, graph):
         """predict cost of graph
 
@@ -234,6 +266,9 @@ class GaussianProcessPredictor(Predictor):
             n_restarts_optimizer=2,
             alpha=alpha,
         )
+        # embeddings and labels the gaussian process has been fitted on
+        self.embeddings = np.zeros((0, embedding_size))
+        self.labels = np.zeros(0)
 
     def set_predictor(self, predictor):
         self.predictor = predictor
@@ -243,18 +278,60 @@ class GaussianProcessPredictor(Predictor):
 
     def fit_predictor(self, embeddings, labels):
         self.predictor.fit(embeddings, labels)
+        self.embeddings = np.asarray(embeddings)
+        self.labels = np.asarray(labels).reshape(-1)
 
-    def embedd_and_fit(self, dataloader, verbose=True):
-        embeddings = []
-        labels = []
-        for batched_graph, batched_labels in dataloader:
-            graphs = dgl.unbatch(batched_graph)
-            for g, l in zip(graphs, batched_labels):
-                embeddings.append(self.get_embedding(g))
-                labels.append(l)
+    def update_predictor(self, embeddings, labels):
+        """Add training points to the fitted gaussian process without refitting it.
 
-        embeddings = torch.vstack(embeddings).detach().numpy()
-        labels = torch.hstack(labels).detach().numpy()
+        The cholesky factor of the kernel matrix is extended by a rank-k update, which costs O(n^2 k)
+        instead of the O(n^3) of a full fit. Kernel hyperparameters and label normalization of the
+        last call to fit_predictor are kept.
+        """
+        embeddings = np.atleast_2d(np.asarray(embeddings))
+        labels = np.asarray(labels).reshape(-1)
+
+        gp = self.predictor
+        if not hasattr(gp, "L_") or np.ndim(gp.alpha) > 0:
+            self.fit_predictor(np.vstack([self.embeddings, embeddings]), np.hstack([self.labels, labels]))
+            return
+
+        k_cross = gp.kernel_(gp.X_train_, embeddings)
+        k_new = gp.kernel_(embeddings) + gp.alpha * np.eye(len(embeddings))
+        l_cross = solve_triangular(gp.L_, k_cross, lower=True, check_finite=False)
+        try:
+            l_new = cholesky(k_new - l_cross.T @ l_cross, lower=True, check_finite=False)
+        except LinAlgError:
+            self.fit_predictor(np.vstack([self.embeddings, embeddings]), np.hstack([self.labels, labels]))
+            return
+
+        n, k = len(gp.X_train_), len(embeddings)
+        L = np.zeros((n + k, n + k))
+        L[:n, :n] = gp.L_
+        L[n:, :n] = l_cross.T
+        L[n:, n:] = l_new
+
+        gp.L_ = L
+        gp.X_train_ = np.vstack([gp.X_train_, embeddings])
+        gp.y_train_ = np.hstack([gp.y_train_, (labels - gp._y_train_mean) / gp._y_train_std])
+        gp.alpha_ = cho_solve((gp.L_, True), gp.y_train_, check_finite=False)
+
+        self.embeddings = np.vstack([self.embeddings, embeddings])
+        self.labels = np.hstack([self.labels, labels])
+
+    def update(self, graphs, labels):
+        """Add new graphs to the gaussian process using the current embedding network."""
+        with torch.no_grad():
+            embeddings = self.get_embedding(dgl.batch(graphs)).numpy()
+        self.update_predictor(embeddings, labels)
+
+    def warm_start(self, dataloader, fit_dataloader=None, num_epochs=200, verbose=1, time_budget=None):
+        super().warm_start(dataloader, num_epochs=num_epochs, verbose=verbose, time_budget=time_budget)
+        # the predictor on top of the embeddings is always fitted from scratch
+        self.embedd_and_fit(fit_dataloader if fit_dataloader is not None else dataloader, verbose=False)
+
+    def embedd_and_fit(self, dataloader, verbose=True):
+        embeddings, labels = self.embedd(dataloader)
 
         self.fit_predictor(embeddings, labels)
         score = self.predictor.score(embeddings, labels)
@@ -265,14 +342,14 @@ class GaussianProcessPredictor(Predictor):
     def embedd(self, dataloader):
         embeddings = []
         labels = []
-        for batched_graph, batched_labels in dataloader:
-            graphs = dgl.unbatch(batched_graph)
-            for g, l in zip(graphs, batched_labels):
-                embeddings.append(self.get_embedding(g))
-                labels.append(l)
-
-        embeddings = torch.vstack(embeddings).detach().numpy()
-        labels = torch.hstack(labels).detach().numpy()
+        with torch.no_grad():
+            for batched_graph, batched_labels in dataloader:
+                # The readout of the embedding network returns one embedding per graph in the batch
+                embeddings.append(self.get_embedding(batched_graph))
+                labels.append(batched_labels)
+
+        embeddings = torch.vstack(embeddings).numpy()
+        labels = torch.hstack(labels).numpy()
         return embeddings, labels
 
     def train_and_fit(
@@ -312,16 +389,7 @@ class GaussianProcessPredictor(Predictor):
         if verbose:
             print("Create training embeddings ...")
 
-        embeddings = []
-        labels = []
-        for batched_graph, batched_labels in dataloader:
-            graphs = dgl.unbatch(batched_graph)
-            for g, l in zip(graphs, batched_labels):
-                embeddings.append(self.get_embedding(g))
-                labels.append(l)
-
-        embeddings = torch.vstack(embeddings).detach().numpy()
-        labels = torch.hstack(labels).detach().numpy()
+        embeddings, labels = self.embedd(dataloader)
 
         if verbose:
             print("Fit predictor ...")
@@ -359,14 +427,8 @@ class GaussianProcessPredictor(Predictor):
             prediction(s) , (if return_std: standard deviation(s))
         """
         if isinstance(X, dgl.DGLGraph):
-            if X.batch_size == 1:
-                embeddings = self.get_embedding(X).detach().numpy()
-            else:
-                embeddings = []
-                graphs = dgl.unbatch(X)
-                for g in graphs:
-                    embeddings.append(self.get_embedding(g))
-                embeddings = torch.vstack(embeddings).detach().numpy()
+            # The readout of the embedding network returns one embedding per graph in the batch
+            embeddings = self.get_embedding(X).detach().numpy()
         elif isinstance(X, list):
             embeddings = []
             for graph in X:
@@ -518,14 +580,8 @@ class XGBPredictor(Predictor):
             prediction(s) , (if return_std: standard deviation(s))
         """
         if isinstance(X, dgl.DGLGraph):
-            if X.batch_size == 1:
-                embeddings = self.get_embedding(X).detach().numpy()
-            else:
-                embeddings = []
-                graphs = dgl.unbatch(X)
-                for g in graphs:
-                    embeddings.append(self.get_embedding(g))
-                embeddings = torch.vstack(embeddings).detach().numpy()
+            # The readout of the embedding network returns one embedding per graph in the batch
+            embeddings = self.get_embedding(X).detach().numpy()
         elif isinstance(X, list):
             embeddings = []
             for graph in X:
@@ -544,6 +600,11 @@ class XGBPredictor(Predictor):
         preds = self.predictor.predict(dtest)
         return preds
 
+    def warm_start(self, dataloader, fit_dataloader=None, num_epochs=200, verbose=1, time_budget=None):
+        super().warm_start(dataloader, num_epochs=num_epochs, verbose=verbose, time_budget=time_budget)
+        # the predictor on top of the embeddings is always fitted from scratch
+        self.embedd_and_fit(fit_dataloader if fit_dataloader is not None else dataloader, verbose=False)
+
     def embedd_and_fit(self, dataloader, verbose=True):
         embeddings = []
         labels = []
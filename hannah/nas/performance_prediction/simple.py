@@ -31,14 +31,29 @@ from tabulate import tabulate
 from pathlib import Path
 
 from hannah.callbacks.summaries import FxMACSummaryCallback, MacSummaryCallback
+from hannah.nas.functional_operators.cost_model import estimate_costs
+from hannah.nas.functional_operators.executor import BasicExecutor
+from hannah.nas.functional_operators.op import Op
 from hannah.nas.graph_conversion import GraphConversionTracer, model_to_graph
-from hannah.nas.performance_prediction.features.dataset import OnlineNASGraphDataset, get_features, to_dgl_graph
+from hannah.nas.performance_prediction.features.dataset import OnlineNASGraphDataset, to_dgl_graph
+from hannah.nas.performance_prediction.features.featurizer import graph_to_dgl, load_performance_data
+from dgl.dataloading import GraphDataLoader
 from hannah.nas.performance_prediction.gcn.predictor import Predictor, prepare_dataloader
 from omegaconf import DictConfig
 
 logger = logging.getLogger(__name__)
 
 
+def model_to_dgl_graph(model, input):
+    if hasattr(model, 'model'):
+        model = model.model  # FIXME: Decide when to use pl_module and when to use model
+
+    model.train()
+
+    nx_graph = model_to_graph(model, input)
+    return graph_to_dgl(nx_graph)
+
+
 class BackendPredictor:
     """A predictor class that instantiates the model and uses the backends predict function to predict performance metrics"""
 
@@ -71,12 +86,15 @@ class MACPredictor:
         self._predictor = predictor
 
     def predict(self, model, input = None):
-        if self._predictor == 'fx':
-            predictor = FxMACSummaryCallback()
+        if self._predictor == 'analytical':
+            metrics = self._predict_analytical(model, input)
         else:
-            predictor = MacSummaryCallback()
+            if self._predictor == 'fx':
+                predictor = FxMACSummaryCallback()
+            else:
+                predictor = MacSummaryCallback()
 
-        metrics = predictor.predict(model, input=input)
+            metrics = predictor.predict(model, input=input)
 
         logger.info("Predicted performance metrics")
         for k in metrics.keys():
@@ -84,11 +102,44 @@ class MACPredictor:
 
         return metrics
 
+    def _predict_analytical(self, model, input=None):
+        """Evaluates the cost model directly on the functional op graph, without tracing the model
+
+        The model can either be the output node of a functional search space, a BasicExecutor or a
+        lightning module wrapping a BasicExecutor.
+        """
+        if hasattr(model, 'model'):
+            model = model.model
+        if isinstance(model, BasicExecutor):
+            model = model.output
+        if not isinstance(model, Op):
+            raise Exception(f"Analytical cost model is not supported for models of type {type(model)}")
+
+        input_shape = tuple(input.shape) if input is not None else None
+        return estimate_costs(model, input_shape=input_shape)
 
-class GCNPredictor:
-    """A predictor class that instantiates the model and uses the backends predict function to predict performance metrics"""
 
-    def __init__(self, model):
+class GCNPredictor:
+    """A predictor class that instantiates the model and uses the backends predict function to predict performance metrics
+
+    The first training runs `num_epochs` epochs on all data. Later trainings are warm started from the
+    current weights and run `incremental_epochs` epochs on the new data and a random replay sample of at most
+    `replay_size` old data points, optionally stopping after `time_budget` seconds. Predictors supporting
+    incremental updates (e.g. GaussianProcessPredictor) are only retrained every `retrain_interval` updates,
+    in between new data is added to their fit without training the embedding network.
+    """
+
+    def __init__(
+        self,
+        model,
+        num_epochs=20,
+        incremental_epochs=5,
+        replay_size=256,
+        retrain_interval=5,
+        time_budget=None,
+        batch_size=32,
+        seed=0,
+    ):
         if isinstance(model, DictConfig):
             self.predictor = instantiate(model)
         elif isinstance(model, Predictor):
@@ -98,49 +149,31 @@ class GCNPredictor:
         self.graphs = []
         self.labels = []
 
+        self.num_epochs = num_epochs
+        self.incremental_epochs = incremental_epochs
+        self.replay_size = replay_size
+        self.retrain_interval = retrain_interval
+        self.time_budget = time_budget
+        self.batch_size = batch_size
+        self.random_state = np.random.RandomState(seed)
 
-    def load(self, result_folder : str):
-        result_folder = Path(result_folder)
-        for i, data_path in tqdm.tqdm(enumerate(result_folder.glob("model_*.json"))):
-            #if i % 500 == 0:
-            i#print("Processing graph {}".format(i))
-
-            d = json.load(data_path.open())
-
-            nx_graph = nx.json_graph.node_link_graph(d["graph"])
+        self._num_trained = 0
+        self._updates_since_training = 0
 
+    def load(self, result_folder : str, n_jobs : int = -1):
+        for dgl_graph, metrics in load_performance_data(result_folder, n_jobs=n_jobs):
             #FIXME: make features configurable
-            result = d["metrics"]["val_error"]
-
-            fea = get_features(nx_graph)
-
-            for i, n in enumerate(nx_graph.nodes):
-                nx_graph.nodes[n]['features'] = fea.iloc[i].to_numpy()
-
-            dgl_graph = to_dgl_graph(nx_graph)
-
             self.graphs.append(dgl_graph)
-            self.labels.append(result)
+            self.labels.append(metrics["val_error"])
 
         self.train()
 
     def predict(self, model, input):
-        if hasattr(model, 'model'):
-            model = model.model  # FIXME: Decide when to use pl_module and when to use model
+        dgl_graph = model_to_dgl_graph(model, input)
 
-        model.train()
+        result = self._predict_mean(dgl_graph)
 
-        nx_graph = model_to_graph(model, input)
-        fea = get_features(nx_graph)
-        for i, n in enumerate(nx_graph.nodes):
-            nx_graph.nodes[n]['features'] = fea.iloc[i].to_numpy()
-        dgl_graph = to_dgl_graph(nx_graph)
-
-        result, std_dev = self.predictor.predict(dgl_graph)
-
-        print(result, std_dev)
-
-        metrics = {'val_error': result.item()}
+        metrics = {'val_error': float(result[0])}
 
         logger.info("Predicted performance metrics")
         for k in metrics.keys():
@@ -148,19 +181,75 @@ class GCNPredictor:
 
         return metrics
 
+    def _predict_mean(self, graph):
+        result = self.predictor.predict(graph)
+        if isinstance(result, tuple):
+            # predictors with uncertainty return (mean, std_dev)
+            result, _ = result
+        if torch.is_tensor(result):
+            result = result.detach().numpy()
+        return np.asarray(result, dtype=np.float64).reshape(-1)
+
+    def predict_batch(self, models, input):
+        """Predict the metrics of multiple models with a single batched call of the predictor"""
+        if len(models) == 0:
+            return []
+
+        # All graphs share the feature columns of the featurizer, so they can be batched directly
+        graphs = [model_to_dgl_graph(model, input) for model in models]
+        batched_graph = dgl.batch(graphs)
+        result = self._predict_mean(batched_graph)
+        metrics = [{'val_error': float(r)} for r in result]
+
+        logger.info("Predicted performance metrics for %d models", len(metrics))
+
+        return metrics
+
     def update(self, new_data, input):
+        new_graphs = []
+        new_labels = []
         for item, result in new_data:
-            nx_graph = model_to_graph(item.model, input)
-            fea = get_features(nx_graph)
-
-            for i, n in enumerate(nx_graph.nodes):
-                nx_graph.nodes[n]['features'] = fea.iloc[i].to_numpy()
-            dgl_graph = to_dgl_graph(nx_graph)
-            self.graphs.append(dgl_graph)
-            self.labels.append(result)
-        self.train()
+            new_graphs.append(graph_to_dgl(model_to_graph(item.model, input)))
+            new_labels.append(result)
+        if not new_graphs:
+            return
+
+        self.graphs.extend(new_graphs)
+        self.labels.extend(new_labels)
+        self._updates_since_training += 1
+
+        if (
+            self._num_trained > 0
+            and self._updates_since_training < self.retrain_interval
+            and hasattr(self.predictor, "update")
+        ):
+            self.predictor.update(new_graphs, new_labels)
+        else:
+            self.train()
 
     def train(self):
-        dataset = OnlineNASGraphDataset(self.graphs, self.labels)
-        train_dataloader, test_dataloader = prepare_dataloader(dataset, batch_size=32, train_test_split=1)
-        self.predictor.train_and_fit(train_dataloader, num_epochs=20, verbose=25)
+        all_indices = np.arange(len(self.graphs))
+        if self._num_trained == 0:
+            train_indices = all_indices
+            num_epochs = self.num_epochs
+        else:
+            # new data since the last training and a replay sample of the old data
+            old_indices = all_indices[: self._num_trained]
+            replay = self.random_state.choice(
+                old_indices, size=min(self.replay_size, len(old_indices)), replace=False
+            )
+            train_indices = np.concatenate([replay, all_indices[self._num_trained :]])
+            num_epochs = self.incremental_epochs
+
+        dataset = OnlineNASGraphDataset(
+            [self.graphs[i] for i in train_indices], [self.labels[i] for i in train_indices]
+        )
+        train_dataloader, _ = prepare_dataloader(dataset, batch_size=self.batch_size, train_test_split=1)
+        # the predictor on top of the embeddings is fitted on all data
+        dataloader = GraphDataLoader(OnlineNASGraphDataset(self.graphs, self.labels), batch_size=self.batch_size)
+        self.predictor.warm_start(
+            train_dataloader, dataloader, num_epochs=num_epochs, verbose=25, time_budget=self.time_budget
+        )
+
+        self._num_trained = len(self.graphs)
+        self._updates_since_training = 0
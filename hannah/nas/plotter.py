@@ -26,8 +26,9 @@ import yaml
 from tabulate import tabulate
 
 from .search.sampler.base_sampler import SearchResult
+from .search.sampler.history import load_history
 from .plot import plot_history, plot_pareto_front
-from .utils import is_pareto
+from .utils import ParetoArchive
 
 logger = logging.getLogger()
 
@@ -36,23 +37,14 @@ def update_pareto_front(
     result: Union[SearchResult, List[SearchResult]]
 ) -> List[SearchResult]:
 
-    if isinstance(result, list):
-        pareto_points = result
-    else:
-        pareto_points = list(result)
+    if isinstance(result, SearchResult):
+        result = [result]
 
-    if len(pareto_points) == 1:
-        return pareto_points
+    archive = ParetoArchive(maximise=False)
+    for point in result:
+        archive.insert(point.result, point)
 
-    costs = np.stack([x.costs() for x in pareto_points])
-    is_efficient = is_pareto(costs, maximise=False)
-
-    new_points = []
-    for point, efficient in zip(pareto_points, is_efficient):
-        if efficient:
-            new_points.append(point)
-
-    return new_points
+    return archive.points
 
 
 def plot(history_file):
@@ -61,9 +53,9 @@ def plot(history_file):
     logger.info("Loading history file (%s)", str(history_file))
     history_file = Path(history_file)
 
-    history = []
-    with history_file.open("r") as history_data:
-        history = yaml.unsafe_load(history_data)
+    history = load_history(
+        history_file if history_file.is_dir() else history_file.parent
+    )
 
     pruned_history = []
     for result in history:
@@ -0,0 +1,237 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import logging
+
+import omegaconf
+import torch
+from hydra.utils import instantiate
+from lightning.fabric.utilities.seed import seed_everything
+from pytorch_lightning import Callback
+from pytorch_lightning.loggers import TensorBoardLogger
+
+from hannah.nas.expressions.bounds import evaluate_bounds
+from hannah.nas.functional_operators.cost_model import estimate_costs
+from hannah.nas.functional_operators.executor import WeightSharingExecutor
+from hannah.nas.functional_operators.operators import BatchNorm
+from hannah.nas.parameters.parametrize import set_parametrization
+from hannah.nas.search.utils import setup_callbacks
+
+msglogger = logging.getLogger(__name__)
+
+
+class SandwichRuleCallback(Callback):
+    """Trains a weight sharing supernet with the sandwich rule.
+
+    The gradients of the largest subnet, the smallest subnet and `num_random_subnets` random
+    subnets are accumulated for each optimizer step, so the trainer must use
+    `accumulate_grad_batches = num_random_subnets + 2`. Each of the subnets is trained
+    on its own batch. Validation during training uses the largest subnet.
+    """
+
+    def __init__(self, supernet: WeightSharingExecutor, max_subnet, min_subnet, num_random_subnets=2) -> None:
+        super().__init__()
+        self.supernet = supernet
+        self.max_subnet = max_subnet
+        self.min_subnet = min_subnet
+        self.num_random_subnets = num_random_subnets
+
+    @property
+    def steps_per_update(self):
+        return self.num_random_subnets + 2
+
+    def on_train_batch_start(self, trainer, pl_module, batch, batch_idx):
+        step = batch_idx % self.steps_per_update
+        if step == 0:
+            self.supernet.set_subnet(self.max_subnet)
+        elif step == 1:
+            self.supernet.set_subnet(self.min_subnet)
+        else:
+            self.supernet.sample_subnet()
+
+    def on_validation_start(self, trainer, pl_module):
+        self.supernet.set_subnet(self.max_subnet)
+
+    def on_train_end(self, trainer, pl_module):
+        self.supernet.set_subnet(self.max_subnet)
+
+
+class _BatchNormCalibrationCallback(Callback):
+    """Recalibrates the batch norm statistics of the active subnet on the validation batches
+
+    The active slices of the shared running statistics are reset, and refilled with the cumulative
+    average over the calibration batches (like `momentum=None` of the torch batch norm layers), so no
+    statistics of the supernet or of previously evaluated subnets remain.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._batch_norms = []
+        self._momentum = []
+        self._batches = 0
+
+    def on_validation_start(self, trainer, pl_module):
+        supernet = pl_module.model
+        self._batch_norms = [
+            node for node in supernet.node_dict.values() if isinstance(node, BatchNorm) and node.track_running_stats
+        ]
+        self._momentum = [node.momentum for node in self._batch_norms]
+        with torch.no_grad():
+            for node in self._batch_norms:
+                supernet.get_data(node.operands[1].id).zero_()
+                supernet.get_data(node.operands[2].id).fill_(1.0)
+        self._batches = 0
+        supernet.train()
+
+    def on_validation_batch_start(self, trainer, pl_module, batch, batch_idx, dataloader_idx=0):
+        self._batches += 1
+        for node in self._batch_norms:
+            node.momentum = 1.0 / self._batches
+
+    def on_validation_end(self, trainer, pl_module):
+        for node, momentum in zip(self._batch_norms, self._momentum):
+            node.momentum = momentum
+        pl_module.model.eval()
+
+
+class WeightSharingModelTrainer:
+    """Trains a single weight sharing supernet and evaluates subnets of it without retraining
+
+    Args:
+        num_random_subnets (int): number of random subnets per optimizer step in sandwich rule training
+        num_reference_samples (int): number of valid subnets sampled to select the largest and smallest subnet,
+                                     if the bounds of the parameters violate the constraints
+        bn_calibration_batches (int): number of training batches to recalibrate the batch norm statistics
+                                      of a subnet before its evaluation, 0 disables the recalibration
+        limit_val_batches (int|float): number or fraction of validation batches used for the evaluation of subnets
+    """
+
+    def __init__(
+        self,
+        num_random_subnets=2,
+        num_reference_samples=100,
+        bn_calibration_batches=20,
+        limit_val_batches=1.0,
+    ) -> None:
+        self.num_random_subnets = num_random_subnets
+        self.num_reference_samples = num_reference_samples
+        self.bn_calibration_batches = bn_calibration_batches
+        self.limit_val_batches = limit_val_batches
+        self.trainer = None
+
+    def build_model(self, search_space):
+        supernet = WeightSharingExecutor(search_space)
+        supernet.initialize()
+        return supernet
+
+    def reference_subnets(self, supernet):
+        """Select the largest and the smallest subnet
+
+        The largest and smallest subnet set every parameter to its upper and lower bound, strides to the
+        opposite bound, as larger strides give smaller subnets. If one of these violates the constraints of
+        the search space, the subnet with the most or fewest MACs of a sample of valid subnets is used instead.
+        """
+        parametrization = supernet.parametrization(flatten=True)
+        references = []
+        for largest in (True, False):
+            parameters = {}
+            for name, param in parametrization.items():
+                upper = largest != (param.name == "stride")
+                parameters[name] = evaluate_bounds(param)[1 if upper else 0]
+            try:
+                set_parametrization(parameters, parametrization)
+                supernet.output.check()
+            except Exception:
+                parameters = None
+            references.append(parameters)
+
+        if None in references:
+            msglogger.info("Bounds of the parameters violate the constraints, sampling reference subnets")
+            samples = []
+            for _ in range(self.num_reference_samples):
+                parameters = supernet.sample_subnet()
+                macs = estimate_costs(supernet.output).get("total_macs", 0)
+                samples.append((macs, parameters))
+            samples.sort(key=lambda x: x[0])
+            fallbacks = [samples[-1][1], samples[0][1]]
+            references = [ref if ref is not None else fallback for ref, fallback in zip(references, fallbacks)]
+
+        macs = []
+        for parameters in references:
+            supernet.set_subnet(parameters)
+            macs.append(estimate_costs(supernet.output).get("total_macs", 0))
+        msglogger.info("Reference subnets: largest %d MACs, smallest %d MACs", *macs)
+        return tuple(references)
+
+    def run_training(self, module, config):
+        """Train the supernet of the lightning module with the sandwich rule"""
+        supernet = module.model
+        self.setup_seed(config)
+        max_subnet, min_subnet = self.reference_subnets(supernet)
+        sandwich_rule = SandwichRuleCallback(
+            supernet, max_subnet, min_subnet, num_random_subnets=self.num_random_subnets
+        )
+
+        callbacks, _, opt_callback = setup_callbacks(config)
+        self.trainer = instantiate(
+            config.trainer,
+            callbacks=callbacks + [sandwich_rule],
+            logger=TensorBoardLogger("."),
+            accumulate_grad_batches=sandwich_rule.steps_per_update,
+        )
+        self.trainer.fit(module)
+        return opt_callback.result(dict=True)
+
+    def evaluate(self, module, parameters, config):
+        """Validate a subnet using the trained weights of the supernet
+
+        Returns:
+            Dict[str, float]: the validation metrics of the subnet
+        """
+        supernet = module.model
+        supernet.set_subnet(parameters)
+
+        if self.bn_calibration_batches > 0:
+            calibration_trainer = instantiate(
+                config.trainer,
+                callbacks=[_BatchNormCalibrationCallback()],
+                logger=False,
+                enable_checkpointing=False,
+                enable_progress_bar=False,
+                enable_model_summary=False,
+                limit_val_batches=self.bn_calibration_batches,
+            )
+            calibration_trainer.validate(module, dataloaders=module.train_dataloader(), verbose=False)
+
+        eval_trainer = instantiate(
+            config.trainer,
+            callbacks=[],
+            logger=False,
+            enable_checkpointing=False,
+            enable_progress_bar=False,
+            enable_model_summary=False,
+            limit_val_batches=self.limit_val_batches,
+        )
+        results = eval_trainer.validate(module, verbose=False)
+        return {k: float(v) for k, v in results[0].items()} if results else {}
+
+    def setup_seed(self, config):
+        seed = config.get("seed", 1234)
+        if isinstance(seed, list) or isinstance(seed, omegaconf.ListConfig):
+            seed = seed[0]
+        seed_everything(seed, workers=True)
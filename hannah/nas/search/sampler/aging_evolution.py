@@ -28,10 +28,8 @@ import yaml
 from hannah.nas.parameters.parameters import CategoricalParameter, FloatScalarParameter, IntScalarParameter
 from hannah.nas.parameters.parametrize import set_parametrization
 from hannah.nas.search.sampler.mutator import ParameterMutator
-from hannah.nas.search.utils import np_to_primitive
 
 from ...parametrization import SearchSpace
-from ...utils import is_pareto
 from .base_sampler import Sampler, SearchResult
 
 
@@ -65,8 +63,11 @@ class AgingEvolutionSampler(Sampler):
         sample_size: int = 10,
         eps: float = 0.1,
         output_folder=".",
+        history_backend="jsonl",
     ):
-        super().__init__(parent_config, output_folder=output_folder)
+        super().__init__(
+            parent_config, output_folder=output_folder, history_backend=history_backend
+        )
         self.bounds = self.parent_config.nas.bounds
         self.parametrization = parametrization
 
@@ -83,8 +84,7 @@ class AgingEvolutionSampler(Sampler):
 
         self.history = []
         self.population = []
-        self._pareto_points = []
-        if (self.output_folder / "history.yml").exists():
+        if self.has_history():
             self.load()
 
     def get_fitness_function(self):
@@ -125,44 +125,14 @@ class AgingEvolutionSampler(Sampler):
 
     def tell_result(self, parameters, metrics):
         "Tell the result of a task"
-        parameters = np_to_primitive(parameters)
-        result = SearchResult(len(self.history), parameters, metrics)
+        super().tell_result(parameters, metrics)
 
-        self.history.append(result)
-        self.population.append(result)
+        self.population.append(self.history[-1])
         if len(self.population) > self.population_size:
             self.population.pop(0)
 
-        self.save()
         return None
 
-    @property
-    def pareto_points(self):
-        self._update_pareto_front(self.history)
-
-        return self._pareto_points
-
-    def _update_pareto_front(
-        self, result: Union[SearchResult, List[SearchResult]]
-    ) -> None:
-        if isinstance(result, list):
-            self._pareto_points.extend(result)
-        else:
-            self._pareto_points.append(result)
-
-        if len(self._pareto_points) == 1:
-            return
-
-        costs = np.stack([x.costs() for x in self._pareto_points])
-        is_efficient = is_pareto(costs, maximise=False)
-
-        new_points = []
-        for point, efficient in zip(self._pareto_points, is_efficient):
-            if efficient:
-                new_points.append(point)
-
-        self._pareto_points = new_points
-
     def load(self):
         super().load()
         self.population = []
@@ -174,6 +144,6 @@ class AgingEvolutionSampler(Sampler):
 
 
 class AgingEvolutionRestrictedParameterSet(AgingEvolutionSampler):
-    def __init__(self, parent_config, parametrization: dict, tunable_knobs: list, population_size: int = 50, random_state=None, sample_size: int = 10, eps: float = 0.1, output_folder="."):
-        super().__init__(parent_config, parametrization, population_size, random_state, sample_size, eps, output_folder)
+    def __init__(self, parent_config, parametrization: dict, tunable_knobs: list, population_size: int = 50, random_state=None, sample_size: int = 10, eps: float = 0.1, output_folder=".", history_backend="jsonl"):
+        super().__init__(parent_config, parametrization, population_size, random_state, sample_size, eps, output_folder, history_backend)
         self.parametrization = {k: v for k, v in self.parametrization.items() if v.name in tunable_knobs}
@@ -2,13 +2,13 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass
 import logging
 from pathlib import Path
-import shutil
 from typing import Any, Dict
 
 import numpy as np
-import yaml
 
 from hannah.nas.search.utils import np_to_primitive
+from hannah.nas.utils import ParetoArchive
+from .history import get_history_store
 msglogger = logging.getLogger(__name__)
 
 @dataclass()
@@ -17,9 +17,11 @@ class SearchResult:
     parameters: Dict[str, Any]
     result: Dict[str, float]
 
-    def costs(self):
+    def costs(self, keys=None):
+        if keys is None:
+            keys = sorted(self.result.keys())
         return np.asarray(
-            [float(self.result[k]) for k in sorted(self.result.keys())],
+            [float(self.result[k]) for k in keys],
             dtype=np.float32,
         )
 
@@ -27,10 +29,13 @@ class SearchResult:
 class Sampler(ABC):
     def __init__(self,
                  parent_config,
-                 output_folder=".") -> None:
+                 output_folder=".",
+                 history_backend="jsonl") -> None:
         self.history = []
         self.output_folder = Path(output_folder)
         self.parent_config = parent_config
+        self.history_store = get_history_store(history_backend, self.output_folder)
+        self.pareto_archive = ParetoArchive(maximise=False)
 
     @abstractmethod
     def next_parameters(self):
@@ -45,22 +50,31 @@ class Sampler(ABC):
         parameters = np_to_primitive(parameters)
         result = SearchResult(len(self.history), parameters, metrics)
         self.history.append(result)
-        self.save()
+        self.pareto_archive.insert(result.result, result)
+        self.save(result)
         return None
 
-    def save(self):
-        history_file = self.output_folder / "history.yml"
-        history_file_tmp = history_file.with_suffix(".tmp")
+    @property
+    def pareto_points(self):
+        return self.pareto_archive.points
 
-        with history_file_tmp.open("w") as history_data:
-            yaml.dump(self.history, history_data)
-        shutil.move(history_file_tmp, history_file)
-        msglogger.info(f"Updated {history_file.name}")
+    def save(self, result: SearchResult):
+        "Append a single result to the history store"
+        self.history_store.append(result)
+        msglogger.info(f"Updated {self.history_store.path.name}")
+
+    def has_history(self):
+        legacy_history_file = self.output_folder / "history.yml"
+        return self.history_store.exists() or legacy_history_file.exists()
 
     def load(self):
-        history_file = self.output_folder / "history.yml"
-        self.history = []
-        with history_file.open("r") as history_data:
-            self.history = yaml.unsafe_load(history_data)
+        legacy_history_file = self.output_folder / "history.yml"
+        if not self.history_store.exists() and legacy_history_file.exists():
+            self.history_store.import_yaml(legacy_history_file)
+
+        self.history = self.history_store.load()
+        self.pareto_archive = ParetoArchive(maximise=False)
+        for result in self.history:
+            self.pareto_archive.insert(result.result, result)
 
-        msglogger.info("Loaded %d points from history", len(self.history))
\ No newline at end of file
+        msglogger.info("Loaded %d points from history", len(self.history))
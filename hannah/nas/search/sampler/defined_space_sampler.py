@@ -11,15 +11,16 @@ class DefinedSpaceSampler(Sampler):
                  parametrization,
                  data_folder,
                  output_folder=".",
+                 history_backend="jsonl",
                 ) -> None:
-        super().__init__(parent_config=parent_config, output_folder=output_folder)
+        super().__init__(parent_config=parent_config, output_folder=output_folder, history_backend=history_backend)
         self.parametrization = parametrization
         print(os.getcwd())
         self.data_folder = "." / Path(data_folder)
         print(self.data_folder)
         self.defined_space = list(pd.read_pickle(self.data_folder)['params'])
 
-        if (self.output_folder / "history.yml").exists():
+        if self.has_history():
             self.load()
 
     def next_parameters(self):
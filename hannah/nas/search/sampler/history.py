@@ -0,0 +1,322 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Persistent storage backends for the search history of NAS samplers.
+
+The history is stored as an append only log, so recording a new result
+costs O(1) independent of the number of already evaluated candidates.
+"""
+
+import bisect
+import json
+import logging
+import shutil
+import sqlite3
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import yaml
+
+msglogger = logging.getLogger(__name__)
+
+
+def _to_json(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    elif isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value)} is not JSON serializable")
+
+
+def _encode(result) -> Dict[str, Any]:
+    return {
+        "index": result.index,
+        "parameters": result.parameters,
+        "result": result.result,
+    }
+
+
+def _decode(data: Dict[str, Any]):
+    from .base_sampler import SearchResult
+
+    return SearchResult(data["index"], data["parameters"], data["result"])
+
+
+class HistoryStore(ABC):
+    """Base class for search history backends.
+
+    Besides the append only log, each store keeps an index on the result metrics,
+    which allows to query the best results for a metric without scanning the whole history.
+    """
+
+    file_name: str = "history"
+
+    def __init__(self, output_folder: Union[str, Path] = ".") -> None:
+        self.output_folder = Path(output_folder)
+        self.path = self.output_folder / self.file_name
+
+    @abstractmethod
+    def append(self, result) -> None:
+        """Append a single SearchResult to the store"""
+        ...
+
+    @abstractmethod
+    def load(self) -> List[Any]:
+        """Load all SearchResults from the store ordered by their index"""
+        ...
+
+    @abstractmethod
+    def best(self, metric: str, n: int = 1, maximize: bool = False) -> List[Any]:
+        """Return the n best results for the given metric"""
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def close(self) -> None:
+        pass
+
+    def import_yaml(self, history_file: Union[str, Path]) -> int:
+        """One time import of a legacy history.yml file.
+
+        After a successful import the yaml file is renamed to `history.yml.imported`,
+        so that the import is not repeated on the next restart.
+
+        Returns:
+            int: the number of imported results
+        """
+        history_file = Path(history_file)
+        with history_file.open("r") as history_data:
+            history = yaml.unsafe_load(history_data) or []
+
+        for result in history:
+            self.append(result)
+
+        shutil.move(history_file, history_file.with_suffix(".yml.imported"))
+        msglogger.info(
+            "Imported %d points from %s into %s",
+            len(history),
+            history_file.name,
+            self.path.name,
+        )
+        return len(history)
+
+
+class JsonlHistoryStore(HistoryStore):
+    """Stores one SearchResult per line in a json lines file.
+
+    The metric index is only kept in memory and rebuilt on load.
+    """
+
+    file_name = "history.jsonl"
+
+    def __init__(self, output_folder: Union[str, Path] = ".") -> None:
+        super().__init__(output_folder)
+        self._file = None
+        self._length = 0
+        self._index: Dict[str, List] = {}
+
+    def _update_index(self, result) -> None:
+        for key, value in result.result.items():
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            bisect.insort(self._index.setdefault(key, []), (value, result.index))
+
+    def append(self, result) -> None:
+        if self._file is None:
+            self.output_folder.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open("a")
+        self._file.write(json.dumps(_encode(result), default=_to_json) + "\n")
+        self._file.flush()
+        self._length += 1
+        self._update_index(result)
+
+    def load(self) -> List[Any]:
+        history = []
+        self._index = {}
+        if self.path.exists():
+            with self.path.open("rb") as history_data:
+                data = history_data.read()
+
+            *lines, tail = data.split(b"\n")
+            if tail.strip():
+                # Only the last line can be truncated by an interrupted write,
+                # remove it so that the next append starts on a new line
+                try:
+                    json.loads(tail)
+                    lines.append(tail)
+                    with self.path.open("ab") as history_data:
+                        history_data.write(b"\n")
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    msglogger.warning(
+                        "Removing truncated line %d in %s", len(lines), self.path.name
+                    )
+                    with self.path.open("r+b") as history_data:
+                        history_data.truncate(len(data) - len(tail))
+
+            for num, line in enumerate(lines):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    result = _decode(json.loads(line))
+                except (json.JSONDecodeError, UnicodeDecodeError):
+                    msglogger.warning(
+                        "Skipping invalid line %d in %s", num, self.path.name
+                    )
+                    continue
+                history.append(result)
+                self._update_index(result)
+        self._length = len(history)
+        return history
+
+    def best(self, metric: str, n: int = 1, maximize: bool = False) -> List[int]:
+        """Return the indices of the n best results for the given metric"""
+        entries = self._index.get(metric, [])
+        if maximize:
+            entries = entries[::-1]
+        return [index for _, index in entries[:n]]
+
+    def __len__(self) -> int:
+        return self._length
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SqliteHistoryStore(HistoryStore):
+    """Stores the history in a sqlite database with an index on the result metrics."""
+
+    file_name = "history.sqlite"
+
+    def __init__(self, output_folder: Union[str, Path] = ".") -> None:
+        super().__init__(output_folder)
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.output_folder.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(str(self.path))
+            self._connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS results (
+                    idx INTEGER PRIMARY KEY,
+                    data TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS metrics (
+                    idx INTEGER NOT NULL,
+                    name TEXT NOT NULL,
+                    value REAL
+                );
+                CREATE INDEX IF NOT EXISTS metrics_name_value ON metrics (name, value);
+                """
+            )
+        return self._connection
+
+    def append(self, result) -> None:
+        metrics = []
+        for key, value in result.result.items():
+            try:
+                metrics.append((result.index, key, float(value)))
+            except (TypeError, ValueError):
+                continue
+
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results (idx, data) VALUES (?, ?)",
+                (result.index, json.dumps(_encode(result), default=_to_json)),
+            )
+            self.connection.execute(
+                "DELETE FROM metrics WHERE idx = ?", (result.index,)
+            )
+            self.connection.executemany(
+                "INSERT INTO metrics (idx, name, value) VALUES (?, ?, ?)", metrics
+            )
+
+    def load(self) -> List[Any]:
+        if not self.path.exists():
+            return []
+        rows = self.connection.execute("SELECT data FROM results ORDER BY idx")
+        return [_decode(json.loads(data)) for (data,) in rows]
+
+    def best(self, metric: str, n: int = 1, maximize: bool = False) -> List[int]:
+        """Return the indices of the n best results for the given metric"""
+        order = "DESC" if maximize else "ASC"
+        rows = self.connection.execute(
+            f"SELECT idx FROM metrics WHERE name = ? ORDER BY value {order} LIMIT ?",
+            (metric, n),
+        )
+        return [idx for (idx,) in rows]
+
+    def __len__(self) -> int:
+        if not self.path.exists():
+            return 0
+        return self.connection.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+
+HISTORY_STORES = {
+    "jsonl": JsonlHistoryStore,
+    "sqlite": SqliteHistoryStore,
+}
+
+
+def get_history_store(
+    backend: str = "jsonl", output_folder: Union[str, Path] = "."
+) -> HistoryStore:
+    if backend not in HISTORY_STORES:
+        raise ValueError(
+            f"Unknown history backend {backend}, available backends: {list(HISTORY_STORES.keys())}"
+        )
+    return HISTORY_STORES[backend](output_folder)
+
+
+def load_history(folder: Union[str, Path]) -> List[Any]:
+    """Load a search history from a folder, independent of the backend used to create it.
+
+    Falls back to a legacy history.yml if no history store is found.
+    """
+    folder = Path(folder)
+    for store_cls in HISTORY_STORES.values():
+        store = store_cls(folder)
+        if store.exists():
+            history = store.load()
+            store.close()
+            return history
+
+    history_file = folder / "history.yml"
+    if history_file.exists():
+        with history_file.open("r") as history_data:
+            return yaml.unsafe_load(history_data) or []
+
+    raise FileNotFoundError(f"Could not find a search history in {folder}")
@@ -6,11 +6,12 @@ class RandomSampler(Sampler):
                  parent_config,
                  parametrization,
                  output_folder=".",
+                 history_backend="jsonl",
                 ) -> None:
-        super().__init__(parent_config=parent_config, output_folder=output_folder)
+        super().__init__(parent_config=parent_config, output_folder=output_folder, history_backend=history_backend)
         self.parametrization = parametrization
 
-        if (self.output_folder / "history.yml").exists():
+        if self.has_history():
             self.load()
 
     def next_parameters(self):
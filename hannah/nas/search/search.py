@@ -19,20 +19,23 @@
 
 import logging
 import os
+import time
 import traceback
 from abc import ABC, abstractmethod
 import numpy as np
 
 import torch
 from hydra.utils import get_class, instantiate
-from joblib import Parallel, delayed
 from omegaconf import OmegaConf
+import yaml
 
 from hannah.callbacks.optimization import HydraOptCallback
 from hannah.nas.functional_operators.op import Tensor
 from hannah.nas.graph_conversion import model_to_graph
 from hannah.nas.performance_prediction.simple import MACPredictor
-from hannah.nas.search.utils import WorklistItem, save_config_to_file
+from hannah.nas.parameters.parametrize import set_parametrization
+from hannah.nas.search.utils import WorklistItem, parameter_hash, save_config_to_file
+from hannah.nas.search.worker_pool import AsyncWorkerPool
 from hannah.utils.utils import common_callbacks
 from hannah.nas.graph_conversion import model_to_graph
 
@@ -116,15 +119,19 @@ class DirectNAS(NASBase):
         bounds=None,
         total_candidates=100,
         num_selected_candidates=10,
+        cost_model="fx",
         *args,
         **kwargs,
     ) -> None:
         super().__init__(*args, **kwargs)
+        self.cost_model = cost_model
         self.presample = presample
         self.presampler = presampler
         self.bounds = bounds
         self.total_candidates = total_candidates
         self.num_selected_candidates = num_selected_candidates
+        self.cost_cache = {}
+        self.cost_cache_hits = 0
 
     def before_search(self):
         self.initialize_dataset()
@@ -133,7 +140,7 @@ class DirectNAS(NASBase):
         self.sampler = instantiate(
             self.config.nas.sampler, parametrization=parametrization, parent_config=self.config, _recursive_=False
         )
-        self.mac_predictor = MACPredictor(predictor="fx")
+        self.mac_predictor = MACPredictor(predictor=self.cost_model)
         self.model_trainer = instantiate(self.config.nas.model_trainer)
         if "predictor" in self.config.nas and self.config.nas.predictor is not None:
             self.predictor = instantiate(self.config.nas.predictor, _recursive_=False)
@@ -156,88 +163,145 @@ class DirectNAS(NASBase):
                 remaining_candidates, remaining_candidates, presample=self.presample
             )
 
+    def next_candidate(self):
+        if len(self.candidates) == 0:
+            if self.predictor:
+                try:
+                    self.predictor.update(self.new_points, self.example_input_array)
+                except Exception as e:
+                    # FIXME: Find reason for NaN in embeddings
+                    msglogger.error("Updating predictor failed:")
+                    msglogger.error(f"{str(e)}")
+                self.new_points = []
+            self.candidates = self.sample_candidates(
+                self.total_candidates, self.num_selected_candidates, presample=self.presample
+            )
+
+        return self.candidates.pop(0)
+
     def search(self):
-        with Parallel(n_jobs=self.n_jobs) as executor:
-            self.new_points = []
-
-            # first batch of candidates
-            self.init_candidates()
-
-            while len(self.sampler.history) < self.budget:
-                self.worklist = []
-
-                if len(self.candidates) == 0:
-                    if self.predictor:
-                        try:
-                            self.predictor.update(self.new_points, self.example_input_array)
-                        except Exception as e:
-                            # FIXME: Find reason for NaN in embeddings
-                            msglogger.error("Updating predictor failed:")
-                            msglogger.error(f"{str(e)}")
-                        self.new_points = []
-                    self.candidates = self.sample_candidates(
-                        self.total_candidates, self.num_selected_candidates, presample=self.presample
-                    )
+        self.new_points = []
+
+        # first batch of candidates
+        self.init_candidates()
 
-                while len(self.worklist) < self.n_jobs and len(self.candidates) > 0:
+        pool = AsyncWorkerPool(n_jobs=self.n_jobs)
+        num_submitted = len(self.sampler.history)
+        try:
+            while num_submitted < self.budget or len(pool) > 0:
+                # Hand out new candidates to all free worker slots
+                while pool.has_free_slot and num_submitted < self.budget:
+                    slot = pool.acquire()
                     try:
                         (
                             model,
                             parameters,
                             estimated_metrics,
                             satisfied_bounds,
-                        ) = self.candidates.pop(0)
-
-                        current_num = len(self.worklist)
-                        task = delayed(self.model_trainer.run_training)(
-                                model,
-                                current_num,
-                                len(self.sampler.history) + current_num,
-                                self.config,
-                            )
-
-                        self.append_to_worklist(
-                            parameters, task, estimated_metrics, satisfied_bounds
-                        )
-                    except Exception as e:
-                        print(str(e))
-                        print(traceback.format_exc())
-
-                results = executor([item.task for item in self.worklist])
-                for result, item in zip(results, self.worklist):
-                    parameters = item.parameters
-                    if self.predictor:
-                        self.new_points.append(
-                            (self.build_model(parameters), result["val_error"])
+                        ) = self.next_candidate()
+                    except Exception:
+                        pool.cancel(slot)
+                        raise
+
+                    item = WorklistItem(parameters, estimated_metrics, None)
+                    try:
+                        pool.submit(
+                            slot,
+                            self.model_trainer.run_training,
+                            model,
+                            slot,
+                            num_submitted,
+                            self.config,
+                            item=item,
                         )
-                    metrics = {**item.results, **result}
-                    for k, v in metrics.items():
-                        metrics[k] = float(v)
+                    except Exception:
+                        # The candidate counts against the budget, so that repeated failures terminate
+                        pool.cancel(slot)
+                        msglogger.exception("Submitting candidate %d failed", num_submitted)
+                    num_submitted += 1
+
+                for item, result, exception in pool.wait():
+                    if exception is not None:
+                        msglogger.critical("Evaluation of candidate failed with exception")
+                        msglogger.critical(str(exception))
+                        continue
+                    self.process_result(item, result)
+        finally:
+            pool.shutdown()
+            self.log_worker_stats(pool.stats())
+
+    def process_result(self, item, result):
+        parameters = item.parameters
+        if self.predictor:
+            self.new_points.append(
+                (self.build_model(parameters), result["val_error"])
+            )
+        metrics = {**item.results, **result}
+        for k, v in metrics.items():
+            metrics[k] = float(v)
+
+        self.sampler.tell_result(parameters, metrics)
+
+    def log_worker_stats(self, stats):
+        msglogger.info(
+            "Worker slots were idle for %.1fs in total (%.1f%% of %.1fs wall time)",
+            stats["total_idle_time"],
+            100 * stats["idle_fraction"],
+            stats["wall_time"],
+        )
+        for slot, idle_time in stats["idle_time"].items():
+            msglogger.info("  slot %d: idle %.1fs, busy %.1fs", slot, idle_time, stats["busy_time"][slot])
 
-                    self.sampler.tell_result(parameters, metrics)
+        with open("worker_stats.yml", "w") as stats_file:
+            yaml.safe_dump(stats, stats_file)
 
     def after_search(self):
-        pass
+        self.sampler.history_store.close()
         # self.extract_best_model()
 
     def sample_candidates(self, num_total, num_candidates=None, sort_key="ff", presample=False):
+        start_time = time.perf_counter()
+        cache_hits = self.cost_cache_hits
         candidates = []
         skip_ct = 0
         while len(candidates) < num_total:
             parameters = self.sample()
-            model = self.build_model(parameters)
-            estimated_metrics, satisfied_bounds = self.estimate_metrics(copy.deepcopy(model))
-            if presample:
-                if not self.presampler.check(model, estimated_metrics):
+            if self.cost_model == "analytical":
+                # The analytical cost model works on the search space itself, so candidates
+                # violating the constraints are rejected before an executor is created
+                set_parametrization(parameters, self.search_space.parametrization(flatten=True))
+                estimated_metrics = self.estimate_cost_metrics(self.search_space, parameters)
+                if presample and not self.presampler.check(self.search_space, estimated_metrics):
+                    skip_ct += 1
+                    continue
+            try:
+                # Only the executor is needed for estimation, the lightning module
+                # is created for the selected candidates only
+                model = self.model_trainer.build_model(self.search_space, parameters)
+            except AssertionError as e:
+                msglogger.critical(f"Instantiation failed: {e}")
+                continue
+            if self.cost_model != "analytical":
+                estimated_metrics = self.estimate_cost_metrics(model, parameters)
+                if presample and not self.presampler.check(model, estimated_metrics):
                     skip_ct += 1
                     continue
-            ff = self.get_fitness_function()(estimated_metrics)
-            estimated_metrics['ff'] = ff
-            candidates.append((model, parameters, estimated_metrics, satisfied_bounds))
+            candidates.append((model, parameters, estimated_metrics))
 
         if presample:
             msglogger.info(f"Skipped {skip_ct} models for not meeting constraints.")
 
+        if self.predictor:
+            predictions = self.predictor.predict_batch(
+                [model for model, _, _ in candidates], self.example_input_array
+            )
+            for (_, _, estimated_metrics), prediction in zip(candidates, predictions):
+                estimated_metrics.update(prediction)
+
+        fitness_function = self.get_fitness_function()
+        for model, parameters, estimated_metrics in candidates:
+            estimated_metrics['ff'] = fitness_function(estimated_metrics)
+
         if self.predictor:
             candidates.sort(key=lambda x: x[2][sort_key])
             candidates = candidates[:num_candidates]
@@ -245,6 +309,26 @@ class DirectNAS(NASBase):
         # # FIXME: EXPERIMENTAL
         # candidates.sort(key=lambda x: x[2]['total_macs'], reverse=True)
         # candidates = candidates[:num_candidates]
+
+        candidates = [
+            (
+                self.initialize_lightning_module(model),
+                parameters,
+                estimated_metrics,
+                self.check_bounds(estimated_metrics),
+            )
+            for model, parameters, estimated_metrics in candidates
+        ]
+
+        duration = time.perf_counter() - start_time
+        num_estimated = num_total + skip_ct
+        msglogger.info(
+            "Estimated %d candidates in %.2fs (%.1f candidates/s, %d cached)",
+            num_estimated,
+            duration,
+            num_estimated / duration if duration > 0 else float("inf"),
+            self.cost_cache_hits - cache_hits,
+        )
         return candidates
 
     def build_model(self, parameters):
@@ -326,26 +410,21 @@ class DirectNAS(NASBase):
             parameters, keys = self.sampler.next_parameters()
         return parameters
 
-    def append_to_worklist(self, parameters, task, estimated_metrics={}, satisfied_bounds=[]):
-        worklist_item = WorklistItem(parameters, estimated_metrics, task)
+    def estimate_cost_metrics(self, model, parameters):
+        """Estimate the hardware cost metrics (macs, weights, ...) of a candidate.
 
-        # if self.presample:
-        #     if all(satisfied_bounds):
-        #         self.worklist.append(worklist_item)
-        # else:
-        #     self.worklist.append(worklist_item)
-        self.worklist.append(worklist_item)
-        # FIXME: Integrate better intro current code
-
-    def estimate_metrics(self, model):
-        estimated_metrics = self.mac_predictor.predict(
-            model, input=self.example_input_array
-        )
-        if self.predictor:
-            estimated_metrics.update(
-                self.predictor.predict(model, self.example_input_array)
+        The metrics only depend on the parameters of the candidate and are cached by their hash.
+        """
+        key = parameter_hash(parameters)
+        if key in self.cost_cache:
+            self.cost_cache_hits += 1
+        else:
+            self.cost_cache[key] = dict(
+                self.mac_predictor.predict(model, input=self.example_input_array)
             )
+        return dict(self.cost_cache[key])
 
+    def check_bounds(self, estimated_metrics):
         satisfied_bounds = []
         for k, v in estimated_metrics.items():
             if k in self.bounds:
@@ -353,6 +432,22 @@ class DirectNAS(NASBase):
                 msglogger.info(f"{k}: {float(v):.8f} ({float(distance):.2f})")
                 satisfied_bounds.append(distance <= 1.2)
 
+        return satisfied_bounds
+
+    def estimate_metrics(self, model, parameters=None):
+        if parameters is not None:
+            estimated_metrics = self.estimate_cost_metrics(model, parameters)
+        else:
+            estimated_metrics = self.mac_predictor.predict(
+                model, input=self.example_input_array
+            )
+        if self.predictor:
+            estimated_metrics.update(
+                self.predictor.predict(model, self.example_input_array)
+            )
+
+        satisfied_bounds = self.check_bounds(estimated_metrics)
+
         return estimated_metrics, satisfied_bounds
 
     def setup_model_logging(self):
@@ -383,19 +478,52 @@ class DirectNAS(NASBase):
             )
 
 
-class WeightSharingNAS(NASBase):
-    def __init__(self, *args, **kwargs) -> None:
-        super().__init__(*args, **kwargs)
+class WeightSharingNAS(DirectNAS):
+    """Trains a single weight sharing supernet of the search space once, and then evaluates the candidates
+    proposed by the sampler as subnets of the supernet instead of training each of them from scratch.
+    """
+
+    def __init__(self, cost_model="analytical", *args, **kwargs) -> None:
+        super().__init__(*args, cost_model=cost_model, **kwargs)
 
     def before_search(self):
-        self.model_trainer = instantiate(
-            self.config.nas.model_trainer, parent_config=self.config, _recursive_=False
+        self.initialize_dataset()
+        self.search_space = self.build_search_space()
+        parametrization = self.search_space.parametrization(flatten=True)
+        self.sampler = instantiate(
+            self.config.nas.sampler, parametrization=parametrization, parent_config=self.config, _recursive_=False
         )
-        model = self.model_trainer.build_model()
-        self.model_trainer.run_training(model)
+        self.mac_predictor = MACPredictor(predictor=self.cost_model)
+        self.model_trainer = instantiate(self.config.nas.model_trainer)
+
+        if self.constraint_model:
+            self.constraint_model = instantiate(self.config.nas.constraint_model)
+
+        self.setup_model_logging()
+
+        self.supernet = self.model_trainer.build_model(self.search_space)
+        self.module = self.initialize_lightning_module(self.supernet)
+        msglogger.info("Training supernet")
+        self.model_trainer.run_training(self.module, self.config)
 
     def search(self):
-        print("TODO: Implement search")
+        # Failed evaluations count against the budget, so that the search terminates
+        # even if every subnet fails
+        num_failed = 0
+        while len(self.sampler.history) + num_failed < self.budget:
+            parameters = self.sample()
+            try:
+                result = self.model_trainer.evaluate(self.module, parameters, self.config)
+            except Exception as e:
+                msglogger.critical("Evaluation of subnet failed with exception")
+                msglogger.critical(str(e))
+                num_failed += 1
+                continue
+            estimated_metrics = self.estimate_cost_metrics(self.supernet, parameters)
+            metrics = {**estimated_metrics, **result}
+            for k, v in metrics.items():
+                metrics[k] = float(v)
+            self.sampler.tell_result(parameters, metrics)
 
     def after_search(self):
-        pass
\ No newline at end of file
+        self.sampler.history_store.close()
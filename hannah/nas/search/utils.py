@@ -1,5 +1,7 @@
 from copy import deepcopy
 from dataclasses import dataclass
+import hashlib
+import json
 import logging
 import os
 from pathlib import Path
@@ -87,3 +89,15 @@ def np_to_primitive(d):
         else:
             msglogger.warning(f"No primitive registered for parameter {k} of type {type(v)}. Using original value")
     return new_d
+
+
+def parameter_hash(parameters):
+    "Returns a stable hash for a dict of parameter values"
+
+    def to_primitive(value):
+        if isinstance(value, np.generic):
+            return value.item()
+        return str(value)
+
+    data = json.dumps(parameters, sort_keys=True, default=to_primitive)
+    return hashlib.sha1(data.encode()).hexdigest()
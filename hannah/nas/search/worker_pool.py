@@ -0,0 +1,158 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from typing import Any, Dict, List, Tuple
+
+from joblib.externals.loky import get_reusable_executor
+
+msglogger = logging.getLogger(__name__)
+
+
+class _SerialExecutor:
+    """Runs tasks directly in the calling process, used for n_jobs == 1"""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class AsyncWorkerPool:
+    """Slot based asynchronous worker pool.
+
+    Each of the `n_jobs` slots runs at most one task at a time. The slot number
+    should be passed to the task, so that it can be used to select the device of the
+    worker (see `SimpleModelTrainer.setup_devices`). A slot is handed out again
+    as soon as its task finishes, instead of waiting for the slowest task of a batch.
+
+    The pool records for each slot how long it was idle, i.e. how long no task
+    was assigned to it while the pool was running.
+    """
+
+    def __init__(self, n_jobs: int = 1) -> None:
+        self.n_jobs = n_jobs
+        if n_jobs > 1:
+            self.executor = get_reusable_executor(max_workers=n_jobs, reuse=False)
+        else:
+            self.executor = _SerialExecutor()
+
+        self._free_slots = list(range(n_jobs))
+        self._running: Dict[Future, Tuple[int, Any]] = {}
+
+        self.start_time = time.monotonic()
+        self.end_time = None
+        self._released_at = {slot: self.start_time for slot in range(n_jobs)}
+        self.idle_time = {slot: 0.0 for slot in range(n_jobs)}
+        self.busy_time = {slot: 0.0 for slot in range(n_jobs)}
+        self._started_at = {}
+
+    def __len__(self) -> int:
+        return len(self._running)
+
+    @property
+    def has_free_slot(self) -> bool:
+        return len(self._free_slots) > 0
+
+    def acquire(self) -> int:
+        """Reserve the next free slot
+
+        Returns:
+            int: the slot number, which should be passed to the task started by `submit`
+        """
+        if not self._free_slots:
+            raise RuntimeError("No free worker slot available")
+
+        slot = self._free_slots.pop(0)
+        now = time.monotonic()
+        self.idle_time[slot] += now - self._released_at[slot]
+        self._started_at[slot] = now
+        return slot
+
+    def submit(self, slot: int, fn, *args, item=None) -> None:
+        """Run fn(*args) on a slot reserved with `acquire`
+
+        Args:
+            slot: the reserved slot
+            fn: the task
+            item: arbitrary data that is returned together with the result of the task
+        """
+        future = self.executor.submit(fn, *args)
+        self._running[future] = (slot, item)
+
+    def release(self, slot: int) -> None:
+        "Give back a slot that was acquired but not used for a task"
+        now = time.monotonic()
+        self.busy_time[slot] += now - self._started_at.pop(slot)
+        self._released_at[slot] = now
+        self._free_slots.append(slot)
+
+    def cancel(self, slot: int) -> None:
+        "Give back a slot that was acquired but not used for a task, the time since `acquire` counts as idle"
+        self._released_at[slot] = self._started_at.pop(slot)
+        self._free_slots.append(slot)
+
+    def wait(self) -> List[Tuple[Any, Any, Exception]]:
+        """Wait until at least one running task has finished
+
+        Returns:
+            List[Tuple[Any, Any, Exception]]: (item, result, exception) for each finished task
+        """
+        if not self._running:
+            return []
+
+        done, _ = wait(list(self._running.keys()), return_when=FIRST_COMPLETED)
+        finished = []
+        for future in done:
+            slot, item = self._running.pop(future)
+            self.release(slot)
+            exception = future.exception()
+            result = future.result() if exception is None else None
+            finished.append((item, result, exception))
+
+        return finished
+
+    def shutdown(self) -> None:
+        self.end_time = time.monotonic()
+        for slot in self._free_slots:
+            self.idle_time[slot] += self.end_time - self._released_at[slot]
+            self._released_at[slot] = self.end_time
+        self.executor.shutdown(wait=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns the idle and busy times of the worker slots in seconds"""
+        end_time = self.end_time if self.end_time is not None else time.monotonic()
+        wall_time = end_time - self.start_time
+        total_idle = sum(self.idle_time.values())
+        return {
+            "wall_time": wall_time,
+            "idle_time": dict(self.idle_time),
+            "busy_time": dict(self.busy_time),
+            "total_idle_time": total_idle,
+            "idle_fraction": total_idle / (wall_time * self.n_jobs)
+            if wall_time > 0
+            else 0.0,
+        }
@@ -0,0 +1,149 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import torch
+from sklearn.gaussian_process import GaussianProcessRegressor
+
+from hannah.models.embedded_vision_net.models import search_space
+from hannah.nas.functional_operators.op import Tensor
+from hannah.nas.performance_prediction.features.featurizer import NUM_FEATURES
+from hannah.nas.performance_prediction.gcn.predictor import GaussianProcessPredictor, XGBPredictor
+from hannah.nas.performance_prediction.gcn.predictor import GCNPredictor as EndToEndGCNPredictor
+from hannah.nas.performance_prediction.simple import GCNPredictor, MACPredictor, model_to_dgl_graph
+from hannah.nas.search.model_trainer.simple_model_trainer import SimpleModelTrainer
+from hannah.nas.search.utils import parameter_hash
+
+
+def sample_models(num):
+    input = Tensor(name="input", shape=(1, 3, 32, 32), axis=("N", "C", "H", "W"))
+    space = search_space(name="evn", input=input, num_classes=10)
+    trainer = SimpleModelTrainer()
+
+    models = []
+    while len(models) < num:
+        try:
+            space.sample()
+            space.check()
+        except Exception:
+            continue
+        parameters = {k: v.current_value for k, v in space.parametrization(flatten=True).items()}
+        models.append((trainer.build_model(space, parameters), parameters))
+    return models
+
+
+def test_parameter_hash():
+    assert parameter_hash({"a": 1, "b": 2}) == parameter_hash({"b": 2, "a": 1})
+    assert parameter_hash({"a": 1, "b": 2}) != parameter_hash({"a": 1, "b": 3})
+
+
+def test_executor_mac_prediction():
+    (model, _), = sample_models(1)
+    metrics = MACPredictor(predictor="fx").predict(model, input=torch.rand(1, 3, 32, 32))
+    assert metrics["total_macs"] > 0
+    assert metrics["total_weights"] > 0
+
+
+def test_gcn_predict_batch():
+    x = torch.rand(1, 3, 32, 32)
+    models = [model for model, _ in sample_models(3)]
+
+    graphs = [model_to_dgl_graph(model, x) for model in models]
+    assert all(g.ndata["features"].shape[1] == NUM_FEATURES for g in graphs)
+
+    predictor = GCNPredictor(GaussianProcessPredictor(input_feature_size=NUM_FEATURES))
+    predictor.graphs = graphs
+    predictor.labels = [0.1, 0.2, 0.3]
+    predictor.train()
+
+    single = [float(predictor.predictor.predict(g)[0][0]) for g in graphs]
+    batched = [m["val_error"] for m in predictor.predict_batch(models, x)]
+
+    assert torch.allclose(torch.tensor(single), torch.tensor(batched), atol=1e-4)
+
+
+def test_gaussian_process_rank_update():
+    rng = np.random.RandomState(0)
+    X = rng.rand(20, 10)
+    y = X.sum(axis=1) + 0.01 * rng.randn(20)
+
+    predictor = GaussianProcessPredictor(input_feature_size=NUM_FEATURES, embedding_size=10)
+    predictor.fit_predictor(X[:12], y[:12])
+    gp = predictor.predictor
+    mean, std = gp._y_train_mean, gp._y_train_std
+    predictor.update_predictor(X[12:], y[12:])
+
+    # reference: exact fit with the same kernel and label normalization
+    reference = GaussianProcessRegressor(kernel=gp.kernel_, optimizer=None, alpha=gp.alpha)
+    reference.fit(X, (y - mean) / std)
+    X_test = rng.rand(5, 10)
+    ref_mean, ref_std = reference.predict(X_test, return_std=True)
+    pred_mean, pred_std = gp.predict(X_test, return_std=True)
+
+    assert len(predictor.embeddings) == 20
+    assert np.allclose(pred_mean, ref_mean * std + mean, atol=1e-6)
+    assert np.allclose(pred_std, ref_std * std, atol=1e-6)
+
+
+def test_gcn_incremental_update():
+    x = torch.rand(1, 3, 32, 32)
+    models = [model for model, _ in sample_models(6)]
+
+    predictor = GCNPredictor(
+        GaussianProcessPredictor(input_feature_size=NUM_FEATURES),
+        num_epochs=2,
+        incremental_epochs=1,
+        retrain_interval=2,
+    )
+    predictor.update([(SimpleNamespace(model=m), 0.1 * i) for i, m in enumerate(models[:2])], x)
+    weights = predictor.predictor.model.fc.weight.clone()
+
+    # incremental update of the gaussian process without training the embedding network
+    predictor.update([(SimpleNamespace(model=models[2]), 0.3)], x)
+    assert torch.equal(weights, predictor.predictor.model.fc.weight)
+    assert len(predictor.predictor.predictor.X_train_) == 3
+
+    # warm started retraining after retrain_interval updates
+    predictor.update([(SimpleNamespace(model=m), 0.4) for m in models[3:]], x)
+    assert not torch.equal(weights, predictor.predictor.model.fc.weight)
+    assert len(predictor.predictor.predictor.X_train_) == 6
+
+
+@pytest.mark.parametrize(
+    "predictor_cls",
+    [
+        lambda: XGBPredictor(input_feature_size=NUM_FEATURES),
+        lambda: EndToEndGCNPredictor(input_feature_size=NUM_FEATURES),
+    ],
+)
+def test_gcn_update_without_incremental_predictor(predictor_cls):
+    x = torch.rand(1, 3, 32, 32)
+    models = [model for model, _ in sample_models(4)]
+
+    predictor = GCNPredictor(predictor_cls(), num_epochs=2, incremental_epochs=1)
+    predictor.update([(SimpleNamespace(model=m), 0.1 * i) for i, m in enumerate(models[:2])], x)
+    predictor.update([(SimpleNamespace(model=m), 0.1 * i) for i, m in enumerate(models[2:])], x)
+    assert predictor._num_trained == 4
+
+    metrics = predictor.predict_batch(models, x)
+    assert len(metrics) == 4
+    assert all(np.isfinite(m["val_error"]) for m in metrics)
+    assert predictor.predict(models[0], x)["val_error"] == pytest.approx(metrics[0]["val_error"], abs=1e-4)
@@ -0,0 +1,69 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pytest
+import torch
+
+from hannah.callbacks.summaries import FxMACSummaryCallback
+from hannah.models.embedded_vision_net.models import search_space
+from hannah.nas.functional_operators.cost_model import estimate_costs, execution_order
+from hannah.nas.functional_operators.executor import BasicExecutor
+from hannah.nas.functional_operators.op import Tensor
+from hannah.nas.performance_prediction.simple import MACPredictor
+
+
+def sample_space(space):
+    while True:
+        try:
+            space.sample()
+            space.check()
+            return space
+        except Exception:
+            continue
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_cost_model_matches_fx_summary(seed):
+    torch.manual_seed(seed)
+    input = Tensor(name="input", shape=(1, 3, 32, 32), axis=("N", "C", "H", "W"))
+    space = sample_space(search_space(name="evn", input=input, num_classes=10))
+
+    estimated = estimate_costs(space)
+
+    model = BasicExecutor(space)
+    model.initialize()
+    traced = FxMACSummaryCallback()._do_summary(model, torch.rand(1, 3, 32, 32), print_log=False)
+
+    for key in ["total_macs", "total_weights", "total_act", "est_act"]:
+        assert estimated[key] == traced[key]
+    assert 0 < estimated["peak_act"] <= estimated["total_act"]
+
+    predicted = MACPredictor(predictor="analytical").predict(model, input=torch.rand(1, 3, 32, 32))
+    assert predicted["total_macs"] == traced["total_macs"]
+
+
+def test_execution_order():
+    input = Tensor(name="input", shape=(1, 3, 32, 32), axis=("N", "C", "H", "W"))
+    space = sample_space(search_space(name="evn", input=input, num_classes=10))
+
+    order = execution_order(space)
+    position = {id(node): num for num, node in enumerate(order)}
+    for node in order:
+        for operand in node.operands:
+            if id(operand) in position:
+                assert position[id(operand)] < position[id(node)]
@@ -1,6 +1,6 @@
 from hannah.nas.functional_operators.executor import BasicExecutor
 from hannah.nas.functional_operators.lazy import lazy
-from hannah.nas.functional_operators.operators import Conv2d, Linear, Relu
+from hannah.nas.functional_operators.operators import Add, Conv2d, Linear, Relu
 from hannah.nas.functional_operators.op import Tensor
 from hannah.nas.parameters.parameters import CategoricalParameter, IntScalarParameter
 
@@ -85,5 +85,45 @@ def test_executor():
     print()
 
 
+def residual_network(input):
+    out = conv_relu(input,
+                    out_channels=IntScalarParameter(8, 16, name='out_channels'),
+                    kernel_size=CategoricalParameter([3, 5], name="kernel_size"),
+                    stride=CategoricalParameter([1], name='stride'))
+    res = conv2d(out, out_channels=out.shape()[1], kernel_size=3)
+    out = Add()(out, res)
+    out = linear(out, 10)
+    return out
+
+
+def test_execution_plan():
+    input = Tensor(name='input',
+                   shape=(1, 3, 16, 16),
+                   axis=('N', 'C', 'H', 'W'))
+
+    net = residual_network(input)
+    executor = BasicExecutor(net)
+    executor.initialize()
+
+    position = {node: num for num, node in enumerate(executor.nodes)}
+    for node in executor.nodes:
+        for operand in executor.forward_dict[node]:
+            if operand != 'input':
+                assert position[operand] < position[node]
+    assert executor.nodes[-1] == net.id
+
+    # every intermediate result is freed exactly once, after its last use
+    freed = [slot for _, _, _, free_slots in executor._plan for slot in free_slots]
+    assert len(freed) == len(set(freed)) == executor._num_slots - 1
+    assert executor._output_slot not in freed
+
+    x = torch.rand(2, 3, 16, 16)
+    out = executor(x)
+    assert out.shape == (2, 10)
+
+    graph_module = executor.to_graph_module()
+    assert torch.allclose(graph_module(x), out)
+
+
 if __name__ == '__main__':
     test_executor()
\ No newline at end of file
@@ -0,0 +1,95 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pytest
+import yaml
+
+from hannah.nas.search.sampler.base_sampler import SearchResult
+from hannah.nas.search.sampler.history import get_history_store, load_history
+from hannah.nas.search.sampler.random_sampler import RandomSampler
+
+
+@pytest.mark.parametrize("backend", ["jsonl", "sqlite"])
+def test_history_store(tmp_path, backend):
+    store = get_history_store(backend, tmp_path)
+    for i in range(10):
+        store.append(SearchResult(i, {"width": i * 4}, {"val_error": 1.0 / (i + 1), "total_macs": float(i)}))
+    assert len(store) == 10
+    assert store.best("val_error", 2) == [9, 8]
+    assert store.best("total_macs", 1, maximize=True) == [9]
+    store.close()
+
+    store = get_history_store(backend, tmp_path)
+    history = store.load()
+    assert len(history) == 10
+    assert history[3].parameters == {"width": 12}
+    assert history[3].result["total_macs"] == 3.0
+    assert store.best("val_error", 1) == [9]
+    store.close()
+
+
+def test_import_legacy_history(tmp_path):
+    history = [SearchResult(i, {"width": i}, {"val_error": 0.5}) for i in range(5)]
+    with (tmp_path / "history.yml").open("w") as history_file:
+        yaml.dump(history, history_file)
+
+    sampler = RandomSampler(None, {}, output_folder=tmp_path)
+    assert len(sampler.history) == 5
+    assert (tmp_path / "history.jsonl").exists()
+    assert not (tmp_path / "history.yml").exists()
+
+    sampler.tell_result({"width": 5}, {"val_error": 0.1})
+    sampler.history_store.close()
+
+    sampler = RandomSampler(None, {}, output_folder=tmp_path)
+    assert len(sampler.history) == 6
+    assert sampler.history[-1].index == 5
+    assert len(load_history(tmp_path)) == 6
+
+
+def test_jsonl_truncated_line(tmp_path):
+    store = get_history_store("jsonl", tmp_path)
+    for i in range(3):
+        store.append(SearchResult(i, {"width": i}, {"val_error": 0.5}))
+    store.close()
+
+    # interrupted write of the last result
+    with (tmp_path / "history.jsonl").open("a") as history_file:
+        history_file.write('{"index": 3, "parame')
+
+    store = get_history_store("jsonl", tmp_path)
+    assert len(store.load()) == 3
+    store.append(SearchResult(3, {"width": 3}, {"val_error": 0.25}))
+    store.close()
+
+    store = get_history_store("jsonl", tmp_path)
+    history = store.load()
+    assert [result.index for result in history] == [0, 1, 2, 3]
+    assert history[3].result["val_error"] == 0.25
+    store.close()
+
+
+def test_sqlite_replace_result(tmp_path):
+    store = get_history_store("sqlite", tmp_path)
+    store.append(SearchResult(0, {"width": 0}, {"val_error": 0.5}))
+    store.append(SearchResult(1, {"width": 1}, {"val_error": 0.4}))
+    store.append(SearchResult(0, {"width": 0}, {"val_error": 0.1}))
+
+    assert len(store) == 2
+    assert store.best("val_error", 3) == [0, 1]
+    store.close()
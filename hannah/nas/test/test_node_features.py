@@ -0,0 +1,83 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import json
+
+import numpy as np
+import torch
+from networkx.readwrite import json_graph
+
+from hannah.nas.graph_conversion import model_to_graph
+from hannah.nas.performance_prediction.features.dataset import get_features
+from hannah.nas.performance_prediction.features.featurizer import (
+    FEATURE_COLUMNS,
+    NUM_FEATURES,
+    graph_to_dgl,
+    load_performance_data,
+    node_features,
+)
+from hannah.nas.test.test_candidate_estimation import sample_models
+
+
+def sample_graphs(num):
+    x = torch.rand(1, 3, 32, 32)
+    graphs = []
+    for model, _ in sample_models(num):
+        model.train()
+        graphs.append(model_to_graph(model, x))
+    return graphs
+
+
+def test_node_features_match_legacy_features():
+    (graph,) = sample_graphs(1)
+    features = node_features(graph)
+    legacy = get_features(graph)
+
+    assert features.shape == (len(graph.nodes), NUM_FEATURES)
+    assert features.dtype == np.float32
+
+    # numeric and one hot columns existing in both representations have the same values
+    common = [c for c in legacy.columns if c in FEATURE_COLUMNS]
+    assert len(common) > 20
+    for column in common:
+        expected = legacy[column].to_numpy(dtype=np.float32)
+        actual = features[:, FEATURE_COLUMNS.index(column)]
+        assert np.array_equal(actual, expected), column
+
+    # each node has exactly one type
+    type_columns = [i for i, c in enumerate(FEATURE_COLUMNS) if c.startswith("type_")]
+    typed = [i for i, n in enumerate(graph.nodes) if graph.nodes[n].get("type")]
+    assert np.all(features[typed][:, type_columns].sum(axis=1) == 1)
+
+
+def test_load_performance_data(tmp_path):
+    graphs = sample_graphs(3)
+    for num, graph in enumerate(graphs):
+        with (tmp_path / f"model_{num}.json").open("w") as f:
+            json.dump(
+                {"graph": json_graph.node_link_data(graph), "metrics": {"val_error": num / 10}},
+                f,
+            )
+
+    data = load_performance_data(tmp_path, n_jobs=2)
+
+    assert [metrics["val_error"] for _, metrics in data] == [0.0, 0.1, 0.2]
+    for (dgl_graph, _), graph in zip(data, graphs):
+        expected = graph_to_dgl(graph)
+        assert dgl_graph.num_edges() == expected.num_edges()
+        assert torch.equal(dgl_graph.ndata["features"], expected.ndata["features"])
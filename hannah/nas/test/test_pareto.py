@@ -0,0 +1,58 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+
+from hannah.nas.utils import ParetoArchive, is_pareto
+
+
+@pytest.mark.parametrize("maximise", [False, True])
+def test_pareto_archive_matches_is_pareto(maximise):
+    rng = np.random.default_rng(1234)
+    costs = rng.uniform(size=(500, 3))
+
+    archive = ParetoArchive(maximise=maximise)
+    for num, c in enumerate(costs):
+        archive.insert(c, num)
+
+    expected = np.nonzero(is_pareto(costs, maximise=maximise))[0]
+    assert sorted(archive.points) == list(expected)
+    assert np.allclose(np.sort(archive.costs, axis=0), np.sort(costs[expected], axis=0))
+
+
+def test_pareto_archive_dicts():
+    archive = ParetoArchive()
+    assert archive.insert({"val_error": 0.2, "total_macs": 100}, "a")
+    assert archive.insert({"val_error": 0.1, "total_macs": 200}, "b")
+    assert not archive.insert({"val_error": 0.3, "total_macs": 300}, "c")
+    assert not archive.insert({"val_error": 0.2, "total_macs": 100}, "d")
+    assert archive.insert({"val_error": 0.05, "total_macs": 50}, "e")
+    assert archive.points == ["e"]
+    assert archive.keys == ["total_macs", "val_error"]
+
+
+def test_pareto_archive_metrics():
+    archive = ParetoArchive()
+    archive.extend([[1.0, 3.0], [2.0, 2.0], [3.0, 1.0]])
+
+    assert archive.hypervolume([4.0, 4.0]) == pytest.approx(6.0)
+    assert archive.epsilon_indicator([[1.0, 3.0], [2.0, 2.0]]) == pytest.approx(0.0)
+    assert archive.epsilon_indicator([[1.5, 1.5]]) == pytest.approx(0.5)
+    assert archive.dominates([2.0, 2.5])
+    assert not archive.dominates([0.5, 4.0])
@@ -0,0 +1,96 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import time
+
+import pytest
+
+from hannah.models.embedded_vision_net.models import search_space as embedded_vision_net
+from hannah.models.mobilenet.models import mobilenetv2
+from hannah.models.resnet.models import search_space as resnet
+from hannah.models.simple1d import space as simple1d
+import hannah.nas.functional_operators.op as op
+from hannah.nas.functional_operators.op import Tensor, get_nodes
+
+
+def image_input():
+    return Tensor(name="input", shape=(1, 3, 32, 32), axis=("N", "C", "H", "W"))
+
+
+def audio_input():
+    return Tensor(name="input", shape=(1, 40, 101), axis=("N", "C", "T"))
+
+
+SPACES = {
+    "embedded_vision_net": lambda: embedded_vision_net("evn", image_input(), num_classes=10),
+    "resnet": lambda: resnet("resnet", image_input(), num_classes=10),
+    "mobilenetv2": lambda: mobilenetv2("mobilenetv2", image_input(), num_classes=10),
+    "simple1d": lambda: simple1d("simple1d", audio_input(), num_classes=10),
+}
+
+
+@pytest.mark.parametrize("name", SPACES.keys())
+def test_space_construction(name):
+    space = SPACES[name]()
+    nodes = list(get_nodes(space))
+    ids = [node.id for node in nodes]
+
+    assert len(set(map(id, nodes))) == len(nodes)
+    assert len(ids) > 0
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("name", SPACES.keys())
+def test_space_construction_benchmark(name):
+    space, construction_time = timed(SPACES[name])
+    nodes, traversal_time = timed(lambda: list(get_nodes(space)))
+
+    print(f"{name}: {len(nodes)} nodes, construction {construction_time:.3f}s, traversal {traversal_time:.4f}s")
+
+
+def test_space_construction_scales_linearly(monkeypatch):
+    own_scope_counter = op._own_scope_counter
+    num_computed = 0
+
+    def counting_own_scope_counter(node):
+        nonlocal num_computed
+        num_computed += 1
+        return own_scope_counter(node)
+
+    monkeypatch.setattr(op, "_own_scope_counter", counting_own_scope_counter)
+
+    def build(depth):
+        nonlocal num_computed
+        num_computed = 0
+        space = simple1d("simple1d", audio_input(), num_classes=10, max_depth=depth)
+        return len(list(get_nodes(space))), num_computed
+
+    num_small, computed_small = build(25)
+    num_large, computed_large = build(100)
+    assert num_large > 3 * num_small
+
+    # The scope counters of each node are only recomputed a constant number of times,
+    # quadratic construction would recompute them for the whole graph for each new node
+    assert computed_small <= 3 * num_small
+    assert computed_large <= 3 * num_large
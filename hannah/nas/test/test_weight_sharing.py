@@ -0,0 +1,214 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import itertools
+from types import SimpleNamespace
+
+import pytorch_lightning as pl
+import torch
+
+from hannah.models.resnet.models import search_space
+from hannah.nas.expressions.arithmetic import Floordiv
+from hannah.nas.expressions.bounds import evaluate_bounds
+from hannah.nas.expressions.choice import Choice
+from hannah.nas.functional_operators.cost_model import estimate_costs
+from hannah.nas.functional_operators.executor import WeightSharingExecutor
+from hannah.nas.functional_operators.op import Tensor, get_nodes
+from hannah.nas.functional_operators.operators import BatchNorm
+from hannah.nas.parameters.parameters import CategoricalParameter, IntScalarParameter
+from hannah.nas.search.model_trainer.weight_sharing_model_trainer import (
+    SandwichRuleCallback,
+    WeightSharingModelTrainer,
+    _BatchNormCalibrationCallback,
+)
+from hannah.nas.search.search import WeightSharingNAS
+
+
+def build_supernet():
+    input = Tensor(name="input", shape=(1, 3, 32, 32), axis=("N", "C", "H", "W"))
+    space = search_space(name="resnet", input=input, num_classes=10)
+    supernet = WeightSharingExecutor(space)
+    supernet.initialize()
+    return supernet
+
+
+def test_evaluate_bounds():
+    channels = IntScalarParameter(8, 30, step_size=4, name="channels")
+    ratio = CategoricalParameter([2, 4], name="ratio")
+
+    assert evaluate_bounds(channels) == (8, 28)
+    assert evaluate_bounds(channels * ratio) == (16, 112)
+    assert evaluate_bounds(Floordiv(channels, ratio)) == (2, 14)
+    assert evaluate_bounds(Floordiv(channels, channels)) == (1, 1)
+    assert evaluate_bounds(Choice([channels, 64], choice=ratio)) == (8, 64)
+
+
+def test_weight_sharing_executor():
+    supernet = build_supernet()
+    tensors = [n for n in get_nodes(supernet.output) if isinstance(n, Tensor) and n.grad]
+    parameters = dict(supernet.named_parameters())
+
+    for _ in range(5):
+        supernet.sample_subnet()
+        for node in tensors:
+            data = parameters[node.id.replace(".", "_")]
+            assert all(s <= m for s, m in zip(node.current_shape(), data.shape))
+
+        x = torch.rand(2, 3, 32, 32)
+        out = supernet(x)
+        assert out.shape == (2, 10)
+        out.sum().backward()
+
+
+def test_weight_sharing_slices():
+    supernet = build_supernet()
+    supernet.sample_subnet()
+    for node in supernet.node_dict.values():
+        if isinstance(node, Tensor) and node.grad:
+            data = getattr(supernet, node.id.replace(".", "_"))
+            subnet_data = supernet.get_data(node.id)
+            # subnets use views of the supernet weights
+            assert subnet_data.data_ptr() >= data.data_ptr()
+            assert subnet_data.shape == node.current_shape()
+            for axis, size, max_size, s in zip(node.axis, node.current_shape(), data.shape, supernet._slices[node.id]):
+                if axis.startswith("k"):
+                    assert s.start == (max_size - size) // 2
+                else:
+                    assert s.start == 0
+
+
+class SupernetModule(pl.LightningModule):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def training_step(self, batch, batch_idx):
+        x, y = batch
+        return torch.nn.functional.cross_entropy(self.model(x), y)
+
+    def validation_step(self, batch, batch_idx):
+        x, y = batch
+        self.model(x)
+
+    def configure_optimizers(self):
+        return torch.optim.SGD(self.model.parameters(), lr=0.01)
+
+
+def test_sandwich_rule_training():
+    supernet = build_supernet()
+    max_subnet = supernet.sample_subnet()
+    min_subnet = supernet.sample_subnet()
+
+    active = []
+
+    class RecordSubnets(pl.Callback):
+        def on_train_batch_start(self, trainer, pl_module, batch, batch_idx):
+            active.append(supernet.current_parameters())
+
+    data = torch.utils.data.TensorDataset(torch.rand(16, 3, 32, 32), torch.randint(0, 10, (16,)))
+    sandwich_rule = SandwichRuleCallback(supernet, max_subnet, min_subnet, num_random_subnets=2)
+    trainer = pl.Trainer(
+        max_epochs=1,
+        accelerator="cpu",
+        callbacks=[sandwich_rule, RecordSubnets()],
+        accumulate_grad_batches=sandwich_rule.steps_per_update,
+        logger=False,
+        enable_checkpointing=False,
+        enable_progress_bar=False,
+    )
+    trainer.fit(SupernetModule(supernet), torch.utils.data.DataLoader(data, batch_size=2))
+
+    assert len(active) == 8
+    assert active[0] == max_subnet and active[4] == max_subnet
+    assert active[1] == min_subnet and active[5] == min_subnet
+    assert supernet.current_parameters() == max_subnet
+
+
+def test_reference_subnets():
+    supernet = build_supernet()
+    max_subnet, min_subnet = WeightSharingModelTrainer(num_reference_samples=10).reference_subnets(supernet)
+
+    # the largest subnet uses the upper bounds, and the lower bounds of the strides
+    for name, param in supernet.parametrization(flatten=True).items():
+        low, high = evaluate_bounds(param)
+        assert max_subnet[name] == (low if param.name == "stride" else high)
+
+    def macs(parameters):
+        supernet.set_subnet(parameters)
+        supernet.output.check()
+        return estimate_costs(supernet.output)["total_macs"]
+
+    # all strides at their upper bound violate the constraints, the smallest subnet is sampled
+    assert macs(min_subnet) < macs(max_subnet)
+    for _ in range(5):
+        assert macs(supernet.sample_subnet()) <= macs(max_subnet)
+
+
+def test_batch_norm_calibration():
+    supernet = build_supernet()
+    supernet.sample_subnet()
+    data = torch.utils.data.TensorDataset(torch.rand(8, 3, 32, 32), torch.randint(0, 10, (8,)))
+    batch_norms = [node for node in supernet.node_dict.values() if isinstance(node, BatchNorm)]
+
+    def calibrate(stale_value):
+        # statistics of the supernet or of other subnets
+        for buffer in supernet.buffers():
+            buffer.fill_(stale_value)
+        trainer = pl.Trainer(
+            accelerator="cpu",
+            callbacks=[_BatchNormCalibrationCallback()],
+            logger=False,
+            enable_checkpointing=False,
+            enable_progress_bar=False,
+            enable_model_summary=False,
+        )
+        trainer.validate(SupernetModule(supernet), torch.utils.data.DataLoader(data, batch_size=2), verbose=False)
+        return [supernet.get_data(node.operands[1].id).clone() for node in batch_norms]
+
+    # the active statistics only depend on the calibration batches
+    for calibrated, recalibrated in zip(calibrate(100.0), calibrate(-100.0)):
+        assert torch.allclose(calibrated, recalibrated)
+    assert all(node.momentum == 0.1 for node in batch_norms)
+
+
+def test_weight_sharing_nas_failed_evaluations():
+    def evaluate(module, parameters, config):
+        if parameters["width"] % 2:
+            raise RuntimeError("evaluation failed")
+        return {"val_error": 0.5}
+
+    history = []
+    nas = WeightSharingNAS.__new__(WeightSharingNAS)
+    nas.budget = 6
+    nas.module = None
+    nas.config = None
+    nas.supernet = None
+    widths = itertools.count()
+    nas.sample = lambda: {"width": next(widths)}
+    nas.sampler = SimpleNamespace(history=history, tell_result=lambda parameters, metrics: history.append(parameters))
+    nas.model_trainer = SimpleNamespace(evaluate=evaluate)
+    nas.estimate_cost_metrics = lambda model, parameters: {}
+
+    nas.search()
+    assert len(history) == 3
+
+    # terminates if every evaluation fails
+    history.clear()
+    nas.model_trainer = SimpleNamespace(evaluate=lambda *args: 1 / 0)
+    nas.search()
+    assert history == []
@@ -0,0 +1,99 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from hannah.nas.search.worker_pool import AsyncWorkerPool
+
+
+def _task(duration, slot):
+    time.sleep(duration)
+    return slot
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_worker_pool(n_jobs):
+    durations = [0.5, 0.1, 0.1, 0.1]
+    pool = AsyncWorkerPool(n_jobs=n_jobs)
+
+    results = []
+    while durations or len(pool) > 0:
+        while pool.has_free_slot and durations:
+            slot = pool.acquire()
+            pool.submit(slot, _task, durations.pop(0), slot, item=slot)
+        for item, result, exception in pool.wait():
+            assert exception is None
+            assert item == result
+            results.append(result)
+    pool.shutdown()
+
+    assert len(results) == 4
+    if n_jobs == 2:
+        # the short tasks must not wait for the long running one
+        assert results[:3] == [1, 1, 1]
+
+    stats = pool.stats()
+    assert set(stats["idle_time"].keys()) == set(range(n_jobs))
+    assert 0.0 <= stats["idle_fraction"] <= 1.0
+
+
+def test_worker_pool_exception():
+    pool = AsyncWorkerPool(n_jobs=1)
+    slot = pool.acquire()
+    pool.submit(slot, _task, "invalid", slot, item="failing")
+    ((item, result, exception),) = pool.wait()
+    pool.shutdown()
+
+    assert item == "failing"
+    assert result is None
+    assert isinstance(exception, TypeError)
+
+
+def test_worker_pool_cancel():
+    pool = AsyncWorkerPool(n_jobs=1)
+    slot = pool.acquire()
+    time.sleep(0.05)
+    pool.cancel(slot)
+    pool.shutdown()
+
+    stats = pool.stats()
+    assert pool.has_free_slot
+    assert stats["busy_time"][slot] == 0.0
+    assert stats["idle_time"][slot] == pytest.approx(stats["wall_time"])
+
+
+def test_direct_nas_sampling_failure(tmp_path, monkeypatch):
+    from hannah.nas.search.search import DirectNAS
+
+    monkeypatch.chdir(tmp_path)
+
+    def next_candidate():
+        raise RuntimeError("sampling failed")
+
+    nas = DirectNAS.__new__(DirectNAS)
+    nas.n_jobs = 1
+    nas.budget = 10
+    nas.sampler = SimpleNamespace(history=[])
+    nas.init_candidates = lambda: None
+    nas.next_candidate = next_candidate
+
+    with pytest.raises(RuntimeError, match="sampling failed"):
+        nas.search()
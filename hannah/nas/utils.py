@@ -41,6 +41,151 @@ def is_pareto(costs, maximise=False):
     return is_efficient
 
 
+def _hypervolume(costs, reference):
+    """Hypervolume dominated by a set of mutually non dominated points (minimisation)"""
+    costs = costs[np.all(costs < reference, axis=1)]
+    if costs.shape[0] == 0:
+        return 0.0
+    if costs.shape[1] == 1:
+        return float(reference[0] - costs[:, 0].min())
+
+    # Slice along the last objective and recurse into the remaining dimensions
+    order = np.argsort(costs[:, -1])
+    costs = costs[order]
+    volume = 0.0
+    for i in range(costs.shape[0]):
+        upper = costs[i + 1, -1] if i + 1 < costs.shape[0] else reference[-1]
+        depth = upper - costs[i, -1]
+        if depth <= 0.0:
+            continue
+        front = costs[: i + 1, :-1]
+        front = front[is_pareto(front, maximise=False)]
+        volume += depth * _hypervolume(front, reference[:-1])
+    return float(volume)
+
+
+class ParetoArchive:
+    """Incrementally maintained pareto front.
+
+    The costs of the non dominated points are kept in a preallocated numpy matrix,
+    so inserting a point only needs a single vectorized dominance check against
+    the current front instead of recomputing the front from the whole history.
+
+    Args:
+        keys (list, optional): names of the cost values used when inserting dicts, defaults to the sorted keys of the first inserted point
+        maximise (bool): True for maximising, False for minimising
+        eps (float): additive epsilon, points that are within eps of an archived point in every objective are considered dominated
+    """
+
+    def __init__(self, keys=None, maximise=False, eps=0.0, capacity=64):
+        self.keys = list(keys) if keys is not None else None
+        self.maximise = maximise
+        self.eps = eps
+        self._capacity = capacity
+        self._costs = None
+        self._points = []
+
+    def __len__(self):
+        return len(self._points)
+
+    @property
+    def points(self):
+        return list(self._points)
+
+    @property
+    def costs(self):
+        "Returns a (n_points, n_costs) array of the costs of the pareto points"
+        if self._costs is None:
+            return np.empty((0, len(self.keys) if self.keys else 0))
+        costs = self._costs[: len(self._points)]
+        return -costs if self.maximise else costs.copy()
+
+    def _to_array(self, costs):
+        if isinstance(costs, dict):
+            if self.keys is None:
+                self.keys = sorted(costs.keys())
+            missing = -np.inf if self.maximise else np.inf
+            costs = [costs.get(k, missing) for k in self.keys]
+        costs = np.asarray(costs, dtype=np.float64).reshape(-1)
+        return -costs if self.maximise else costs
+
+    def insert(self, costs, point=None):
+        """Insert a single point into the archive
+
+        Args:
+            costs (dict or array_like): the cost values of the point
+            point (Any, optional): the object that is stored in the archive, defaults to costs
+
+        Returns:
+            bool: True if the point is part of the pareto front after insertion
+        """
+        if point is None:
+            point = costs
+        costs = self._to_array(costs)
+
+        if self._costs is None:
+            self._costs = np.empty((self._capacity, costs.shape[0]))
+
+        size = len(self._points)
+        front = self._costs[:size]
+
+        # Reject points that are weakly dominated by the archive (this includes duplicates)
+        if size > 0 and np.any(np.all(front - self.eps <= costs, axis=1)):
+            return False
+
+        keep = np.logical_not(np.all(costs <= front, axis=1))
+        if not np.all(keep):
+            kept = int(keep.sum())
+            self._costs[:kept] = front[keep]
+            self._points = [p for p, k in zip(self._points, keep) if k]
+            size = kept
+
+        if size == self._costs.shape[0]:
+            self._costs = np.concatenate([self._costs, np.empty_like(self._costs)])
+
+        self._costs[size] = costs
+        self._points.append(point)
+
+        return True
+
+    def extend(self, costs, points=None):
+        if points is None:
+            points = costs
+        for c, p in zip(costs, points):
+            self.insert(c, p)
+
+    def dominates(self, costs):
+        "Returns True if the given costs are weakly dominated by the current front"
+        if not self._points:
+            return False
+        costs = self._to_array(costs)
+        front = self._costs[: len(self._points)]
+        return bool(np.any(np.all(front <= costs, axis=1)))
+
+    def hypervolume(self, reference):
+        """Hypervolume of the pareto front with respect to a reference point
+
+        For maximisation the reference point must be smaller than all points in the archive.
+        """
+        if not self._points:
+            return 0.0
+        reference = self._to_array(reference)
+        return _hypervolume(self._costs[: len(self._points)], reference)
+
+    def epsilon_indicator(self, reference_front):
+        """Additive epsilon indicator of this front with respect to a reference front
+
+        Returns the smallest eps such that every point of the reference front is
+        weakly dominated by a point of this front shifted by eps.
+        """
+        if not self._points:
+            return float("inf")
+        reference_front = np.stack([self._to_array(c) for c in reference_front])
+        front = self._costs[: len(self._points)]
+        differences = np.max(front[None, :, :] - reference_front[:, None, :], axis=2)
+        return float(np.max(np.min(differences, axis=1)))
+
+
 def to_int(x):
     if isinstance(x, tuple):
         res = []
@@ -35,7 +35,7 @@ from torch.nn import init
 from torch.nn.modules.utils import _pair, _single
 from torch.nn.parameter import Parameter
 
-from hannah.quantization.qconfig import QConfig
+from hannah.quantization.qconfig import QConfig, STEQuantize
 
 from . import quantized as q
 
@@ -83,9 +83,61 @@ class _ConvForwardMixin:
             )
 
 
+def _is_deterministic(fake_quant: nn.Module) -> bool:
+    """Check that a fake quantizer returns the same values on each call"""
+    if isinstance(fake_quant, STEQuantize):
+        return not fake_quant.training or fake_quant.noise_prob >= 1.0
+    observer_enabled = getattr(fake_quant, "observer_enabled", None)
+    if observer_enabled is not None:
+        # observers update the quantization parameters on each call
+        return not bool(observer_enabled[0])
+    return not fake_quant.training
+
+
+class _QuantizedParameterCacheMixin:
+    """Caches the quantized weight and bias of QAT modules during inference
+
+    In eval mode with gradients disabled, the folded and fake quantized weight and bias are
+    only computed once. The cache is keyed by the version counters and storages of all
+    parameters and buffers they depend on, so it is invalidated by optimizer steps,
+    `load_state_dict`, moving the module to another device or replacing the parameters.
+    """
+
+    def _compute_quantized_parameters(self) -> Tuple[Tensor, Optional[Tensor]]:
+        raise NotImplementedError()
+
+    def _quantized_parameters(self) -> Tuple[Tensor, Optional[Tensor]]:
+        if self.training or torch.is_grad_enabled():
+            return self._compute_quantized_parameters()
+        if not all(
+            _is_deterministic(fake_quant)
+            for fake_quant in (self.weight_fake_quant, self.bias_fake_quant)
+        ):
+            return self._compute_quantized_parameters()
+
+        key = tuple(
+            (id(tensor), tensor.data_ptr(), tensor._version)
+            for name, tensor in self._named_tensors()
+            if not name.startswith("activation_post_process.")
+        )
+        cache = getattr(self, "_quantized_parameter_cache", None)
+        if cache is None or cache[0] != key:
+            cache = (key, self._compute_quantized_parameters())
+            self._quantized_parameter_cache = cache
+
+        return cache[1]
+
+    def _named_tensors(self):
+        yield from self.named_parameters()
+        yield from self.named_buffers()
+
+    def clear_quantized_parameter_cache(self) -> None:
+        self._quantized_parameter_cache = None
+
+
 # pytype: enable=attribute-error
 class _ConvBnNd(
-    nn.modules.conv._ConvNd, _ConvForwardMixin
+    nn.modules.conv._ConvNd, _ConvForwardMixin, _QuantizedParameterCacheMixin
 ):  # pytype: disable=module-attr
 
     _version = 2
@@ -204,12 +256,28 @@ class _ConvBnNd(
 
         return scaled_weight
 
+    def _compute_quantized_parameters(self) -> Tuple[Tensor, Optional[Tensor]]:
+        scale_factor = self.scale_factor
+        scaled_weight = self.scaled_weight
+        if self.bias is not None:
+            bias = self.bias
+        else:
+            bias = torch.zeros(self.out_channels, device=scaled_weight.device)
+        bias = self.bias_fake_quant(
+            (bias - self.bn.running_mean) * scale_factor + self.bn.bias
+        )
+
+        return scaled_weight, bias
+
     def _forward(self, input: Tensor) -> Tensor:
         bias_shape = [1] * len(self.weight.shape)
         bias_shape[1] = -1
 
-        scale_factor = self.scale_factor
-        scaled_weight = self.scaled_weight
+        if self.training:
+            scale_factor = self.scale_factor
+            scaled_weight = self.scaled_weight
+        else:
+            scaled_weight, bias = self._quantized_parameters()
         # using zero bias here since the bias for original conv
         # will be added later
         if self.bias is not None:
@@ -224,13 +292,7 @@ class _ConvBnNd(
             conv = self.bn(conv_orig)
             # conv = conv - (self.bn.bias - self.bn.running_mean).reshape(bias_shape)
         else:
-            bias = zero_bias
-            if self.bias is not None:
-                bias = self.bias
-            bias = self.bias_fake_quant(
-                (bias - self.bn.running_mean) * scale_factor + self.bn.bias
-            ).reshape(bias_shape)
-            conv = conv + bias
+            conv = conv + bias.reshape(bias_shape)
 
         return conv
 
@@ -645,7 +707,7 @@ class ConvBnReLU2d(ConvBn2d):
         return super(ConvBnReLU2d, cls).from_float(mod)
 
 
-class ConvReLU2d(nn.Conv2d, _ConvForwardMixin):
+class ConvReLU2d(nn.Conv2d, _ConvForwardMixin, _QuantizedParameterCacheMixin):
     r"""A ConvReLU2d module is a fused module of Conv2d and ReLU, attached with
     FakeQuantize modules for weight for
     quantization aware training.
@@ -697,16 +759,16 @@ class ConvReLU2d(nn.Conv2d, _ConvForwardMixin):
         else:
             self.bias_fake_quant = self.qconfig.activation()
 
+    def _compute_quantized_parameters(self) -> Tuple[Tensor, Optional[Tensor]]:
+        return (
+            self.weight_fake_quant(self.weight),
+            self.bias_fake_quant(self.bias) if self.bias is not None else None,
+        )
+
     def forward(self, input: Tensor) -> Tensor:
+        weight, bias = self._quantized_parameters()
         return self.activation_post_process(
-            F.relu(
-                self._real_conv_forward(
-                    input,
-                    self.weight_fake_quant(self.weight),
-                    self.bias_fake_quant(self.bias),
-                    self.groups,
-                )
-            )
+            F.relu(self._real_conv_forward(input, weight, bias, self.groups))
         )
 
     @classmethod
@@ -714,7 +776,7 @@ class ConvReLU2d(nn.Conv2d, _ConvForwardMixin):
         return super(ConvReLU2d, cls).from_float(mod)
 
 
-class ConvReLU1d(nn.Conv1d, _ConvForwardMixin):
+class ConvReLU1d(nn.Conv1d, _ConvForwardMixin, _QuantizedParameterCacheMixin):
     r"""A ConvReLU1d module is fused module of Conv1d and ReLU, attached with
     FakeQuantize modules for quantization aware training"""
 
@@ -757,18 +819,20 @@ class ConvReLU1d(nn.Conv1d, _ConvForwardMixin):
         else:
             self.bias_fake_quant = self.qconfig.activation()
 
-    def forward(self, input: Tensor) -> Tensor:
-        output = self._real_conv_forward(
-            input,
+    def _compute_quantized_parameters(self) -> Tuple[Tensor, Optional[Tensor]]:
+        return (
             self.weight_fake_quant(self.weight),
             self.bias_fake_quant(self.bias) if self.bias is not None else None,
-            self.groups,
         )
+
+    def forward(self, input: Tensor) -> Tensor:
+        weight, bias = self._quantized_parameters()
+        output = self._real_conv_forward(input, weight, bias, self.groups)
         output = F.relu(output)
         return self.activation_post_process(output)
 
 
-class Conv1d(nn.Conv1d, _ConvForwardMixin):
+class Conv1d(nn.Conv1d, _ConvForwardMixin, _QuantizedParameterCacheMixin):
     r"""A Conv1d module is a Conv1d module , attached with
     FakeQuantize modules for weight for
     quantization aware training.
@@ -816,16 +880,18 @@ class Conv1d(nn.Conv1d, _ConvForwardMixin):
             self.bias_fake_quant = self.qconfig.activation()
         self.dim = 1
 
+    def _compute_quantized_parameters(self) -> Tuple[Tensor, Optional[Tensor]]:
+        return (
+            self.weight_fake_quant(self.weight),
+            self.bias_fake_quant(self.bias) if self.bias is not None else None,
+        )
+
     def forward(self, input: Tensor) -> Tensor:
         # print(f"Conv1D {self.stride}")
         # print(input.shape)
+        weight, bias = self._quantized_parameters()
         y = self.activation_post_process(
-            self._real_conv_forward(
-                input,
-                self.weight_fake_quant(self.weight),
-                self.bias_fake_quant(self.bias) if self.bias is not None else None,
-                self.groups,
-            )
+            self._real_conv_forward(input, weight, bias, self.groups)
         )
         return y
 
@@ -834,7 +900,7 @@ class Conv1d(nn.Conv1d, _ConvForwardMixin):
         return super(ConvReLU2d, cls).from_float(mod)
 
 
-class Conv2d(nn.Conv2d, _ConvForwardMixin):
+class Conv2d(nn.Conv2d, _ConvForwardMixin, _QuantizedParameterCacheMixin):
     r"""A Conv2d module is a Conv2d module , attached with
     FakeQuantize modules for weight for
     quantization aware training.
@@ -883,14 +949,16 @@ class Conv2d(nn.Conv2d, _ConvForwardMixin):
             self.bias_fake_quant = self.qconfig.activation()
         self.dim = 2
 
+    def _compute_quantized_parameters(self) -> Tuple[Tensor, Optional[Tensor]]:
+        return (
+            self.weight_fake_quant(self.weight),
+            self.bias_fake_quant(self.bias) if self.bias is not None else None,
+        )
+
     def forward(self, input: Tensor) -> Tensor:
+        weight, bias = self._quantized_parameters()
         y = self.activation_post_process(
-            self._real_conv_forward(
-                input,
-                self.weight_fake_quant(self.weight),
-                self.bias_fake_quant(self.bias) if self.bias is not None else None,
-                self.groups,
-            )
+            self._real_conv_forward(input, weight, bias, self.groups)
         )
 
         return y
@@ -900,7 +968,7 @@ class Conv2d(nn.Conv2d, _ConvForwardMixin):
         return super(Conv2d, cls).from_float(mod)
 
 
-class Linear(nn.Linear):
+class Linear(nn.Linear, _QuantizedParameterCacheMixin):
     r"""
     A linear module attached with FakeQuantize modules for weight,
     used for quantization aware training.
@@ -938,15 +1006,16 @@ class Linear(nn.Linear):
     def scaled_weight(self):
         return self.weight_fake_quant(self.weight)
 
-    def forward(self, input):
-        return self.activation_post_process(
-            F.linear(
-                input,
-                self.weight_fake_quant(self.weight),
-                self.bias_fake_quant(self.bias) if self.bias is not None else self.bias,
-            )
+    def _compute_quantized_parameters(self) -> Tuple[Tensor, Optional[Tensor]]:
+        return (
+            self.weight_fake_quant(self.weight),
+            self.bias_fake_quant(self.bias) if self.bias is not None else None,
         )
 
+    def forward(self, input):
+        weight, bias = self._quantized_parameters()
+        return self.activation_post_process(F.linear(input, weight, bias))
+
     @classmethod
     def from_float(cls, mod):
         r"""Create a qat module from a float module or qparams_dict
@@ -977,7 +1046,7 @@ class Linear(nn.Linear):
         return qat_linear
 
 
-class LinearReLU(nn.Linear):
+class LinearReLU(nn.Linear, _QuantizedParameterCacheMixin):
     r"""
     A linear module attached with FakeQuantize modules and ReLU for weight,
     used for quantization aware training.
@@ -1014,19 +1083,16 @@ class LinearReLU(nn.Linear):
     def scaled_weight(self):
         return self.weight_fake_quant(self.weight)
 
-    def forward(self, input):
-        return self.activation_post_process(
-            F.relu(
-                F.linear(
-                    input,
-                    self.weight_fake_quant(self.weight),
-                    self.bias_fake_quant(self.bias)
-                    if self.bias is not None
-                    else self.bias,
-                )
-            )
+    def _compute_quantized_parameters(self) -> Tuple[Tensor, Optional[Tensor]]:
+        return (
+            self.weight_fake_quant(self.weight),
+            self.bias_fake_quant(self.bias) if self.bias is not None else None,
         )
 
+    def forward(self, input):
+        weight, bias = self._quantized_parameters()
+        return self.activation_post_process(F.relu(F.linear(input, weight, bias)))
+
     @classmethod
     def from_float(cls, mod):
         r"""Create a qat module from a float module or qparams_dict
@@ -1112,6 +1178,11 @@ def freeze_bn_stats(mod):
         mod.freeze_bn_stats()
 
 
+def clear_quantized_parameter_cache(mod):
+    if isinstance(mod, _QuantizedParameterCacheMixin):
+        mod.clear_quantized_parameter_cache()
+
+
 # Default map for swapping float module to qat modules
 QAT_MODULE_MAPPINGS: Dict[Callable, Any] = {
     Conv1d: q.Conv1d,
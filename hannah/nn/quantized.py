@@ -17,15 +17,24 @@
 # limitations under the License.
 #
 import copy
-from typing import Any, Tuple
+import logging
+import math
+from typing import Any, Dict, Optional, Tuple
 
+import torch
 import torch.nn as nn
 import torch.nn.functional as f
 from torch import Tensor
 from torch.nn.parameter import Parameter
 from torch.nn.utils import fuse_conv_bn_weights
 
-from hannah.quantization.qconfig import STEQuantize
+from hannah.quantization.qconfig import (
+    PowerOf2Quantization,
+    STEQuantize,
+    SymmetricQuantization,
+)
+
+msglogger = logging.getLogger(__name__)
 
 
 def _quantize(tensor: Parameter, qconfig: STEQuantize) -> Tensor:
@@ -34,7 +43,168 @@ def _quantize(tensor: Parameter, qconfig: STEQuantize) -> Tensor:
     return fake_quantized
 
 
-class QuantizedConvModule(nn.Module):
+def _quantization_function(fake_quant: Any) -> Any:
+    return getattr(fake_quant, "quantization_function", None)
+
+
+def _fractional_bits(quantization: Any) -> Optional[int]:
+    """Number of fractional bits of the integer representation of a quantization function
+
+    Returns None if the quantization does not map to fixed point numbers.
+    """
+    if isinstance(quantization, SymmetricQuantization):
+        fractional_bits = -math.log2(quantization.scale)
+        if fractional_bits.is_integer():
+            return int(fractional_bits)
+    elif isinstance(quantization, PowerOf2Quantization):
+        # smallest representable magnitude is 2**-(2**(bits-1) - 1)
+        return 2 ** (quantization.bits - 1) - 1
+    return None
+
+
+def pack_integers(values: Tensor, bits: int) -> Tensor:
+    """Store integer values with the given bit width in the smallest integer tensor
+
+    Values with up to 4 bits are packed two per byte into an uint8 tensor.
+    """
+    values = values.flatten().to(torch.int32)
+    if bits <= 4:
+        if values.numel() % 2:
+            values = f.pad(values, (0, 1))
+        nibbles = (values & 0xF).to(torch.uint8)
+        return nibbles[0::2] | (nibbles[1::2] << 4)
+    elif bits <= 8:
+        return values.to(torch.int8)
+    elif bits <= 16:
+        return values.to(torch.int16)
+    return values
+
+
+def unpack_integers(packed: Tensor, bits: int, shape: Tuple[int, ...]) -> Tensor:
+    """Inverse of `pack_integers`, returns an int32 tensor of the given shape"""
+    if bits <= 4:
+        nibbles = torch.stack((packed & 0xF, packed >> 4), dim=-1).flatten().to(torch.int32)
+        # sign extension of the 4 bit values
+        values = (nibbles ^ 8) - 8
+        return values[: math.prod(shape)].view(shape)
+    return packed.to(torch.int32).view(shape)
+
+
+class IntegerInferenceMixin:
+    """Integer execution of quantized modules with fixed point weights and activations
+
+    After `to_integer` the weights are stored as packed integers, and the float parameters are removed.
+    The inputs are declared as fixed point numbers with `input_fractional_bits` fractional bits and
+    `input_bits` bits, they are processed with integer arithmetic: integer weights and inputs are
+    accumulated exactly, the accumulator is requantized to the output format with the rounding mode
+    of the activation quantization. As pytorch has no fast integer convolutions on CPU, the exact
+    integer accumulation is executed with float32 if the accumulator can not exceed 2**24 and with
+    float64 otherwise.
+
+    Inputs are not checked against the declared format, other inputs give wrong results.
+    """
+
+    def _op(self, input: Tensor, weight: Tensor, bias: Optional[Tensor]) -> Tensor:
+        raise NotImplementedError
+
+    def to_integer(self, input_fractional_bits: Optional[int] = None, input_bits: Optional[int] = None) -> bool:
+        """Switch to integer inference
+
+        Args:
+            input_fractional_bits: fractional bits of the inputs, defaults to the fractional bits of the activation quantization
+            input_bits: bits of the inputs including the sign, defaults to the bits of the activation quantization
+
+        Returns:
+            False if the module has no fixed point quantization and stays in floating point
+        """
+        weight_quantization = getattr(self, "weight_quantization", None)
+        weight_fractional_bits = _fractional_bits(weight_quantization)
+
+        activation_quantization = _quantization_function(getattr(self, "activation_post_process", None))
+        if activation_quantization is not None and not isinstance(activation_quantization, SymmetricQuantization):
+            return False
+        if input_fractional_bits is None:
+            input_fractional_bits = _fractional_bits(activation_quantization)
+        if input_bits is None and activation_quantization is not None:
+            input_bits = activation_quantization.bits
+
+        if weight_fractional_bits is None or input_fractional_bits is None or input_bits is None or self.weight is None:
+            return False
+        if activation_quantization is not None and _fractional_bits(activation_quantization) is None:
+            return False
+
+        with torch.no_grad():
+            weight = self.weight.detach()
+            codes = weight_quantization.quantize(weight)
+            weight_int = self._integer_weight(codes, weight_quantization, weight_fractional_bits)
+            if not torch.equal(weight_int * 2.0**-weight_fractional_bits, weight):
+                return False
+
+            bias_int = None
+            if self.bias is not None:
+                bias_int = self.bias.detach() * 2.0 ** (input_fractional_bits + weight_fractional_bits)
+                if not torch.equal(bias_int, torch.round(bias_int)) or bias_int.abs().max() >= 2**31:
+                    return False
+
+        self.register_buffer("weight_int", pack_integers(codes, weight_quantization.bits))
+        if bias_int is not None:
+            self.register_buffer("bias_int", bias_int.to(torch.int32))
+        else:
+            self.bias_int = None
+
+        self.weight_shape = tuple(weight.shape)
+        self.weight_bits = weight_quantization.bits
+        self.weight_fractional_bits = weight_fractional_bits
+        self.input_fractional_bits = input_fractional_bits
+        self.input_bits = input_bits
+        self.activation_quantization = activation_quantization
+
+        # the accumulation is exact in float32, if the bound of the accumulator magnitude is below 2**24
+        weight_bound = float(weight_int.abs().flatten(1).sum(1).max())
+        bias_bound = float(bias_int.abs().max()) if bias_int is not None else 0.0
+        bound = 2.0 ** (input_bits - 1) * weight_bound + bias_bound
+        self.accumulator_dtype = torch.float32 if bound < 2**24 else torch.float64
+
+        self.weight = None
+        self.bias = None
+        self.integer_inference = True
+
+        return True
+
+    @staticmethod
+    def _integer_weight(codes: Tensor, quantization: Any, fractional_bits: int) -> Tensor:
+        if isinstance(quantization, PowerOf2Quantization):
+            # codes are signed exponents, zero encodes the weight 0
+            return torch.where(
+                codes == 0,
+                torch.zeros_like(codes),
+                -torch.sign(codes) * torch.pow(2.0, fractional_bits - codes.abs()),
+            )
+        return codes
+
+    def _integer_forward(self, input: Tensor, relu: bool = False) -> Tensor:
+        # the fixed point scales are powers of 2, so scaling the integer weights and bias instead of
+        # the integer inputs and accumulator keeps the accumulation exact
+        dtype = self.accumulator_dtype
+        codes = unpack_integers(self.weight_int, self.weight_bits, self.weight_shape).to(dtype)
+        weight = self._integer_weight(codes, self.weight_quantization, self.weight_fractional_bits)
+        weight = weight * 2.0**-self.weight_fractional_bits
+        bias = None
+        if self.bias_int is not None:
+            bias = self.bias_int.to(dtype) * 2.0 ** -(self.input_fractional_bits + self.weight_fractional_bits)
+
+        output = self._op(input.to(dtype), weight, bias)
+        if relu:
+            output = f.relu(output)
+
+        # requantization to the output format: round and saturate
+        quantization = self.activation_quantization
+        if quantization is None:
+            return output.to(input.dtype)
+        return (quantization.quantize(output) * quantization.scale).to(input.dtype)
+
+
+class QuantizedConvModule(IntegerInferenceMixin, nn.Module):
     @classmethod
     def from_float(cls, float_module: Any) -> Any:
         assert hasattr(float_module, "weight_fake_quant")
@@ -77,6 +247,9 @@ class QuantizedConvModule(nn.Module):
                 )
         quant_module.weight = quant_weight
         quant_module.bias = quant_bias
+        quant_module.weight_quantization = _quantization_function(
+            float_module.weight_fake_quant
+        )
         quant_module.activation_post_process = copy.deepcopy(
             float_module.activation_post_process
         )
@@ -108,12 +281,22 @@ class Conv1d(QuantizedConvModule):
         self.padding_mode = padding_mode
         self.bias = None
         self.weight = None
+        self.weight_quantization = None
+        self.integer_inference = False
         self.activation_post_process = None
 
     def _get_name(self):
         return "QuantizedConv1d"
 
+    def _op(self, input: Tensor, weight: Tensor, bias: Optional[Tensor]) -> Tensor:
+        return f.conv1d(
+            input, weight, bias, self.stride, self.padding, self.dilation, self.groups
+        )
+
     def forward(self, input: Tensor) -> Tensor:
+        if self.integer_inference:
+            return self._integer_forward(input)
+
         output = f.conv1d(
             input,
             self.weight,
@@ -140,7 +323,7 @@ class Conv1d(QuantizedConvModule):
         #    s += ', dilation={dilation}'
         # if self.groups != 1:
         #    s += ', groups={groups}'
-        if self.bias is None:
+        if self.bias is None and getattr(self, "bias_int", None) is None:
             s += ", bias=False"
         return s.format(**self.__dict__)
 
@@ -150,6 +333,9 @@ class ConvReLU1d(Conv1d):
         return "QuantizedConvReLU1d"
 
     def forward(self, input: Tensor) -> Tensor:
+        if self.integer_inference:
+            return self._integer_forward(input, relu=True)
+
         output = f.conv1d(
             input,
             self.weight,
@@ -191,12 +377,22 @@ class Conv2d(QuantizedConvModule):
         self.padding_mode = padding_mode
         self.bias = None
         self.weight = None
+        self.weight_quantization = None
+        self.integer_inference = False
         self.activation_post_process = None
 
     def _get_name(self):
         return "QuantizedConv1d"
 
+    def _op(self, input: Tensor, weight: Tensor, bias: Optional[Tensor]) -> Tensor:
+        return f.conv2d(
+            input, weight, bias, self.stride, self.padding, self.dilation, self.groups
+        )
+
     def forward(self, input: Tensor) -> Tensor:
+        if self.integer_inference:
+            return self._integer_forward(input)
+
         output = f.conv2d(
             input,
             self.weight,
@@ -223,7 +419,7 @@ class Conv2d(QuantizedConvModule):
         #    s += ', dilation={dilation}'
         # if self.groups != 1:
         #    s += ', groups={groups}'
-        if self.bias is None:
+        if self.bias is None and getattr(self, "bias_int", None) is None:
             s += ", bias=False"
         return s.format(**self.__dict__)
 
@@ -233,6 +429,9 @@ class ConvReLU2d(Conv2d):
         return "QuantizedConvReLU2d"
 
     def forward(self, input: Tensor) -> Tensor:
+        if self.integer_inference:
+            return self._integer_forward(input, relu=True)
+
         output = f.conv2d(
             input,
             self.weight,
@@ -250,7 +449,7 @@ class ConvReLU2d(Conv2d):
         return output
 
 
-class Linear(nn.Module):
+class Linear(IntegerInferenceMixin, nn.Module):
     def __init__(self, in_features, out_features):
         super().__init__()
 
@@ -258,12 +457,20 @@ class Linear(nn.Module):
         self.out_features = out_features
         self.bias = None
         self.weight = None
+        self.weight_quantization = None
+        self.integer_inference = False
         self.activation_post_process = None
 
     def _get_name(self):
         return "QuantizedLinear"
 
+    def _op(self, input: Tensor, weight: Tensor, bias: Optional[Tensor]) -> Tensor:
+        return f.linear(input, weight, bias)
+
     def forward(self, input):
+        if self.integer_inference:
+            return self._integer_forward(input)
+
         output = f.linear(input, self.weight, self.bias)
 
         if hasattr(self, "activation_post_process"):
@@ -308,6 +515,9 @@ class Linear(nn.Module):
                 )
         quant_module.weight = quant_weight
         quant_module.bias = quant_bias
+        quant_module.weight_quantization = _quantization_function(
+            float_module.weight_fake_quant
+        )
         quant_module.activation_post_process = copy.deepcopy(
             float_module.activation_post_process
         )
@@ -347,3 +557,34 @@ class Identity(nn.Module):
         )
 
         return quant_module
+
+
+def to_integer(model: nn.Module, input_formats: Optional[Dict[str, Optional[Tuple[int, int]]]] = None) -> nn.Module:
+    """Switch the quantized modules of a converted model to integer inference in place
+
+    Modules without fixed point quantization of weights and activations stay in floating point,
+    so the model should be converted with `remove_qconfig=False`, which keeps the activation
+    quantization of the modules.
+
+    By default, the inputs of each module are expected in the fixed point format of its own activation
+    quantization, which is the output format of the preceding layer for uniform quantization.
+
+    Args:
+        model: the converted model
+        input_formats: (fractional bits, bits) of the inputs of modules with other input formats by module name,
+            modules mapped to None, e.g. modules receiving the unquantized model inputs, stay in floating point
+    """
+    input_formats = input_formats or {}
+    for name, module in model.named_modules():
+        if isinstance(module, IntegerInferenceMixin) and not module.integer_inference:
+            if name in input_formats and input_formats[name] is None:
+                continue
+            input_fractional_bits, input_bits = input_formats.get(name, (None, None))
+            if not module.to_integer(input_fractional_bits, input_bits):
+                msglogger.warning("%s has no fixed point quantization, keeping floating point inference", name)
+    return model
+
+
+def memory_footprint(model: nn.Module) -> int:
+    """Size of the parameters and buffers of a model in bytes"""
+    return sum(t.numel() * t.element_size() for t in model.state_dict().values())
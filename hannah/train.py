@@ -22,7 +22,7 @@ import logging
 import os
 import shutil
 from pathlib import Path
-from typing import Any, Dict, List, Mapping, Type, Union
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Type, Union
 
 import pandas as pd
 import tabulate
@@ -38,6 +38,7 @@ from pytorch_lightning.utilities.rank_zero import rank_zero_only
 from . import conf  # noqa
 from .callbacks.optimization import HydraOptCallback
 from .callbacks.prediction_logger import PredictionLogger
+from .nas.search.worker_pool import AsyncWorkerPool
 from .utils import clear_outputs, common_callbacks, git_version, log_execution_env_state
 from .utils.dvclive import DVCLIVE_AVAILABLE, DVCLogger
 from .utils.logger import JSONLogger
@@ -60,140 +61,304 @@ def handle_dataset(config=DictConfig):
     lit_module.prepare_data()
 
 
-def train(
-    config: DictConfig,
-) -> Union[float, Dict[Any, float], List[Union[float, Dict[Any, float]]]]:
-    test_output = []
-    val_output = []
-    results = []
-    if isinstance(config.seed, int):
-        config.seed = [config.seed]
-    validate_output = False
-    if hasattr(config, "validate_output") and isinstance(config.validate_output, bool):
-        validate_output = config.validate_output
-    
-    torch.set_float32_matmul_precision('high')
+def _train_seed(
+    config: DictConfig, seed: int, validate_output: bool
+) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], Any]:
+    """Train and evaluate the model for one seed in the current working directory
+
+    Returns:
+        the validation metrics, the test metrics and the optimization result of the
+        seed, which are None if they have not been computed
+    """
+    seed_everything(seed, workers=True)
+
+    if not config.trainer.fast_dev_run and not config.get("resume", False):
+        clear_outputs()
+
+    logging.info("Configuration: ")
+    logging.info(OmegaConf.to_yaml(config))
+    logging.info("Current working directory %s", os.getcwd())
+
+    if config.get("input_file", None):
+        msglogger.info("Loading initial weights from model %s", config.input_file)
+        lit_module = get_class(config.module._target_).load_from_checkpoint(
+            config.input_file
+        )
+    else:
+        lit_module = instantiate(
+            config.module,
+            dataset=config.dataset,
+            model=config.model,
+            optimizer=config.optimizer,
+            features=config.get("features", None),
+            augmentation=config.get("augmentation", None),
+            scheduler=config.get("scheduler", None),
+            normalizer=config.get("normalizer", None),
+            unlabeled_data=config.get("unlabeled_data"),
+            pseudo_labeling=config.get("pseudo_labeling", None),
+            _recursive_=False,
+        )
+
+    profiler = None
+    if config.get("profiler", None):
+        profiler = instantiate(config.profiler)
+
+    logger = [
+        TensorBoardLogger(
+            ".",
+            version="tensorboard",
+            name="",
+            default_hp_metric=False,
+            log_graph=True,
+        )
+    ]
+    logger.append(CSVLogger(".", version="logs", name=""))
+    logger.append(
+        JSONLogger(
+            ".",
+            version="logs",
+            name="",
+            format=config.get("metrics_format", "jsonl"),
+        )
+    )
+
+    # if DVCLIVE_AVAILABLE:
+    #    logger.append(DVCLogger())
+
+    callbacks = []
+    if config.get("backend", None):
+        backend = instantiate(config.backend)
+        callbacks.append(backend)
 
-    for seed in config.seed:
-        seed_everything(seed, workers=True)
+    callbacks.extend(list(common_callbacks(config)))
 
-        if not config.trainer.fast_dev_run and not config.get("resume", False):
-            clear_outputs()
+    opt_monitor = config.get("monitor", ["val_error"])
+    opt_callback = HydraOptCallback(monitor=opt_monitor)
+    callbacks.append(opt_callback)
 
-        logging.info("Configuration: ")
-        logging.info(OmegaConf.to_yaml(config))
-        logging.info("Current working directory %s", os.getcwd())
+    callbacks.append(PredictionLogger())
 
-        if config.get("input_file", None):
-            msglogger.info("Loading initial weights from model %s", config.input_file)
-            lit_module = get_class(config.module._target_).load_from_checkpoint(
-                config.input_file
+    checkpoint_callback = instantiate(config.checkpoint)
+    callbacks.append(checkpoint_callback)
+
+    # INIT PYTORCH-LIGHTNING
+    lit_trainer: Trainer = instantiate(
+        config.trainer,
+        profiler=profiler,
+        callbacks=callbacks,
+        logger=logger,
+        _convert_="partial",
+    )
+
+    if config["auto_lr"]:
+        # run lr finder (counts as one epoch)
+        lr_finder = lit_trainer.lr_find(lit_module)
+
+        # inspect results
+        fig = lr_finder.plot()
+        fig.savefig("./learning_rate.png")
+
+        # recreate module with updated config
+        suggested_lr = lr_finder.suggestion()
+        config["lr"] = suggested_lr
+
+    logging.info("Starting training")
+    # PL TRAIN
+    ckpt_path = None
+    if config.get("resume", False):
+        expected_ckpt_path = Path(".") / "checkpoints" / "last.ckpt"
+        if expected_ckpt_path.exists():
+            logging.info(
+                "Resuming training from checkpoint: %s", str(expected_ckpt_path)
             )
+            ckpt_path = str(expected_ckpt_path)
         else:
-            lit_module = instantiate(
-                config.module,
-                dataset=config.dataset,
-                model=config.model,
-                optimizer=config.optimizer,
-                features=config.get("features", None),
-                augmentation=config.get("augmentation", None),
-                scheduler=config.get("scheduler", None),
-                normalizer=config.get("normalizer", None),
-                unlabeled_data=config.get("unlabeled_data"),
-                pseudo_labeling=config.get("pseudo_labeling", None),
-                _recursive_=False,
+            logging.info(
+                "Checkpoint '%s' not found restarting training from scratch",
+                str(expected_ckpt_path),
             )
+    lit_trainer.fit(lit_module, ckpt_path=ckpt_path)
+
+    if lit_trainer.checkpoint_callback.kth_best_model_path:
+        ckpt_path = "best"
+    ckpt_path = None
+
+    val_result = None
+    test_result = None
+    result = None
+    if not lit_trainer.fast_dev_run:
+        reset_seed()
+        lit_trainer.validate(ckpt_path=ckpt_path, verbose=validate_output)
+        val_result = opt_callback.val_result()
+
+        if not config.get("skip_test", False):
+            # PL TEST
+            reset_seed()
+            lit_trainer.test(ckpt_path=ckpt_path, verbose=validate_output)
 
-        profiler = None
-        if config.get("profiler", None):
-            profiler = instantiate(config.profiler)
-
-        logger = [
-            TensorBoardLogger(
-                ".",
-                version="tensorboard",
-                name="",
-                default_hp_metric=False,
-                log_graph=True,
-            )
-        ]
-        logger.append(CSVLogger(".", version="logs", name=""))
-        logger.append(JSONLogger(".", version="logs", name=""))
+            test_result = opt_callback.test_result()
 
-        # if DVCLIVE_AVAILABLE:
-        #    logger.append(DVCLogger())
+        result = opt_callback.result()
 
-        callbacks = []
-        if config.get("backend", None):
-            backend = instantiate(config.backend)
-            callbacks.append(backend)
+    return val_result, test_result, result
 
-        callbacks.extend(list(common_callbacks(config)))
 
-        opt_monitor = config.get("monitor", ["val_error"])
-        opt_callback = HydraOptCallback(monitor=opt_monitor)
-        callbacks.append(opt_callback)
+def _worker_cores(num_slots: int) -> Optional[List[List[int]]]:
+    """Split the CPU cores available to the current process into `num_slots` contiguous shares
 
-        callbacks.append(PredictionLogger())
+    Returns None if the platform does not support CPU affinities.
+    """
+    if not hasattr(os, "sched_getaffinity"):
+        return None
 
-        checkpoint_callback = instantiate(config.checkpoint)
-        callbacks.append(checkpoint_callback)
+    cores = sorted(os.sched_getaffinity(0))
+    shares = []
+    for slot in range(num_slots):
+        share = cores[slot * len(cores) // num_slots : (slot + 1) * len(cores) // num_slots]
+        shares.append(share if share else [cores[slot % len(cores)]])
+    return shares
 
-        # INIT PYTORCH-LIGHTNING
-        lit_trainer: Trainer = instantiate(
-            config.trainer,
-            profiler=profiler,
-            callbacks=callbacks,
-            logger=logger,
-            _convert_="partial",
-        )
 
-        if config["auto_lr"]:
-            # run lr finder (counts as one epoch)
-            lr_finder = lit_trainer.lr_find(lit_module)
-
-            # inspect results
-            fig = lr_finder.plot()
-            fig.savefig("./learning_rate.png")
-
-            # recreate module with updated config
-            suggested_lr = lr_finder.suggestion()
-            config["lr"] = suggested_lr
-
-        logging.info("Starting training")
-        # PL TRAIN
-        ckpt_path = None
-        if config.get("resume", False):
-            expected_ckpt_path = Path(".") / "checkpoints" / "last.ckpt"
-            if expected_ckpt_path.exists():
-                logging.info(
-                    "Resuming training from checkpoint: %s", str(expected_ckpt_path)
-                )
-                ckpt_path = str(expected_ckpt_path)
-            else:
-                logging.info(
-                    "Checkpoint '%s' not found restarting training from scratch",
-                    str(expected_ckpt_path),
+def _pin_worker(
+    config: DictConfig, slot: int, num_slots: int, cores: Optional[List[int]]
+) -> None:
+    """Pin a seed training worker to a single GPU, or to its share of the CPU cores
+
+    The shares of the CPU cores are computed by the parent process, because worker
+    processes are reused for different slots and already have a restricted affinity.
+    """
+    accelerator = config.trainer.get("accelerator", "auto")
+    if accelerator in ["auto", "gpu", "cuda"] and torch.cuda.is_available():
+        devices = config.trainer.get("devices", None)
+        if isinstance(devices, int) and devices > 0:
+            device = slot % devices
+        elif OmegaConf.is_list(devices) and len(devices) > 0:
+            device = devices[slot % len(devices)]
+        else:
+            device = slot
+        config.trainer.devices = [device % torch.cuda.device_count()]
+        return
+
+    if cores is None:
+        torch.set_num_threads(max(1, os.cpu_count() // num_slots))
+        return
+
+    os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+
+
+def _to_float(values: Any) -> Any:
+    if values is None:
+        return None
+    if isinstance(values, Mapping):
+        return {key: float(value) for key, value in values.items()}
+    return float(values)
+
+
+def _train_seed_worker(
+    config: Dict[str, Any],
+    seed: int,
+    slot: int,
+    num_slots: int,
+    cores: Optional[List[int]],
+    validate_output: bool,
+    working_dir: str,
+) -> Tuple[Optional[Dict[str, float]], Optional[Dict[str, float]], Any]:
+    """Run `_train_seed` on a worker process, with the outputs in `seed_<seed>`"""
+    config = OmegaConf.create(config)
+    _pin_worker(config, slot, num_slots, cores)
+
+    seed_dir = Path(working_dir) / f"seed_{seed}"
+    seed_dir.mkdir(exist_ok=True)
+    os.chdir(seed_dir)
+    try:
+        val_result, test_result, result = _train_seed(config, seed, validate_output)
+    finally:
+        os.chdir(working_dir)
+
+    # metrics might be tensors on the device of the worker
+    return _to_float(val_result), _to_float(test_result), _to_float(result)
+
+
+def _train_seeds_concurrently(
+    config: DictConfig, parallel_seeds: int, validate_output: bool
+) -> List[Tuple[Optional[Dict[str, float]], Optional[Dict[str, float]], Any]]:
+    """Train the seeds on `parallel_seeds` worker processes
+
+    The datasets are prepared once before the workers are started. Each worker is pinned
+    to a GPU or a share of the CPU cores and writes the outputs of its seed to the
+    folder `seed_<seed>`.
+
+    Returns:
+        the outputs of `_train_seed` in the order of `config.seed`
+    """
+    handle_dataset(config)
+
+    # workers can not resolve interpolations referring to the hydra runtime
+    container = OmegaConf.to_container(config, resolve=True)
+    num_slots = min(parallel_seeds, len(config.seed))
+    worker_cores = _worker_cores(num_slots)
+    pool = AsyncWorkerPool(n_jobs=num_slots)
+    outputs = {}
+    pending = list(enumerate(config.seed))
+    try:
+        while pending or len(pool) > 0:
+            while pool.has_free_slot and pending:
+                num, seed = pending.pop(0)
+                slot = pool.acquire()
+                msglogger.info("Starting training of seed %d on worker %d", seed, slot)
+                pool.submit(
+                    slot,
+                    _train_seed_worker,
+                    container,
+                    seed,
+                    slot,
+                    num_slots,
+                    worker_cores[slot] if worker_cores is not None else None,
+                    validate_output,
+                    os.getcwd(),
+                    item=num,
                 )
-        lit_trainer.fit(lit_module, ckpt_path=ckpt_path)
 
-        if lit_trainer.checkpoint_callback.kth_best_model_path:
-            ckpt_path = "best"
-        ckpt_path = None
+            for num, output, exception in pool.wait():
+                if exception is not None:
+                    raise exception
+                outputs[num] = output
+    finally:
+        pool.shutdown()
 
-        if not lit_trainer.fast_dev_run:
-            reset_seed()
-            lit_trainer.validate(ckpt_path=ckpt_path, verbose=validate_output)
-            val_output.append(opt_callback.val_result())
+    return [outputs[num] for num in range(len(config.seed))]
 
-            if not config.get("skip_test", False):
-                # PL TEST
-                reset_seed()
-                lit_trainer.test(ckpt_path=ckpt_path, verbose=validate_output)
 
-                test_output.append(opt_callback.test_result())
+def train(
+    config: DictConfig,
+) -> Union[float, Dict[Any, float], List[Union[float, Dict[Any, float]]]]:
+    test_output = []
+    val_output = []
+    results = []
+    if isinstance(config.seed, int):
+        config.seed = [config.seed]
+    validate_output = False
+    if hasattr(config, "validate_output") and isinstance(config.validate_output, bool):
+        validate_output = config.validate_output
+    
+    torch.set_float32_matmul_precision('high')
+
+    parallel_seeds = config.get("parallel_seeds", 1)
+    if parallel_seeds > 1 and len(config.seed) > 1:
+        seed_outputs = _train_seeds_concurrently(config, parallel_seeds, validate_output)
+    else:
+        seed_outputs = (
+            _train_seed(config, seed, validate_output) for seed in config.seed
+        )
 
-            results.append(opt_callback.result())
+    for seed, (val_result, test_result, result) in zip(config.seed, seed_outputs):
+        if val_result is not None:
+            val_output.append(val_result)
+        if test_result is not None:
+            test_output.append(test_result)
+        if result is not None:
+            results.append(result)
 
     @rank_zero_only
     def summarize_stage(stage: str, output: Mapping["str", float]) -> None:
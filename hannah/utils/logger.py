@@ -17,13 +17,17 @@
 # limitations under the License.
 #
 import datetime
+import gzip
 import json
 import logging
 import os
 import pathlib
 from argparse import Namespace
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any, Dict, List, Mapping, Optional, Set, Union
 
+import torch
 from lightning_fabric.loggers.logger import rank_zero_experiment
 from lightning_fabric.utilities import rank_zero_only, rank_zero_warn
 from lightning_fabric.utilities.cloud_io import get_filesystem
@@ -32,6 +36,12 @@ from torch import Tensor
 
 import fsspec
 
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ModuleNotFoundError:
+    pyarrow = None
+
 log = logging.getLogger(__name__)
 
 def _is_dir(fs, path, strict=False):
@@ -67,6 +77,8 @@ class JSONLogger(Logger):
         version: Optional[Union[int, str]] = None,
         prefix: str = "",
         flush_logs_every_n_steps: int = 100,
+        format: str = "jsonl",
+        background: bool = True,
     ):
         super().__init__()
         root_dir = os.fspath(root_dir)
@@ -77,6 +89,8 @@ class JSONLogger(Logger):
         self._fs = get_filesystem(root_dir)
         self._experiment: Optional[_ExperimentWriter] = None
         self._flush_logs_every_n_steps = flush_logs_every_n_steps
+        self._format = format
+        self._background = background
 
     @property
     def name(self) -> str:
@@ -133,7 +147,9 @@ class JSONLogger(Logger):
             return self._experiment
 
         os.makedirs(self._root_dir, exist_ok=True)
-        self._experiment = _ExperimentWriter(log_dir=self.log_dir)
+        self._experiment = _ExperimentWriter(
+            log_dir=self.log_dir, format=self._format, background=self._background
+        )
         return self._experiment
 
     @rank_zero_only
@@ -164,6 +180,7 @@ class JSONLogger(Logger):
             # initialized there
             return
         self.save()
+        self.experiment.close()
 
     def _get_next_version(self) -> int:
         versions_root = os.path.join(self._root_dir, self.name)
@@ -187,19 +204,62 @@ class JSONLogger(Logger):
         return max(existing_versions) + 1
 
 
+def _to_python(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Replace the tensors in the metric rows by python numbers, in place
+
+    Tensors are stacked per device and dtype, so each device is only synchronized once.
+    """
+    tensors = defaultdict(list)
+    for row_idx, row in enumerate(rows):
+        for key, value in row.items():
+            if isinstance(value, Tensor):
+                value = value.detach()
+                tensors[(value.device, value.dtype)].append((row_idx, key, value))
+
+    for entries in tensors.values():
+        values = torch.stack([value.reshape(()) for _, _, value in entries])
+        for (row_idx, key, _), value in zip(entries, values.cpu().tolist()):
+            rows[row_idx][key] = value
+
+    return rows
+
+
 class _ExperimentWriter:
-    r"""Experiment writer for CSVLogger.
+    r"""Experiment writer for JSONLogger.
+
+    Metrics are buffered until `save()` is called. Each save converts the tensors of all
+    buffered rows at once and appends the rows to the metrics file with a single write to
+    an append handle that stays open until `close()`.
 
     Args:
         log_dir: Directory for the experiment logs
+        format: Format of the metrics file: `jsonl` (one json object per row),
+            `jsonl.gz` (gzip compressed jsonl, one gzip member per save) or `parquet`
+            (columns step, date, metric and value, one row group per save, requires pyarrow).
+            Parquet files can not be appended, so `metrics.parquet` is a directory with one
+            part file per opened handle.
+        background: Serialize and write the rows on a background thread
 
     """
 
     NAME_METRICS_FILE = "metrics.jsonl"
+    FORMATS = ["jsonl", "jsonl.gz", "parquet"]
+
+    def __init__(
+        self, log_dir: str, format: str = "jsonl", background: bool = False
+    ) -> None:
+        if format not in self.FORMATS:
+            raise ValueError(
+                f"Unknown metrics format {format}, choices are: {', '.join(self.FORMATS)}"
+            )
+        if format == "parquet" and pyarrow is None:
+            raise ModuleNotFoundError(
+                "Writing metrics as parquet files requires pyarrow to be installed"
+            )
 
-    def __init__(self, log_dir: str) -> None:
         self.metrics: List[Dict[str, float]] = []
         self.metrics_keys: List[str] = []
+        self.format = format
 
         self._fs = get_filesystem(log_dir)
         self.log_dir = log_dir
@@ -210,29 +270,119 @@ class _ExperimentWriter:
             )
         self._fs.makedirs(self.log_dir, exist_ok=True)
 
-        self.metrics_file_path = os.path.join(self.log_dir, self.NAME_METRICS_FILE)
+        file_name = self.NAME_METRICS_FILE
+        if format != "jsonl":
+            file_name = "metrics." + format
+        self.metrics_file_path = os.path.join(self.log_dir, file_name)
+
+        self._file = None
+        self._parquet_writer = None
+        self._parquet_parts = 0
+        self._background = background
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Optional[Future] = None
 
     def log_metrics(
         self, metrics_dict: Dict[str, float], step: Optional[int] = None
     ) -> None:
-        """Record metrics."""
-
-        def _handle_value(value: Union[Tensor, Any]) -> Any:
-            if isinstance(value, Tensor):
-                return value.item()
-            return value
+        """Record metrics, tensors are converted when the metrics are saved"""
 
         if step is None:
             step = len(self.metrics)
 
-        metrics = {k: _handle_value(v) for k, v in metrics_dict.items()}
+        metrics = dict(metrics_dict)
         metrics["step"] = step
         self.metrics.append(metrics)
 
     def save(self) -> None:
         """Save recorded metrics into files."""
-        for metric in self.metrics:
-            with self._fs.open(self.metrics_file_path, "a") as fp:
-                fp.write(json.dumps(metric) + "\n")
+        if not self.metrics:
+            return
 
+        rows = _to_python(self.metrics)
         self.metrics = []  # reset
+
+        if not self._background:
+            self._write(rows)
+            return
+
+        if self._executor is None:
+            # a single worker keeps the writes in order
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        # report errors of the previous write
+        self.wait()
+        self._pending = self._executor.submit(self._write, rows)
+
+    def wait(self) -> None:
+        """Wait until the metrics passed to `save` have been written"""
+        if self._pending is not None:
+            pending, self._pending = self._pending, None
+            pending.result()
+
+    def close(self) -> None:
+        """Write the remaining metrics and close the metrics file
+
+        Metrics saved after closing the writer are appended to the metrics file again.
+        """
+        self.save()
+        self.wait()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+            self._parquet_writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write(self, rows: List[Dict[str, Any]]) -> None:
+        if self.format == "parquet":
+            self._write_parquet(rows)
+            return
+
+        if self._file is None:
+            self._file = self._fs.open(self.metrics_file_path, "ab")
+        data = "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+        if self.format == "jsonl.gz":
+            data = gzip.compress(data)
+        self._file.write(data)
+        self._file.flush()
+
+    def _write_parquet(self, rows: List[Dict[str, Any]]) -> None:
+        # rows have varying metrics, so they are stored in long format
+        columns = {"step": [], "date": [], "metric": [], "value": []}
+        for row in rows:
+            for key, value in row.items():
+                if key in ["step", "date"] or not isinstance(value, (int, float)):
+                    continue
+                columns["step"].append(row["step"])
+                columns["date"].append(row.get("date"))
+                columns["metric"].append(key)
+                columns["value"].append(float(value))
+
+        table = pyarrow.table(
+            columns,
+            schema=pyarrow.schema(
+                [
+                    ("step", pyarrow.int64()),
+                    ("date", pyarrow.string()),
+                    ("metric", pyarrow.string()),
+                    ("value", pyarrow.float64()),
+                ]
+            ),
+        )
+        if self._parquet_writer is None:
+            self._fs.makedirs(self.metrics_file_path, exist_ok=True)
+            while True:
+                part = os.path.join(
+                    self.metrics_file_path, f"part-{self._parquet_parts}.parquet"
+                )
+                self._parquet_parts += 1
+                if not self._fs.exists(part):
+                    break
+            self._file = self._fs.open(part, "wb")
+            self._parquet_writer = pyarrow.parquet.ParquetWriter(
+                self._file, table.schema
+            )
+        self._parquet_writer.write_table(table)
@@ -16,30 +16,59 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import pytest
+from omegaconf import OmegaConf
+from toy_streams import ToyModel, ToyStreamDataset
 
-# conftest.py
+from hannah.modules.classifier import StreamClassifierModule
+
+
+TOY_MODEL = dict(_target_=f"{ToyModel.__module__}.ToyModel")
+MFCC = dict(_target_="hannah.features.MFCC", sample_rate=16000, n_mfcc=40, hop_length=160, n_fft=480, n_mels=40)
+
+
+@pytest.fixture
+def toy_stream_dataset(tmp_path):
+    """Factory for dataset configs of a `ToyStreamDataset`, keyword arguments override the config"""
+
+    def make(**config):
+        dataset = dict(
+            cls=f"{ToyStreamDataset.__module__}.ToyStreamDataset",
+            data_folder=str(tmp_path),
+            input_length=16000,
+            samplingrate=16000,
+        )
+        dataset.update(config)
+        return dataset
+
+    return make
 
-import pytest
 
+@pytest.fixture
+def toy_model():
+    "Model config of a linear classifier on the flattened features"
+    return dict(TOY_MODEL)
 
-def pytest_addoption(parser):
-    parser.addoption(
-        "--integration",
-        action="store_true",
-        default=False,
-        help="run integration tests",
-    )
 
+@pytest.fixture
+def stream_classifier(toy_stream_dataset):
+    """Factory for `StreamClassifierModule`s on a `ToyStreamDataset`
 
-def pytest_configure(config):
-    config.addinivalue_line("markers", "integration: mark test as integration test")
+    Args:
+        model: model config, defaults to a linear classifier
+        features: feature config, defaults to 40 MFCCs
+        dataset: overrides of the dataset config
+        **kwargs: further arguments of the module
+    """
 
+    def make(model=TOY_MODEL, features=MFCC, dataset=None, **kwargs):
+        kwargs.setdefault("batch_size", 4)
+        return StreamClassifierModule(
+            dataset=OmegaConf.create(toy_stream_dataset(**(dataset or {}))),
+            model=OmegaConf.create(model),
+            optimizer=OmegaConf.create(dict(_target_="torch.optim.SGD", lr=0.1)),
+            features=OmegaConf.create(features),
+            **kwargs,
+        )
 
-def pytest_collection_modifyitems(config, items):
-    if config.getoption("--integration"):
-        # --runslow given in cli: do not skip slow tests
-        return
-    skip_slow = pytest.mark.skip(reason="need --integration option to run")
-    for item in items:
-        if "integration" in item.keywords:
-            item.add_marker(skip_slow)
+    return make
@@ -0,0 +1,198 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pytest
+import pytorch_lightning as pl
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+from hannah.callbacks.backends import TorchMobileBackend
+
+
+class ToyModule(pl.LightningModule):
+    def __init__(self, lr=0.1):
+        super().__init__()
+        self.lr = lr
+        self.model = torch.nn.Sequential(torch.nn.Linear(8, 16), torch.nn.ReLU(), torch.nn.Linear(16, 2))
+        self.example_input_array = torch.zeros(1, 8)
+        generator = torch.Generator().manual_seed(0)
+        self.data = TensorDataset(torch.randn(64, 8, generator=generator), torch.randint(0, 2, (64,), generator=generator))
+
+    def forward(self, x):
+        return self.model(x)
+
+    def training_step(self, batch, batch_idx):
+        x, y = batch
+        return torch.nn.functional.cross_entropy(self(x), y)
+
+    def validation_step(self, batch, batch_idx):
+        x, y = batch
+        self.log("val_loss", torch.nn.functional.cross_entropy(self(x), y))
+
+    def configure_optimizers(self):
+        return torch.optim.SGD(self.parameters(), lr=self.lr)
+
+    def train_dataloader(self):
+        return DataLoader(self.data, batch_size=16)
+
+    def val_dataloader(self):
+        return DataLoader(self.data, batch_size=16)
+
+    def test_step(self, batch, batch_idx):
+        x, y = batch
+        self.log("test_loss", torch.nn.functional.cross_entropy(self(x), y))
+
+    def test_dataloader(self):
+        return DataLoader(self.data, batch_size=10)
+
+
+class CountingBackend(TorchMobileBackend):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.prepared = 0
+        self.updated = 0
+
+    def prepare(self, model):
+        self.prepared += 1
+        super().prepare(model)
+
+    def update_weights(self, state_dict):
+        self.updated += 1
+        super().update_weights(state_dict)
+
+
+@pytest.mark.parametrize("background", [True, False])
+@pytest.mark.parametrize("lr,expected_updates", [(0.1, 2), (0.0, 0)])
+def test_persistent_backend_session(background, lr, expected_updates):
+    backend = CountingBackend(val_batches=2, val_frequency=1, background=background)
+    module = ToyModule(lr=lr)
+    trainer = pl.Trainer(
+        accelerator="cpu",
+        max_epochs=3,
+        callbacks=[backend],
+        logger=False,
+        enable_checkpointing=False,
+        enable_progress_bar=False,
+        enable_model_summary=False,
+        num_sanity_val_steps=0,
+    )
+    trainer.fit(module)
+
+    # the session is created once and afterwards only refreshed if the weights have changed
+    assert backend.prepared == 1
+    assert backend.updated == expected_updates
+    assert trainer.callback_metrics["val_backend_mse"] < 1e-10
+    assert backend._executor is None
+
+    # the refreshed session computes the same outputs as the trained module
+    x = torch.randn(4, 8)
+    assert torch.allclose(backend.run_batch(x), module(x), atol=1e-6)
+
+
+class FailingBackend(CountingBackend):
+    def prepare(self, model):
+        super().prepare(model)
+        if self.prepared == 1:
+            raise RuntimeError("preparation failed")
+
+
+@pytest.mark.parametrize("background", [True, False])
+def test_failing_backend_session(background):
+    backend = FailingBackend(val_batches=1, val_frequency=1, background=background)
+    module = ToyModule()
+
+    backend.prepare_session(module)
+    with pytest.raises(RuntimeError, match="preparation failed"):
+        backend._wait()
+
+    # the failed session is not trusted and prepared again
+    backend.prepare_session(module)
+    backend._wait()
+    assert backend.prepared == 2
+    x = torch.randn(4, 8)
+    assert torch.allclose(backend.run_batch(x), module(x), atol=1e-6)
+
+    backend.prepare_session(module)
+    backend._wait()
+    assert backend.prepared == 2
+
+
+@pytest.mark.parametrize("num_sessions", [1, 3])
+def test_full_backend_evaluation(num_sessions):
+    backend = TorchMobileBackend(test_batches=1, full_evaluation=True, num_sessions=num_sessions)
+    module = ToyModule()
+    trainer = pl.Trainer(
+        accelerator="cpu", callbacks=[backend], logger=False, enable_progress_bar=False, enable_model_summary=False
+    )
+    trainer.test(module, verbose=False)
+
+    x, y = module.data.tensors
+    with torch.no_grad():
+        expected_accuracy = (module(x).argmax(dim=-1) == y).float().mean().item()
+
+    metrics = trainer.callback_metrics
+    assert metrics["test_backend_accuracy"].item() == pytest.approx(expected_accuracy)
+    assert metrics["test_backend_samples_per_second"] > 0
+    assert 0 < metrics["test_backend_latency_p50_ms"] <= metrics["test_backend_latency_p99_ms"]
+
+
+class RawBatchModule(ToyModule):
+    "Batches contain raw inputs of length 12, which are cropped to the model inputs like a batched augmentation"
+
+    def __init__(self):
+        super().__init__()
+        generator = torch.Generator().manual_seed(1)
+        self.data = TensorDataset(torch.randn(64, 12, generator=generator), torch.randint(0, 2, (64,), generator=generator))
+
+    def model_inputs(self, batch, split):
+        return batch[0][:, 2:10]
+
+    def training_step(self, batch, batch_idx):
+        return torch.nn.functional.cross_entropy(self(self.model_inputs(batch, "train")), batch[1])
+
+    def validation_step(self, batch, batch_idx):
+        self.log("val_loss", torch.nn.functional.cross_entropy(self(self.model_inputs(batch, "val")), batch[1]))
+
+    def test_step(self, batch, batch_idx):
+        self.log("test_loss", torch.nn.functional.cross_entropy(self(self.model_inputs(batch, "test")), batch[1]))
+
+
+def test_backend_model_inputs():
+    backend = TorchMobileBackend(val_batches=1, val_frequency=1, test_batches=1, full_evaluation=True)
+    module = RawBatchModule()
+    trainer = pl.Trainer(
+        accelerator="cpu",
+        max_epochs=1,
+        callbacks=[backend],
+        logger=False,
+        enable_checkpointing=False,
+        enable_progress_bar=False,
+        enable_model_summary=False,
+        num_sanity_val_steps=0,
+    )
+    trainer.fit(module)
+    assert trainer.callback_metrics["val_backend_mse"] < 1e-10
+    trainer.test(module, verbose=False)
+
+    x, y = module.data.tensors
+    with torch.no_grad():
+        expected_accuracy = (module(x[:, 2:10]).argmax(dim=-1) == y).float().mean().item()
+
+    metrics = trainer.callback_metrics
+    assert metrics["test_backend_mse"] < 1e-10
+    assert metrics["test_backend_accuracy"].item() == pytest.approx(expected_accuracy)
@@ -16,9 +16,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import time
+
+import numpy as np
+import pytest
 import torch
 
-from hannah.datasets.collate import vision_collate_fn
+from hannah.datasets.collate import ctc_collate_fn, vision_collate_fn
+from hannah.datasets.sampler import LengthBucketingBatchSampler
 
 
 def test_vision_collate_fn():
@@ -63,3 +68,75 @@ def test_vision_collate_fn3():
     assert bbox_collated[1] == []
 
     print(bbox_collated)
+
+
+def padded_stack(sequences):
+    max_length = max(seq.shape[-1] for seq in sequences)
+    return torch.stack([torch.nn.functional.pad(seq, (0, max_length - seq.shape[-1])) for seq in sequences])
+
+
+def variable_length_batch(batch_size, channels=2):
+    generator = torch.Generator().manual_seed(0)
+    lengths = torch.randint(100, 16000, (batch_size,), generator=generator).tolist()
+    return [
+        (torch.rand(channels, length, generator=generator), length, torch.tensor([i % 3]), 1)
+        for i, length in enumerate(lengths)
+    ]
+
+
+def test_ctc_collate_fn():
+    batch = variable_length_batch(16)
+    x, x_length, y, y_length = ctc_collate_fn(batch)
+
+    assert torch.equal(x, padded_stack([item[0] for item in batch]))
+    assert torch.equal(x_length, torch.Tensor([item[1] for item in batch]))
+    assert torch.equal(y, torch.arange(16).remainder(3).view(16, 1))
+    assert torch.equal(y_length, torch.ones(16))
+
+
+def test_ctc_collate_fn_in_workers():
+    batches = [variable_length_batch(4) for _ in range(2)]
+    loader = torch.utils.data.DataLoader(batches, batch_size=None, collate_fn=ctc_collate_fn, num_workers=1)
+
+    for batch, (x, _, _, _) in zip(batches, loader):
+        assert torch.equal(x, padded_stack([item[0] for item in batch]))
+
+
+@pytest.mark.parametrize("drop_last", [False, True])
+def test_length_bucketing_batch_sampler(drop_last):
+    lengths = np.random.RandomState(0).randint(1, 1000, 1000)
+    sampler = LengthBucketingBatchSampler(lengths, 32, bucket_batches=8, drop_last=drop_last)
+
+    batches = list(sampler)
+    assert len(batches) == len(sampler)
+    if drop_last:
+        assert all(len(batch) == 32 for batch in batches)
+
+    indices = [i for batch in batches for i in batch]
+    assert len(indices) == len(set(indices))
+    assert len(indices) == (992 if drop_last else 1000)
+
+    # batches contain items of similar length
+    spread = np.mean([lengths[batch].max() - lengths[batch].min() for batch in batches])
+    assert spread < 0.2 * (lengths.max() - lengths.min())
+
+    # batch order is random
+    assert list(sampler) != batches
+
+
+@pytest.mark.benchmark
+def test_ctc_collate_fn_benchmark():
+    batch = variable_length_batch(256)
+    sequences = [item[0] for item in batch]
+
+    start = time.perf_counter()
+    for _ in range(10):
+        padded_stack(sequences)
+    stack_time = (time.perf_counter() - start) / 10
+
+    start = time.perf_counter()
+    for _ in range(10):
+        ctc_collate_fn(batch)
+    collate_time = (time.perf_counter() - start) / 10
+
+    print(f"Collating 256 items: {stack_time * 1000:.3f}ms pad and stack, {collate_time * 1000:.3f}ms ctc_collate_fn")
@@ -0,0 +1,134 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import pickle
+
+import h5py
+import numpy as np
+import torch
+
+from hannah.datasets.activity import PAMAP2_Dataset
+from hannah.datasets.physio import AtrialFibrillationDataset, PhysioCincDataset
+from hannah.datasets.utils.pack import ArrayPack
+
+
+def assert_same_items(plain, packed):
+    assert len(plain) == len(packed)
+    for i in range(len(plain)):
+        data, data_len, label, _ = plain[i]
+        packed_data, packed_len, packed_label, _ = packed[i]
+        assert data_len == packed_len
+        assert torch.equal(label, packed_label)
+        assert torch.allclose(data, packed_data, atol=1e-6)
+
+
+def test_array_pack(tmp_path):
+    arrays = {f"array_{i}": np.random.RandomState(i).randn(i + 1, 3, 2) for i in range(4)}
+
+    pack = ArrayPack.create(tmp_path / "pack", arrays.keys(), arrays.get, label_fn=lambda name: int(name[-1]))
+
+    assert len(pack) == 4
+    assert pack.data.shape == (10, 3, 2)
+    for name, data in arrays.items():
+        assert np.allclose(pack.rows(name), data, atol=1e-6)
+        assert pack.labels[name] == int(name[-1])
+    assert np.allclose(pack.rows("array_3", 1, 3), arrays["array_3"][1:3], atol=1e-6)
+
+
+def physio_config(tmp_path, **kwargs):
+    config = dict(
+        data_folder=str(tmp_path),
+        samplingrate=300,
+        input_length=64,
+        num_channels=1,
+        dev_pct=20,
+        test_pct=20,
+    )
+    config.update(kwargs)
+    return config
+
+
+def test_packed_physio_cinc(tmp_path):
+    config = physio_config(tmp_path)
+    prepared = tmp_path / PhysioCincDataset.PREPARED_FOLDER
+    rng = np.random.RandomState(0)
+    for label in PhysioCincDataset.get_label_mapping():
+        os.makedirs(prepared / label)
+        for i in range(5):
+            with open(prepared / label / f"A{i:05d}", "wb") as f:
+                pickle.dump(rng.randn(64), f)
+
+    plain = PhysioCincDataset.splits(config)
+    PhysioCincDataset.consolidate(config)
+    packed = PhysioCincDataset.splits(config)
+
+    for plain_set, packed_set in zip(plain, packed):
+        assert plain_set.pack is None
+        assert packed_set.pack is not None
+        assert_same_items(plain_set, packed_set)
+
+
+def test_packed_atrial_fibrillation(tmp_path):
+    config = physio_config(tmp_path, num_channels=2)
+    prepared = tmp_path / AtrialFibrillationDataset.PREPARED_FOLDER
+    rng = np.random.RandomState(0)
+    for label in AtrialFibrillationDataset.get_label_mapping():
+        os.makedirs(prepared / label)
+        for i in range(5):
+            with open(prepared / label / f"ex0_{i}", "wb") as f:
+                pickle.dump(rng.randn(64, 2), f)
+
+    plain = AtrialFibrillationDataset.splits(config)
+    AtrialFibrillationDataset.consolidate(config)
+    packed = AtrialFibrillationDataset.splits(config)
+
+    for plain_set, packed_set in zip(plain, packed):
+        assert packed_set.pack is not None
+        assert_same_items(plain_set, packed_set)
+
+
+def test_packed_pamap2(tmp_path):
+    config = dict(data_folder=str(tmp_path), input_length=16, dev_pct=20, test_pct=20)
+    prepared = tmp_path / "pamap2" / "pamap2_prepared"
+    rng = np.random.RandomState(0)
+    for subject in ["subject101", "subject102"]:
+        for label in [0, 3]:
+            folder = prepared / subject / f"label_{label:02d}"
+            os.makedirs(folder)
+            for nr in range(3):
+                with h5py.File(folder / f"Protocol_{subject}.dat_{nr}.hdf5", "w") as f:
+                    dataset = f.create_dataset("dataset", data=rng.randn(100 + 10 * nr, 40))
+                    dataset.attrs["label"] = label
+
+    plain = PAMAP2_Dataset.splits(config)
+    plain_cv = PAMAP2_Dataset.splits_cv(config)
+    PAMAP2_Dataset.consolidate(config)
+    packed = PAMAP2_Dataset.splits(config)
+    packed_cv = PAMAP2_Dataset.splits_cv(config)
+
+    plain_sets = plain + tuple(plain_cv)
+    packed_sets = packed + tuple(packed_cv)
+    assert len(plain_sets) == len(packed_sets) == 5
+    for plain_set, packed_set in zip(plain_sets, packed_sets):
+        assert len(plain_set) > 0
+        assert plain_set.pack is None
+        assert packed_set.pack is not None
+        assert plain_set.data_files == packed_set.data_files
+        assert plain_set.class_counts == packed_set.class_counts
+        assert_same_items(plain_set, packed_set)
@@ -0,0 +1,93 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import time
+
+import pytest
+import pytorch_lightning as pl
+import torch
+
+from hannah.datasets.feature_cache import FeatureCacheDataset
+
+
+def cached_classifier(stream_classifier, tmp_path, splits, **dataset_config):
+    module = stream_classifier(
+        dataset=dataset_config,
+        batch_size=8,
+        feature_cache=dict(splits=splits, folder=str(tmp_path / "feature_cache")),
+    )
+    module.setup("fit")
+    return module
+
+
+def test_feature_cache(stream_classifier, tmp_path):
+    plain = cached_classifier(stream_classifier, tmp_path, [])
+    cached = cached_classifier(stream_classifier, tmp_path, ["val", "test"])
+    cached.model.load_state_dict(plain.model.state_dict())
+
+    assert plain.cached_splits == set()
+    assert cached.cached_splits == {"val", "test"}
+    assert isinstance(cached.dev_set, FeatureCacheDataset)
+    assert not isinstance(cached.train_set, FeatureCacheDataset)
+    assert len(list((tmp_path / "feature_cache").iterdir())) == 2
+
+    plain.eval()
+    cached.eval()
+    for plain_batch, cached_batch in zip(plain.val_dataloader(), cached.val_dataloader()):
+        x, x_length, y, _ = plain_batch
+        features, features_length, cached_y, _ = cached_batch
+        assert torch.equal(y, cached_y)
+        assert torch.allclose(
+            plain._forward_batch(x, x_length, "val"), cached._forward_batch(features, features_length, "val"), atol=1e-5
+        )
+
+    # the cache is reused
+    reloaded = cached_classifier(stream_classifier, tmp_path, ["val", "test"])
+    assert reloaded.dev_set.folder == cached.dev_set.folder
+    assert len(list((tmp_path / "feature_cache").iterdir())) == 2
+
+
+def test_feature_cache_waveform_augmentation(stream_classifier, tmp_path):
+    assert cached_classifier(stream_classifier, tmp_path, ["train", "val"]).cached_splits == {"train", "val"}
+
+    augmented = cached_classifier(stream_classifier, tmp_path, ["train", "val"], timeshift_ms=100)
+    assert augmented.cached_splits == {"val"}
+    assert not isinstance(augmented.train_set, FeatureCacheDataset)
+
+    noisy = cached_classifier(stream_classifier, tmp_path, ["train"], train_snr_low=5.0, train_snr_high=20.0)
+    assert noisy.cached_splits == set()
+
+
+@pytest.mark.benchmark
+def test_feature_cache_benchmark(stream_classifier, tmp_path):
+    def timed_validation(module):
+        trainer = pl.Trainer(
+            accelerator="cpu",
+            logger=False,
+            enable_checkpointing=False,
+            enable_progress_bar=False,
+            enable_model_summary=False,
+        )
+        start = time.perf_counter()
+        trainer.validate(module, verbose=False)
+        return time.perf_counter() - start
+
+    plain_time = timed_validation(cached_classifier(stream_classifier, tmp_path, []))
+    cached_time = timed_validation(cached_classifier(stream_classifier, tmp_path, ["val"]))
+
+    print(f"Validation epoch: {plain_time:.3f}s without feature cache, {cached_time:.3f}s with feature cache")
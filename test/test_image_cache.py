@@ -0,0 +1,77 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pickle
+
+import numpy as np
+import pytest
+
+from hannah.datasets.utils.image_cache import ImageCache
+
+
+def test_image_cache(tmp_path):
+    images = {
+        f"image_{i}.jpg": np.random.RandomState(i).randint(0, 256, (12, 16, 3), dtype=np.uint8) for i in range(6)
+    }
+
+    cache = ImageCache.create(tmp_path / "cache", images.keys(), images.get, num_threads=3)
+
+    assert len(cache) == 6
+    assert cache.shape == (6, 12, 16, 3)
+    for i, image in enumerate(images.values()):
+        assert cache[i].dtype == np.uint8
+        assert np.array_equal(cache[i], image)
+
+    # caches are reopened instead of being recreated, and can be sent to dataloader workers
+    reopened = ImageCache.open_or_create(tmp_path / "cache", [], None)
+    reopened = pickle.loads(pickle.dumps(reopened))
+    assert np.array_equal(reopened[4], images["image_4.jpg"])
+
+
+def test_image_cache_shape_mismatch(tmp_path):
+    images = [np.zeros((12, 16, 3), dtype=np.uint8), np.zeros((16, 12, 3), dtype=np.uint8)]
+
+    with pytest.raises(ValueError):
+        ImageCache.create(tmp_path / "cache", [0, 1], images.__getitem__)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_image_dataset_size(tmp_path, monkeypatch):
+    pytest.importorskip("albumentations")
+    pytest.importorskip("cv2")
+    from PIL import Image
+
+    from hannah.datasets.vision.base import ImageDatasetBase
+
+    paths = []
+    for i in range(2):
+        path = tmp_path / f"image_{i}.png"
+        Image.fromarray(np.zeros((12, 16, 3), dtype=np.uint8)).save(path)
+        paths.append(str(path))
+
+    def no_decode(self, index):
+        raise AssertionError("size() must not decode a sample")
+
+    monkeypatch.setattr(ImageDatasetBase, "__getitem__", no_decode)
+
+    assert ImageDatasetBase(paths, ["a", "b"], ["a", "b"]).size() == [3, 12, 16]
+    assert ImageDatasetBase(paths, ["a", "b"], ["a", "b"], resolution=(8, 8)).size() == [3, 8, 8]
+
+    cached = ImageDatasetBase(paths, ["a", "b"], ["a", "b"])
+    cached.cache_images(tmp_path / "cache", resolution=(6, 4))
+    assert cached.size() == [3, 6, 4]
@@ -0,0 +1,92 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import gzip
+import json
+import time
+
+import pytest
+import torch
+
+from hannah.utils.logger import JSONLogger
+
+
+def log_rows(logger, steps, offset=0):
+    for step in range(offset, offset + steps):
+        logger.log_metrics(
+            {"train_loss": torch.tensor(1.0 / (step + 1)), "train_accuracy": torch.tensor([0.5]), "epoch": step // 10},
+            step=step,
+        )
+
+
+def read_rows(path, format):
+    if format == "jsonl.gz":
+        with gzip.open(path, "rt") as f:
+            return [json.loads(line) for line in f]
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.mark.parametrize("format", ["jsonl", "jsonl.gz"])
+@pytest.mark.parametrize("background", [False, True])
+def test_json_logger(tmp_path, format, background):
+    logger = JSONLogger(tmp_path, version="logs", name="", format=format, background=background, flush_logs_every_n_steps=10)
+    log_rows(logger, 25)
+    logger.experiment.wait()
+
+    path = tmp_path / "logs" / f"metrics.{format}"
+    # rows are written in whole flushes
+    assert len(read_rows(path, format)) == 20
+
+    logger.finalize("success")
+    rows = read_rows(path, format)
+    assert [row["step"] for row in rows] == list(range(25))
+    assert rows[3]["train_loss"] == pytest.approx(0.25)
+    assert rows[3]["train_accuracy"] == 0.5
+    assert rows[24]["epoch"] == 2
+    assert "date" in rows[0]
+
+    # metrics logged after finalizing are appended
+    log_rows(logger, 5, offset=25)
+    logger.finalize("success")
+    assert [row["step"] for row in read_rows(path, format)] == list(range(30))
+
+
+def test_json_logger_parquet(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    logger = JSONLogger(tmp_path, version="logs", name="", format="parquet", flush_logs_every_n_steps=10)
+    log_rows(logger, 25)
+    logger.finalize("success")
+    log_rows(logger, 5, offset=25)
+    logger.finalize("success")
+
+    table = pq.read_table(tmp_path / "logs" / "metrics.parquet").to_pydict()
+    assert sorted(set(table["step"])) == list(range(30))
+    assert len(table["metric"]) == 30 * 3
+
+
+@pytest.mark.benchmark
+def test_json_logger_benchmark(tmp_path):
+    for format in ["jsonl", "jsonl.gz"]:
+        logger = JSONLogger(tmp_path / format, version="logs", name="", format=format)
+        start = time.perf_counter()
+        log_rows(logger, 10000)
+        logger.finalize("success")
+        duration = time.perf_counter() - start
+        print(f"{format}: {10000 / duration:.0f} rows/s")
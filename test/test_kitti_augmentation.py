@@ -0,0 +1,146 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import stat
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from hannah.datasets.base import DatasetType
+from hannah.modules.augmentation.augmentation import AugmentationThread, XmlAugmentationParser, _albumentations_transform
+
+AUGMENTATION_XML = """<Augmentation>
+  <ParameterList>
+    <Parameter Description="Output filename" Value=""/>
+    <Parameter Description="File containg files to process" Value=""/>
+    <Parameter Description="Output directory" Value=""/>
+  </ParameterList>
+</Augmentation>
+"""
+
+# Stub of the external augmentation tool, copies the images listed in to_augment.txt
+AUGMENTATION_TOOL = """#!/bin/sh
+sleep {delay}
+cd "$(dirname "$0")"
+while read name; do
+  cp "{image_dir}/$name.png" "$name.png"
+  echo "$name" >> augmented.log
+done < to_augment.txt
+"""
+
+
+def kitti_dataset(tmp_path, num_images=8, delay=0):
+    kitti_dir = tmp_path / "kitti"
+    image_dir = kitti_dir / "training" / "image_2"
+    image_dir.mkdir(parents=True)
+    (kitti_dir / "augmentation").mkdir()
+    (kitti_dir / "augmentation" / "rain_drops.xml").write_text(AUGMENTATION_XML)
+    aug_path = tmp_path / "augmented"
+    aug_path.mkdir()
+
+    img_files = []
+    for i in range(num_images):
+        Image.fromarray(np.full((4, 6, 3), i, dtype=np.uint8)).save(image_dir / f"{i:06d}.png")
+        img_files.append(f"{i:06d}.png")
+
+    tool = aug_path / "perform_augmentation.sh"
+    tool.write_text(AUGMENTATION_TOOL.format(delay=delay, image_dir=image_dir))
+    tool.chmod(tool.stat().st_mode | stat.S_IEXEC)
+
+    return SimpleNamespace(
+        kitti_dir=str(kitti_dir),
+        aug_path=str(aug_path) + "/",
+        img_files=img_files,
+        aug_files=[],
+        set_type=DatasetType.TRAIN,
+    )
+
+
+def augmentation_config():
+    return {
+        "augmentations": ["rain_drops"],
+        "augmentations_pct": [100],
+        "rain_drops": [],
+        "reaugment_per_epoch_pct": 0,
+        "double_augment": False,
+    }
+
+
+def augmented_images(kitti):
+    log = kitti.aug_path + "augmented.log"
+    try:
+        with open(log) as log_file:
+            return log_file.read().split()
+    except FileNotFoundError:
+        return []
+
+
+def test_augmentation_thread(tmp_path):
+    kitti = kitti_dataset(tmp_path)
+    aug_thread = AugmentationThread(num_workers=4)
+    aug_thread.augment(augmentation_config(), kitti, 100, True, True)
+
+    names = [img[:-4] for img in kitti.img_files]
+    assert not aug_thread.running
+    assert sorted(kitti.aug_files) == names
+    # the external tool is called once per image
+    assert sorted(augmented_images(kitti)) == names
+    for img in kitti.img_files:
+        assert (tmp_path / "augmented" / img).exists()
+
+
+def test_augmentation_thread_stop(tmp_path):
+    kitti = kitti_dataset(tmp_path, num_images=20, delay=0.2)
+    aug_thread = AugmentationThread(num_workers=4)
+
+    th = aug_thread.start(augmentation_config(), kitti, 100, True, False)
+    assert isinstance(th, threading.Thread)
+    assert aug_thread.running
+
+    aug_thread.clear()
+    assert aug_thread.stop
+    assert not aug_thread.running
+    assert len(augmented_images(kitti)) < len(kitti.img_files)
+
+    # can be restarted after a stop
+    kitti.aug_files = []
+    aug_thread.start(augmentation_config(), kitti, 100, True, False).join()
+    assert not aug_thread.stop
+    assert len(kitti.aug_files) == len(kitti.img_files)
+
+
+def test_albumentations_transform_cache(tmp_path):
+    pytest.importorskip("albumentations")
+    params = [
+        "blur", "clahe", "channel_dropout", "channel_shuffle", "coarse_dropout", "downscale", "equalize",
+        "gauss_noise", "hue_saturation_value", "iso_noise", "image_compression", "invert", "motion_blur",
+        "posterize", "rgb_shift", "random_brightness_contrast", "random_gamma", "solarize",
+    ]
+    conf = {param: 0 for param in params}
+    conf["invert"] = 100
+
+    transform = _albumentations_transform(tuple(sorted(conf.items())))
+    assert _albumentations_transform(tuple(sorted(conf.items()))) is transform
+
+    kitti = kitti_dataset(tmp_path, num_images=1)
+    XmlAugmentationParser.albumentations(conf, kitti.img_files[0], kitti)
+    augmented = np.array(Image.open(kitti.aug_path + kitti.img_files[0]))
+    assert np.all(augmented == 255)
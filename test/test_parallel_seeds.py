@@ -0,0 +1,111 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import os
+import time
+
+import pytest
+import torch
+from omegaconf import OmegaConf
+
+from hannah.train import _pin_worker, _train_seed, _train_seeds_concurrently, _worker_cores
+
+
+def train_config(toy_stream_dataset, toy_model, seeds, train_size=64, max_epochs=2):
+    return OmegaConf.create(
+        dict(
+            seed=seeds,
+            auto_lr=False,
+            monitor=["val_error"],
+            dataset=toy_stream_dataset(input_length=1600, train_size=train_size),
+            features=dict(
+                _target_="hannah.features.MFCC", sample_rate=16000, n_mfcc=10, hop_length=160, n_fft=480, n_mels=20
+            ),
+            model=toy_model,
+            optimizer=dict(_target_="torch.optim.SGD", lr=0.1),
+            module=dict(_target_="hannah.modules.StreamClassifierModule", batch_size=8, num_workers=0),
+            checkpoint=dict(
+                _target_="pytorch_lightning.callbacks.ModelCheckpoint",
+                dirpath="checkpoints",
+                monitor="val_error",
+                mode="min",
+            ),
+            trainer=dict(
+                _target_="pytorch_lightning.trainer.Trainer",
+                accelerator="cpu",
+                devices=1,
+                max_epochs=max_epochs,
+                fast_dev_run=False,
+                deterministic=True,
+                enable_progress_bar=False,
+                enable_model_summary=False,
+            ),
+        )
+    )
+
+
+def test_parallel_seeds(tmp_path, monkeypatch, toy_stream_dataset, toy_model):
+    monkeypatch.chdir(tmp_path)
+    config = train_config(toy_stream_dataset, toy_model, [1, 2, 3])
+
+    concurrent = _train_seeds_concurrently(config, 2, False)
+    for seed in [1, 2, 3]:
+        assert {"checkpoints", "logs", "tensorboard"} <= set(os.listdir(tmp_path / f"seed_{seed}"))
+
+    # concurrent training gives the same results as training the seeds one after another
+    for seed, (val_result, test_result, result) in zip(config.seed, concurrent):
+        expected_val, expected_test, expected_result = _train_seed(config, seed, False)
+        assert val_result["val_error"] == pytest.approx(float(expected_val["val_error"]))
+        assert test_result["test_accuracy"] == pytest.approx(float(expected_test["test_accuracy"]))
+        assert result == pytest.approx(expected_result)
+
+
+def test_worker_cores(monkeypatch, toy_stream_dataset, toy_model):
+    monkeypatch.setattr(os, "sched_getaffinity", lambda pid: set(range(8)), raising=False)
+    assert _worker_cores(3) == [[0, 1], [2, 3, 4], [5, 6, 7]]
+    assert all(len(share) == 1 for share in _worker_cores(10))
+
+    # reused worker processes get the shares computed by the parent
+    affinities = []
+    monkeypatch.setattr(os, "sched_setaffinity", lambda pid, cores: affinities.append(cores), raising=False)
+    monkeypatch.setattr(torch, "set_num_threads", lambda num: None)
+    config = train_config(toy_stream_dataset, toy_model, [1, 2, 3])
+    shares = _worker_cores(2)
+    for slot in [1, 0, 1, 0]:
+        _pin_worker(config, slot, 2, shares[slot])
+    assert affinities == [[4, 5, 6, 7], [0, 1, 2, 3]] * 2
+
+
+@pytest.mark.benchmark
+def test_parallel_seeds_benchmark(tmp_path, monkeypatch, toy_stream_dataset, toy_model):
+    monkeypatch.chdir(tmp_path)
+    config = train_config(toy_stream_dataset, toy_model, [1, 2, 3, 4, 5], train_size=512, max_epochs=3)
+    parallel_seeds = min(5, os.cpu_count())
+
+    start = time.perf_counter()
+    for seed in config.seed:
+        _train_seed(config, seed, False)
+    sequential_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _train_seeds_concurrently(config, parallel_seeds, False)
+    concurrent_time = time.perf_counter() - start
+
+    print(
+        f"5 seeds: {sequential_time:.1f}s sequential, {concurrent_time:.1f}s with {parallel_seeds} parallel seeds"
+    )
@@ -16,6 +16,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #
+import time
 from typing import Any
 
 import pytest
@@ -34,8 +35,18 @@ from hannah.models.factory.qat import (
     ConvBnReLU2d,
     ConvReLU1d,
     ConvReLU2d,
+    Linear,
+    LinearReLU,
+    clear_quantized_parameter_cache,
 )
 from hannah.models.factory.qconfig import PowerOf2Quantization, get_trax_qat_qconfig
+from hannah.models.tc.models import ApproximateGlobalAveragePooling1D
+from hannah.nn.quantized import (
+    memory_footprint,
+    pack_integers,
+    to_integer,
+    unpack_integers,
+)
 
 
 @pytest.mark.parametrize(
@@ -216,6 +227,177 @@ def test_fused_relu_2d():
     assert torch.equal(output, layer.activation_post_process(output))
 
 
+@pytest.mark.parametrize("bits", [2, 4, 6, 8, 12])
+def test_pack_integers(bits):
+    values = torch.randint(-(2 ** (bits - 1)), 2 ** (bits - 1), (7, 3, 5))
+    packed = pack_integers(values, bits)
+
+    expected_bytes = (values.numel() + 1) // 2 if bits <= 4 else values.numel() * (1 if bits <= 8 else 2)
+    assert packed.numel() * packed.element_size() == expected_bytes
+    assert torch.equal(unpack_integers(packed, bits, values.shape), values.to(torch.int32))
+
+
+class IntegerConfig:
+    bw_b = 8
+    bw_f = 8
+
+    def __init__(self, bw_w, power_of_2):
+        self.bw_w = bw_w
+        self.power_of_2 = power_of_2
+
+    def get(self, name: str, default: Any = None):
+        return getattr(self, name, default)
+
+
+class QuantizedTCModel(nn.Module):
+    def __init__(self, qconfig):
+        super().__init__()
+        self.qconfig = qconfig
+        self.conv1 = ConvBnReLU1d(40, 32, 3, bias=False, qconfig=qconfig)
+        self.conv2 = ConvBn1d(32, 32, 9, padding=4, qconfig=qconfig)
+        self.conv3 = Conv2d(1, 4, 3, padding=1, qconfig=qconfig)
+        self.pool = ApproximateGlobalAveragePooling1D(99)
+        self.fc = Linear(128, 12, qconfig=qconfig)
+
+    def forward(self, x):
+        x = self.conv1(x)
+        x = self.conv2(x)
+        x = self.conv3(x.unsqueeze(1)).flatten(1, 2)
+        x = self.pool(x)
+        return self.fc(x.flatten(1))
+
+
+def quantized_tc_model(bw_w, power_of_2):
+    torch.manual_seed(0)
+    model = QuantizedTCModel(get_trax_qat_qconfig(IntegerConfig(bw_w, power_of_2)))
+    model.train()
+    for _i in range(5):
+        model(torch.rand(8, 40, 101))
+    model.eval()
+    return convert(model, mapping=QAT_MODULE_MAPPINGS, remove_qconfig=False)
+
+
+# the pooled inputs of fc are sums of 99 8 bit values with 7 fractional bits, divided by 128
+INPUT_FORMATS = {"fc": (14, 15)}
+
+
+@pytest.mark.parametrize("bw_w,power_of_2", [(4, False), (6, False), (8, False), (4, True)])
+def test_integer_inference(bw_w, power_of_2):
+    model = quantized_tc_model(bw_w, power_of_2)
+    integer_model = to_integer(quantized_tc_model(bw_w, power_of_2), INPUT_FORMATS)
+
+    assert all(m.integer_inference for m in integer_model.modules() if hasattr(m, "integer_inference"))
+    assert memory_footprint(integer_model) * 3 < memory_footprint(model)
+
+    fixed_point_input = torch.round(torch.rand(8, 40, 101) * 256 - 128) / 128
+    assert torch.equal(integer_model(fixed_point_input), model(fixed_point_input))
+
+    # modules receiving unquantized inputs stay in floating point
+    float_model = to_integer(quantized_tc_model(bw_w, power_of_2), dict(INPUT_FORMATS, conv1=None))
+    assert not float_model.conv1.integer_inference and float_model.conv2.integer_inference
+    float_input = torch.rand(8, 40, 101)
+    assert torch.equal(float_model(float_input), model(float_input))
+
+
+@pytest.mark.benchmark
+def test_integer_inference_benchmark():
+    model = quantized_tc_model(6, False)
+    integer_model = to_integer(quantized_tc_model(6, False), INPUT_FORMATS)
+    input = torch.round(torch.rand(16, 40, 101) * 256 - 128) / 128
+
+    def latency(model):
+        with torch.no_grad():
+            model(input)
+            start = time.perf_counter()
+            for _i in range(20):
+                model(input)
+        return (time.perf_counter() - start) / 20
+
+    print(
+        f"Fake quantized: {latency(model) * 1000:.3f}ms {memory_footprint(model)} bytes, "
+        f"integer: {latency(integer_model) * 1000:.3f}ms {memory_footprint(integer_model)} bytes"
+    )
+
+
+@pytest.mark.parametrize(
+    "layer_factory,input_shape",
+    [
+        (lambda qconfig: ConvBnReLU1d(8, 16, 3, qconfig=qconfig), (4, 8, 20)),
+        (lambda qconfig: ConvBn2d(8, 16, 3, bias=True, qconfig=qconfig), (4, 8, 10, 10)),
+        (lambda qconfig: ConvReLU1d(8, 16, 3, qconfig=qconfig), (4, 8, 20)),
+        (lambda qconfig: Conv2d(8, 16, 3, qconfig=qconfig), (4, 8, 10, 10)),
+        (lambda qconfig: Linear(8, 16, qconfig=qconfig), (4, 8)),
+        (lambda qconfig: LinearReLU(8, 16, qconfig=qconfig), (4, 8)),
+    ],
+)
+def test_quantized_parameter_cache(layer_factory, input_shape):
+    torch.manual_seed(0)
+    layer = layer_factory(get_trax_qat_qconfig(IntegerConfig(6, False)))
+    optimizer = torch.optim.SGD(layer.parameters(), lr=0.1)
+    input = torch.rand(input_shape)
+
+    def reference(layer):
+        layer.clear_quantized_parameter_cache()
+        return layer(input)
+
+    def train_step():
+        layer.train()
+        layer(input).sum().backward()
+        optimizer.step()
+        layer.eval()
+
+    train_step()
+    with torch.no_grad():
+        output = layer(input)
+        cache = layer._quantized_parameter_cache
+        assert cache is not None
+        assert torch.equal(layer(input), output)
+        assert layer._quantized_parameter_cache is cache
+
+        # gradients flow through the quantized weights if enabled
+        with torch.enable_grad():
+            layer(input).sum().backward()
+        assert layer.weight.grad is not None
+        assert layer._quantized_parameter_cache is cache
+
+    # optimizer steps invalidate the cache
+    train_step()
+    with torch.no_grad():
+        output = layer(input)
+        assert layer._quantized_parameter_cache is not cache
+        assert torch.equal(output, reference(layer))
+
+    # loading a state dict invalidates the cache
+    other = layer_factory(get_trax_qat_qconfig(IntegerConfig(6, False)))
+    other.eval()
+    with torch.no_grad():
+        other(input)
+        other.load_state_dict(layer.state_dict())
+        assert torch.equal(other(input), output)
+
+
+@pytest.mark.benchmark
+def test_quantized_parameter_cache_benchmark():
+    model = QuantizedTCModel(get_trax_qat_qconfig(IntegerConfig(6, False)))
+    model.train()
+    model(torch.rand(8, 40, 101))
+    model.eval()
+    input = torch.rand(1, 40, 101)
+
+    def latency(cached):
+        with torch.no_grad():
+            start = time.perf_counter()
+            for _i in range(50):
+                if not cached:
+                    model.apply(clear_quantized_parameter_cache)
+                model(input)
+        return (time.perf_counter() - start) / 50
+
+    uncached_latency = latency(False)
+    cached_latency = latency(True)
+    print(f"Eval forward: {uncached_latency * 1000:.3f}ms uncached, {cached_latency * 1000:.3f}ms cached")
+
+
 if __name__ == "__main__":
     test_fused_relu_1d()
 
@@ -0,0 +1,147 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import time
+
+import pytest
+import torch
+
+
+
+TC_RES8 = dict(
+    cls="hannah.models.tc.models.TCResNetModel",
+    separable=[0, 0],
+    bottleneck=[0, 0],
+    channel_division=[2, 4],
+    block1_conv_size=9,
+    block1_output_channels=24,
+    block1_stride=2,
+    block2_conv_size=9,
+    block2_output_channels=32,
+    block2_stride=2,
+    block3_conv_size=9,
+    block3_output_channels=48,
+    block3_stride=2,
+    conv1_output_channels=16,
+    conv1_size=3,
+    conv1_stride=1,
+    dropout_prob=0.5,
+    fully_convolutional=False,
+    inputlayer=True,
+    width_multiplier=1.0,
+    dilation=1,
+    clipping_value=100000.0,
+    small=False,
+)
+
+SIMPLE_VAD = dict(
+    cls="hannah.models.vad.models.SimpleVadModel",
+    conv1_features=8,
+    conv1_size=5,
+    conv2_features=8,
+    conv2_size=3,
+    conv3_features=8,
+    conv3_size=3,
+    fc_size=264,
+    stride=2,
+    batch_norm=True,
+)
+
+MFCC = dict(_target_="hannah.features.MFCC", sample_rate=16000, n_mfcc=40, hop_length=160, n_fft=480, n_mels=40)
+MELSPEC = dict(_target_="torchaudio.transforms.MelSpectrogram", sample_rate=16000, hop_length=160, n_fft=480, n_mels=40)
+
+
+def streaming_classifier(stream_classifier, model, features):
+    module = stream_classifier(model=model, features=features)
+    module.setup("fit")
+
+    # non trivial batch norm statistics
+    generator = torch.Generator().manual_seed(0)
+    for m in module.modules():
+        if isinstance(m, (torch.nn.BatchNorm1d, torch.nn.BatchNorm2d)):
+            m.running_mean.uniform_(-0.5, 0.5, generator=generator)
+            m.running_var.uniform_(0.5, 2.0, generator=generator)
+    return module
+
+
+def audio_stream(length, batch_size=1):
+    generator = torch.Generator().manual_seed(1)
+    t = torch.arange(length) / 16000
+    stream = 0.05 * torch.randn(batch_size, 1, length, generator=generator)
+    stream += 0.5 * torch.sin(2 * torch.pi * 440 * t) * (torch.sin(2 * torch.pi * 0.7 * t) > 0)
+    return stream
+
+
+@pytest.mark.parametrize(
+    "model,features,hop_length",
+    [
+        (TC_RES8, MFCC, 1280),
+        (TC_RES8, MFCC, 160),
+        (TC_RES8, MELSPEC, 1280),
+        (TC_RES8, MFCC, 1000),
+        (SIMPLE_VAD, MFCC, 1280),
+    ],
+)
+def test_streaming_inference(stream_classifier, model, features, hop_length):
+    module = streaming_classifier(stream_classifier, model, features)
+    streaming = module.streaming_inference(hop_length)
+
+    stream = audio_stream(30 * hop_length, batch_size=2)
+    window = torch.zeros(2, 1, 16000)
+    for start in range(0, stream.shape[-1], hop_length):
+        samples = stream[..., start : start + hop_length]
+        window = torch.cat((window[..., hop_length:], samples), dim=-1)
+
+        with torch.no_grad():
+            expected = module(window)
+        assert torch.allclose(streaming.step(samples), expected, atol=1e-4, rtol=1e-4)
+
+    # single streams without batch dimension
+    streaming.reset()
+    window = torch.cat((torch.zeros(1, 16000 - hop_length), samples[0]), dim=-1)
+    with torch.no_grad():
+        expected = module(window.unsqueeze(0))[0]
+    assert torch.allclose(streaming.step(samples[0]), expected, atol=1e-4, rtol=1e-4)
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("batch_size", [1, 16])
+def test_streaming_inference_benchmark(stream_classifier, batch_size):
+    hop_length = 1280
+    module = streaming_classifier(stream_classifier, TC_RES8, MFCC)
+    streaming = module.streaming_inference(hop_length)
+    stream = audio_stream(50 * hop_length, batch_size=batch_size)
+    hops = [stream[..., start : start + hop_length] for start in range(0, stream.shape[-1], hop_length)]
+
+    window = torch.zeros(batch_size, 1, 16000)
+    start = time.perf_counter()
+    with torch.no_grad():
+        for samples in hops:
+            window = torch.cat((window[..., hop_length:], samples), dim=-1)
+            module(window)
+    windowed_time = (time.perf_counter() - start) / len(hops)
+
+    start = time.perf_counter()
+    for samples in hops:
+        streaming.step(samples)
+    streaming_time = (time.perf_counter() - start) / len(hops)
+
+    print(
+        f"Latency per hop of {hop_length} samples for {batch_size} streams: "
+        f"{windowed_time * 1000:.3f}ms windowed, {streaming_time * 1000:.3f}ms streaming"
+    )
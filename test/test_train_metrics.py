@@ -0,0 +1,101 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import time
+
+import pytest
+import pytorch_lightning as pl
+import torch
+
+from hannah.callbacks.optimization import HydraOptCallback
+
+
+class LossRecorder(pl.Callback):
+    def __init__(self):
+        self.losses = []
+
+    def on_train_batch_end(self, trainer, pl_module, outputs, batch, batch_idx):
+        self.losses.append(float(outputs["loss"]))
+
+
+FEATURES = dict(_target_="hannah.features.MFCC", sample_rate=16000, n_mfcc=10, hop_length=160, n_fft=480, n_mels=20)
+
+
+def train_metrics_classifier(stream_classifier, train_metrics_interval, train_size=40):
+    return stream_classifier(
+        features=FEATURES,
+        dataset=dict(input_length=1600, train_size=train_size, num_classes=4),
+        train_metrics_interval=train_metrics_interval,
+    )
+
+
+def fit(module, callbacks, accelerator="cpu", max_epochs=1):
+    trainer = pl.Trainer(
+        accelerator=accelerator,
+        max_epochs=max_epochs,
+        logger=False,
+        enable_checkpointing=False,
+        enable_progress_bar=False,
+        enable_model_summary=False,
+        limit_val_batches=0,
+        num_sanity_val_steps=0,
+        callbacks=callbacks,
+    )
+    trainer.fit(module)
+    return trainer
+
+
+@pytest.mark.parametrize("train_metrics_interval", [1, 3])
+def test_train_metrics_interval(stream_classifier, train_metrics_interval):
+    torch.manual_seed(0)
+    module = train_metrics_classifier(stream_classifier, train_metrics_interval)
+    opt_callback = HydraOptCallback(monitor=["train_loss"])
+    recorder = LossRecorder()
+    trainer = fit(module, [opt_callback, recorder])
+    assert trainer.global_step == 10
+
+    # curves are recorded after each interval and at the end of the epoch
+    curve = opt_callback.curves()
+    steps = [step for step, _value in curve]
+    if train_metrics_interval == 1:
+        assert steps == list(range(1, 11))
+    else:
+        assert steps == [3, 6, 9, 10]
+
+    # logged losses are averaged over the interval
+    intervals = [(0, 3), (3, 6), (6, 9), (9, 10)] if train_metrics_interval == 3 else [(i, i + 1) for i in range(10)]
+    for (start, end), (_step, value) in zip(intervals, curve):
+        expected = sum(recorder.losses[start:end]) / (end - start)
+        assert value == pytest.approx(expected, rel=1e-5)
+
+    train_values = opt_callback.train_result()
+    assert train_values["train_loss"] == pytest.approx(recorder.losses[-1], rel=1e-5)
+    assert 0.0 <= train_values["train_accuracy"] <= 1.0
+
+
+@pytest.mark.benchmark
+def test_train_metrics_benchmark(stream_classifier):
+    accelerators = ["cpu"] + (["gpu"] if torch.cuda.is_available() else [])
+    for accelerator in accelerators:
+        for train_metrics_interval in [1, 50]:
+            torch.manual_seed(0)
+            module = train_metrics_classifier(stream_classifier, train_metrics_interval, train_size=800)
+            start = time.perf_counter()
+            trainer = fit(module, [HydraOptCallback(monitor=["train_loss"])], accelerator=accelerator)
+            steps_per_second = trainer.global_step / (time.perf_counter() - start)
+            print(f"{accelerator} train_metrics_interval={train_metrics_interval}: {steps_per_second:.1f} steps/s")
@@ -0,0 +1,126 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import numpy as np
+import pytest
+import soundfile
+import torch
+
+from hannah.datasets.base import DatasetType
+from hannah.datasets.speech import SpeechCommandsDataset
+from hannah.datasets.waveform_augmentation import WaveformAugmentation
+
+
+def speech_dataset(tmp_path, set_type=DatasetType.TEST, **kwargs):
+    files = {}
+    rng = np.random.RandomState(0)
+    for i, length in enumerate([4000, 8000, 12000, 20000]):
+        path = tmp_path / f"sample_{i}.wav"
+        data = 0.05 * rng.randn(length)
+        # loud segment at a different position in each file
+        data[length // (i + 2) : length // (i + 2) + 2000] *= 10
+        soundfile.write(path, data, 8000)
+        files[str(path)] = 2
+
+    config = dict(
+        data_folder=str(tmp_path),
+        samplingrate=8000,
+        input_length=8000,
+        raw_input_length=24000,
+        unknown_prob=0.0,
+        silence_prob=0.0,
+        timeshift_ms=0,
+        extract="loudest",
+        train_snr_low=0.0,
+        train_snr_high=0.0,
+        test_snr=float("inf"),
+        wanted_words=["a", "b"],
+    )
+    config.update(kwargs)
+    return SpeechCommandsDataset(files, set_type, config)
+
+
+def raw_batch(dataset):
+    dataset.batched_augmentation = True
+    items = [dataset[i] for i in range(len(dataset))]
+    dataset.batched_augmentation = False
+    return torch.stack([i[0] for i in items]), torch.tensor([i[1] for i in items])
+
+
+@pytest.mark.parametrize("extract", ["loudest", "front"])
+def test_batched_extraction_matches_dataset(tmp_path, extract):
+    dataset = speech_dataset(tmp_path, extract=extract)
+    x, lengths = raw_batch(dataset)
+
+    augmentation = dataset.batch_augmentation(seed=1)
+    batched = augmentation(x, lengths)
+
+    assert batched.shape == (len(dataset), 1, 8000)
+    for i in range(len(dataset)):
+        expected, _, _, _ = dataset[i]
+        assert torch.allclose(batched[i], expected, atol=1e-6)
+
+
+def test_batched_time_shift(tmp_path):
+    max_shift = 800
+    x = torch.rand(16, 1, 8000) * 2 - 1
+    lengths = torch.full((16,), 8000)
+    augmentation = WaveformAugmentation(8000, samplingrate=8000, timeshift_ms=100, extract="front", seed=0)
+    shifted = augmentation(x, lengths)
+
+    found_shifts = []
+    for i in range(16):
+        for shift in range(-max_shift, max_shift + 1):
+            expected = torch.zeros(8000)
+            src = torch.arange(8000) + shift
+            valid = (src >= 0) & (src < 8000)
+            expected[valid] = x[i, 0, src[valid]]
+            if torch.equal(shifted[i, 0], expected):
+                found_shifts.append(shift)
+                break
+    assert len(found_shifts) == 16
+    assert len(set(found_shifts)) > 1
+
+
+def test_batched_noise_mixing():
+    x = 0.1 * torch.sin(torch.linspace(0, 400, 8000)).repeat(32, 1, 1)
+    lengths = torch.full((32,), 8000)
+    noise = [np.random.RandomState(0).randn(3000).astype(np.float32) * 0.01]
+
+    augmentation = WaveformAugmentation(8000, extract="front", snr_low=10, snr_high=10, noise=noise, seed=0)
+    mixed = augmentation(x, lengths)
+
+    added = mixed - x
+    snr = 10 * torch.log10((x**2).sum(dim=-1) / (added**2).sum(dim=-1))
+    assert torch.allclose(snr, torch.full_like(snr, 10.0), atol=0.05)
+
+    # silence is replaced by noise
+    silence = augmentation(torch.zeros(2, 1, 8000), torch.zeros(2))
+    assert silence.abs().sum() > 0
+
+
+def test_batched_augmentation_is_reproducible(tmp_path):
+    dataset = speech_dataset(tmp_path, set_type=DatasetType.TRAIN, timeshift_ms=100, train_snr_low=5, train_snr_high=20)
+    x, lengths = raw_batch(dataset)
+
+    first = dataset.batch_augmentation(seed=3)(x, lengths)
+    second = dataset.batch_augmentation(seed=3)(x, lengths)
+    other = dataset.batch_augmentation(seed=4)(x, lengths)
+
+    assert torch.equal(first, second)
+    assert not torch.equal(first, other)
@@ -0,0 +1,88 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+import pickle
+
+import numpy as np
+import pytest
+import soundfile
+import torch
+
+from hannah.datasets.base import DatasetType
+from hannah.datasets.speech import SpeechCommandsDataset
+from hannah.datasets.utils.pack import WaveformPack
+
+
+@pytest.mark.parametrize("dtype,atol", [("float32", 0.0), ("float16", 1e-3), ("int16", 1e-4)])
+def test_waveform_pack(tmp_path, dtype, atol):
+    waveforms = {f"wave_{i}": np.sin(np.linspace(0, i + 1, 100 * (i + 1))).astype(np.float32) for i in range(5)}
+
+    pack = WaveformPack.create(tmp_path / "pack", waveforms.keys(), waveforms.get, dtype=dtype)
+
+    assert len(pack) == 5
+    for name, data in waveforms.items():
+        assert np.allclose(pack.load(name), data, atol=atol)
+        assert pack.load(name).dtype == np.float32
+        # raw data is a view of the memory map
+        assert isinstance(pack.raw(name).base, np.memmap)
+
+    # packs are reopened instead of being recreated, and can be sent to dataloader workers
+    reopened = WaveformPack.open_or_create(tmp_path / "pack", [], None, dtype=dtype)
+    reopened = pickle.loads(pickle.dumps(reopened))
+    assert np.array_equal(reopened.load("wave_3"), pack.load("wave_3"))
+
+
+def speech_dataset(tmp_path, files, **kwargs):
+    config = dict(
+        data_folder=str(tmp_path),
+        samplingrate=8000,
+        input_length=8000,
+        unknown_prob=0.0,
+        silence_prob=0.0,
+        timeshift_ms=0,
+        extract="front",
+        train_snr_low=0.0,
+        train_snr_high=0.0,
+        test_snr=float("inf"),
+        wanted_words=["a", "b"],
+    )
+    config.update(kwargs)
+    return SpeechCommandsDataset(files, DatasetType.TEST, config)
+
+
+def test_packed_speech_dataset(tmp_path):
+    files = {}
+    for i in range(4):
+        path = tmp_path / f"sample_{i}.wav"
+        t = np.arange(16000) / 16000
+        soundfile.write(path, 0.5 * np.sin(2 * np.pi * 200 * (i + 1) * t), 16000)
+        files[str(path)] = 2 + i % 2
+
+    plain = speech_dataset(tmp_path, files)
+    packed = speech_dataset(tmp_path, files, pack_audio=True, pack_dtype="float32")
+
+    assert plain.pack is None
+    assert len(packed.pack) == 4
+    assert len(list((tmp_path / "packed").iterdir())) == 1
+
+    for i in range(len(plain)):
+        data, data_len, label, _ = plain[i]
+        packed_data, packed_len, packed_label, _ = packed[i]
+        assert data_len == packed_len == 8000
+        assert torch.equal(label, packed_label)
+        assert torch.allclose(data, packed_data)
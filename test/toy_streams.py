@@ -0,0 +1,76 @@
+#
+# Copyright (c) 2023 Hannah contributors.
+#
+# This file is part of hannah.
+# See https://github.com/ekut-es/hannah for further info.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""Toy stream classification data and model for tests of the stream classifier modules
+
+The classes are importable by name from dataset and model configs, also in worker processes.
+"""
+import torch
+
+from hannah.datasets.base import AbstractDataset
+
+
+class ToyStreamDataset(AbstractDataset):
+    """Random waveforms with random labels
+
+    The sizes of the splits and the number of classes are set by the dataset config
+    (`train_size`, `val_size`, `test_size`, `num_classes`).
+    """
+
+    def __init__(self, size, config):
+        self.num_classes = config.get("num_classes", 2)
+        generator = torch.Generator().manual_seed(size)
+        self.data = torch.rand(size, 1, config.input_length, generator=generator) * 2 - 1
+        self.labels = torch.randint(0, self.num_classes, (size,), generator=generator)
+        self.channels = 1
+        self.input_length = config.input_length
+
+    @classmethod
+    def prepare(cls, config):
+        pass
+
+    @classmethod
+    def splits(cls, config):
+        return (
+            cls(config.get("train_size", 64), config),
+            cls(config.get("val_size", 32), config),
+            cls(config.get("test_size", 32), config),
+        )
+
+    @property
+    def class_names(self):
+        return [chr(ord("a") + c) for c in range(self.num_classes)]
+
+    @property
+    def class_counts(self):
+        return {c: int((self.labels == c).sum()) for c in range(self.num_classes)}
+
+    def __getitem__(self, index):
+        return self.data[index], self.input_length, self.labels[index : index + 1], 1
+
+    def __len__(self):
+        return len(self.labels)
+
+
+class ToyModel(torch.nn.Module):
+    def __init__(self, input_shape, labels):
+        super().__init__()
+        self.linear = torch.nn.Linear(input_shape[1] * input_shape[2], labels)
+
+    def forward(self, x):
+        return self.linear(x.flatten(1))